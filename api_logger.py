@@ -0,0 +1,251 @@
+import atexit
+import datetime
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+from metrics import medir_etapa, obtener_metricas
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+LOG_FILE = "api_responses.jsonl"
+MAX_MEGABYTES = 10  # Rotar al superar este tamaño
+ROTAR_CADA_HORAS = 24  # Rotar aunque no se alcance el tamaño
+COPIAS = 5  # Archivos rotados que se conservan
+COMPRIMIR = True  # Comprimir con gzip los archivos rotados
+
+TAM_LOTE = 256  # Registros máximos por escritura
+INTERVALO_VACIADO = 0.5  # Segundos máximos que un registro espera en la cola
+TAM_COLA = 10000  # Si se llena, los registros nuevos se descartan
+
+# Campos cuyo valor nunca debe llegar al log
+CLAVES_SECRETAS = {"api_token", "token", "authorization", "x-publish-token", "password"}
+# Textos más largos que esto (p. ej. letras completas) se recortan
+MAX_TEXTO = 200
+
+_FIN = object()
+
+_metricas = obtener_metricas()
+_escritos = _metricas.contador("sound_lyrics_log_registros_total", "Registros escritos en el log JSONL")
+_descartados = _metricas.contador(
+    "sound_lyrics_log_descartados_total", "Registros descartados por tener la cola del log llena"
+)
+
+
+def redactar(valor):
+    """
+    Devuelve una copia del valor con los secretos ocultos y los textos
+    largos recortados.
+    """
+    if isinstance(valor, dict):
+        return {
+            clave: "***" if str(clave).lower() in CLAVES_SECRETAS else redactar(v)
+            for clave, v in valor.items()
+        }
+    if isinstance(valor, (list, tuple)):
+        return [redactar(v) for v in valor]
+    if isinstance(valor, str) and len(valor) > MAX_TEXTO:
+        return f"{valor[:80]}… (+{len(valor) - 80} caracteres)"
+    return valor
+
+
+class RegistroJsonl:
+    """
+    Log asíncrono en formato JSONL (un objeto JSON por línea).
+
+    Los registros se encolan sin bloquear al llamador y un hilo en segundo
+    plano los escribe por lotes. El archivo rota por tamaño y por tiempo,
+    y los archivos rotados se pueden comprimir con gzip.
+    """
+
+    def __init__(
+        self,
+        ruta=None,
+        max_bytes=None,
+        rotar_cada=None,
+        copias=None,
+        comprimir=None,
+        tam_lote=TAM_LOTE,
+        intervalo_vaciado=INTERVALO_VACIADO,
+    ):
+        self.ruta = ruta or os.getenv("LOG_FILE", LOG_FILE)
+        self.max_bytes = max_bytes or int(float(os.getenv("LOG_MAX_MB", MAX_MEGABYTES)) * 1024 * 1024)
+        self.rotar_cada = rotar_cada or float(os.getenv("LOG_ROTAR_CADA_HORAS", ROTAR_CADA_HORAS)) * 3600
+        self.copias = copias if copias is not None else int(os.getenv("LOG_COPIAS", COPIAS))
+        if comprimir is None:
+            comprimir = os.getenv("LOG_COMPRIMIR", str(COMPRIMIR)).lower() in ("1", "true", "si", "sí", "yes")
+        self.comprimir = comprimir
+        self.tam_lote = tam_lote
+        self.intervalo_vaciado = intervalo_vaciado
+        self.descartados = 0
+
+        self._cola = queue.Queue(maxsize=TAM_COLA)
+        self._archivo = None
+        self._inicio = None  # (inodo, instante del primer registro) del archivo actual
+        self._hilo = threading.Thread(target=self._bucle, name="api-logger", daemon=True)
+        self._hilo.start()
+        _metricas.indicador(
+            "sound_lyrics_log_cola", "Registros del log pendientes de escribir", self._cola.qsize
+        )
+
+    def registrar(self, registro):
+        """
+        Encola un registro (diccionario). Nunca bloquea.
+        """
+        try:
+            self._cola.put_nowait(registro)
+        except queue.Full:
+            self.descartados += 1
+            _descartados.inc()
+
+    def cerrar(self, timeout=5.0):
+        """
+        Escribe lo pendiente y detiene el hilo de escritura.
+        """
+        if self._hilo.is_alive():
+            self._cola.put(_FIN)
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        terminar = False
+        while not terminar:
+            try:
+                primero = self._cola.get(timeout=self.intervalo_vaciado)
+            except queue.Empty:
+                # Un fallo aquí (log borrado o rotado desde fuera) no puede
+                # detener el hilo de escritura
+                try:
+                    self._rotar_si_corresponde()
+                except Exception as e:
+                    print(f"Error al rotar el log: {e}", file=sys.stderr)
+                continue
+
+            lote = []
+            limite = time.monotonic() + self.intervalo_vaciado
+            registro = primero
+            while True:
+                if registro is _FIN:
+                    terminar = True
+                    break
+                lote.append(registro)
+                if len(lote) >= self.tam_lote:
+                    break
+                restante = limite - time.monotonic()
+                try:
+                    if restante > 0:
+                        registro = self._cola.get(timeout=restante)
+                    else:
+                        registro = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+
+            if lote:
+                self._escribir(lote)
+
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def _escribir(self, lote):
+        with medir_etapa("log_escritura"):
+            self._escribir_lote(lote)
+        _escritos.inc(len(lote))
+
+    def _escribir_lote(self, lote):
+        lineas = []
+        for registro in lote:
+            try:
+                lineas.append(
+                    json.dumps(redactar(registro), ensure_ascii=False, separators=(",", ":"), default=str)
+                )
+            except Exception as e:
+                lineas.append(json.dumps({"error_log": str(e)}))
+        try:
+            self._rotar_si_corresponde()
+            if self._archivo is None:
+                self._abrir()
+            self._archivo.write("\n".join(lineas) + "\n")
+            self._archivo.flush()
+        except Exception as e:
+            print(f"Error al escribir en el log: {e}", file=sys.stderr)
+
+    def _abrir(self):
+        self._archivo = open(self.ruta, "a", encoding="utf-8")
+
+    def _inicio_archivo(self, estado):
+        """
+        Cuándo empezó el archivo de log: el "timestamp" de su primer
+        registro o, si no lo tiene, su fecha de creación (o de
+        modificación si el sistema no la guarda). No depende de cuándo
+        arrancó el proceso: un programa que se ejecuta muchas veces al día
+        también rota por tiempo.
+        """
+        if self._inicio is not None and self._inicio[0] == estado.st_ino:
+            return self._inicio[1]
+        inicio = None
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                marca = json.loads(f.readline()).get("timestamp")
+            inicio = datetime.datetime.fromisoformat(marca).timestamp()
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+        if inicio is None:
+            inicio = getattr(estado, "st_birthtime", None) or estado.st_mtime
+        self._inicio = (estado.st_ino, inicio)
+        return inicio
+
+    def _rotar_si_corresponde(self):
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return
+        if estado.st_size == 0:
+            return
+        if estado.st_size < self.max_bytes and time.time() - self._inicio_archivo(estado) < self.rotar_cada:
+            return
+
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+        ahora = time.time()
+        destino = f"{self.ruta}.{time.strftime('%Y%m%d-%H%M%S', time.localtime(ahora))}-{int(ahora * 1000) % 1000:03d}"
+        os.replace(self.ruta, destino)
+        if self.comprimir:
+            with open(destino, "rb") as origen, gzip.open(destino + ".gz", "wb") as comprimido:
+                shutil.copyfileobj(origen, comprimido)
+            os.remove(destino)
+        self._inicio = None
+        self._eliminar_copias_antiguas()
+
+    def _eliminar_copias_antiguas(self):
+        carpeta = os.path.dirname(os.path.abspath(self.ruta))
+        base = os.path.basename(self.ruta) + "."
+        rotados = sorted(nombre for nombre in os.listdir(carpeta) if nombre.startswith(base))
+        for nombre in rotados[: max(len(rotados) - self.copias, 0)]:
+            try:
+                os.remove(os.path.join(carpeta, nombre))
+            except OSError:
+                pass
+
+
+_registro = None
+_registro_lock = threading.Lock()
+
+
+def obtener_registro():
+    """
+    Devuelve el log compartido del proceso (se crea al primer uso y se
+    vacía automáticamente al salir).
+    """
+    global _registro
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                _registro = RegistroJsonl()
+                atexit.register(_registro.cerrar)
+    return _registro
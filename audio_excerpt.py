@@ -0,0 +1,457 @@
+import mimetypes
+import os
+import struct
+import uuid
+
+from audio_probe import cabecera_mp3, inicio_audio_mp3, probar_duracion
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+INICIO = 30.0  # Segundo de la canción donde empieza el fragmento
+DURACION = 20.0  # Duración del fragmento en segundos
+
+TAM_BLOQUE = 64 * 1024  # Lectura/envío en bloques de este tamaño
+VENTANA_BUSQUEDA = 256 * 1024  # Bytes máximos a recorrer buscando una trama
+
+
+class Fragmento:
+    """
+    Describe un fragmento de audio sin cargarlo en memoria: una lista de
+    piezas que son bytes (cabeceras reescritas) o rangos (offset, longitud)
+    del archivo original que se leen al enviar.
+    """
+
+    def __init__(self, ruta, nombre, tipo_mime, piezas, inicio=0.0, duracion=None):
+        self.ruta = ruta
+        self.nombre = nombre
+        self.tipo_mime = tipo_mime
+        self.piezas = piezas
+        self.inicio = inicio
+        self.duracion = duracion
+
+    @classmethod
+    def archivo_completo(cls, ruta):
+        """
+        Fragmento que abarca el archivo entero (se envía igualmente en bloques).
+        """
+        tipo_mime = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        return cls(ruta, os.path.basename(ruta), tipo_mime, [(0, os.path.getsize(ruta))])
+
+    @property
+    def tamano(self):
+        return sum(len(p) if isinstance(p, bytes) else p[1] for p in self.piezas)
+
+    def iterar(self, tam_bloque=TAM_BLOQUE):
+        """
+        Genera el contenido del fragmento en bloques de tamaño acotado.
+        """
+        with open(self.ruta, "rb") as f:
+            for pieza in self.piezas:
+                if isinstance(pieza, bytes):
+                    yield pieza
+                    continue
+                offset, restante = pieza
+                f.seek(offset)
+                while restante > 0:
+                    bloque = f.read(min(tam_bloque, restante))
+                    if not bloque:
+                        raise IOError(f"El archivo '{self.ruta}' cambió durante el envío")
+                    restante -= len(bloque)
+                    yield bloque
+
+
+class CuerpoMultipart:
+    """
+    Cuerpo multipart/form-data que se envía en streaming: requests lo lee
+    con read() en bloques y conoce su longitud de antemano (Content-Length),
+    así que la memoria usada no depende del tamaño del audio.
+    """
+
+    def __init__(self, campos, nombre_campo, fragmento):
+        self.limite = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.limite}"
+
+        previo = []
+        for nombre, valor in campos.items():
+            previo.append(
+                f'--{self.limite}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'
+            )
+        previo.append(
+            f'--{self.limite}\r\nContent-Disposition: form-data; name="{nombre_campo}"; '
+            f'filename="{fragmento.nombre}"\r\nContent-Type: {fragmento.tipo_mime}\r\n\r\n'
+        )
+        self._previo = "".join(previo).encode("utf-8")
+        self._final = f"\r\n--{self.limite}--\r\n".encode("ascii")
+        self._fragmento = fragmento
+        self._longitud = len(self._previo) + fragmento.tamano + len(self._final)
+        self._generador = None
+        self._pendiente = b""
+
+    def __len__(self):
+        return self._longitud
+
+    def __iter__(self):
+        yield self._previo
+        yield from self._fragmento.iterar()
+        yield self._final
+
+    def read(self, n=-1):
+        if self._generador is None:
+            self._generador = iter(self)
+        if n is None or n < 0:
+            datos = self._pendiente + b"".join(self._generador)
+            self._pendiente = b""
+            return datos
+        while len(self._pendiente) < n:
+            try:
+                self._pendiente += next(self._generador)
+            except StopIteration:
+                break
+        datos, self._pendiente = self._pendiente[:n], self._pendiente[n:]
+        return datos
+
+
+def _rango_recorte(inicio, duracion, total):
+    """
+    Ajusta el fragmento pedido para que quepa en la canción.
+    """
+    if total and inicio + duracion > total:
+        inicio = max(total - duracion, 0.0)
+    return inicio, min(duracion, total) if total else duracion
+
+
+# --- WAV ---
+
+def _fragmento_wav(f, ruta, inicio, duracion):
+    cabecera = f.read(12)
+    if cabecera[:4] != b"RIFF" or cabecera[8:12] != b"WAVE":
+        raise ValueError("Cabecera RIFF/WAVE no válida")
+
+    fmt = None
+    while True:
+        bloque = f.read(8)
+        if len(bloque) < 8:
+            raise ValueError("No se encontró el bloque 'data'")
+        ident, tamano = struct.unpack("<4sI", bloque)
+        if ident == b"fmt ":
+            fmt = f.read(tamano)
+            if tamano & 1:
+                f.read(1)
+        elif ident == b"data":
+            inicio_datos = f.tell()
+            break
+        else:
+            f.seek(tamano + (tamano & 1), os.SEEK_CUR)
+
+    if fmt is None:
+        raise ValueError("No se encontró el bloque 'fmt '")
+    bytes_por_segundo = struct.unpack_from("<I", fmt, 8)[0]
+    alineacion = struct.unpack_from("<H", fmt, 12)[0] or 1
+    tamano_datos = min(tamano, os.fstat(f.fileno()).st_size - inicio_datos)
+
+    inicio, duracion = _rango_recorte(inicio, duracion, tamano_datos / bytes_por_segundo)
+    offset = int(inicio * bytes_por_segundo) // alineacion * alineacion
+    longitud = int(duracion * bytes_por_segundo) // alineacion * alineacion
+    longitud = min(longitud, tamano_datos - offset)
+
+    cabecera_nueva = (
+        b"RIFF"
+        + struct.pack("<I", 4 + 8 + len(fmt) + (len(fmt) & 1) + 8 + longitud)
+        + b"WAVE"
+        + b"fmt "
+        + struct.pack("<I", len(fmt))
+        + fmt
+        + (b"\x00" if len(fmt) & 1 else b"")
+        + b"data"
+        + struct.pack("<I", longitud)
+    )
+    piezas = [cabecera_nueva, (inicio_datos + offset, longitud)]
+    return Fragmento(ruta, os.path.basename(ruta), "audio/wav", piezas, inicio, duracion)
+
+
+# --- FLAC ---
+
+def _crc8(datos):
+    crc = 0
+    for byte in datos:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def _es_cabecera_trama_flac(datos, i):
+    """
+    Comprueba si en datos[i:] empieza una cabecera de trama FLAC válida
+    (incluido su CRC-8), para no confundir audio con el código de sincronía.
+    """
+    if len(datos) - i < 16:
+        return False
+    b2, b3 = datos[i + 2], datos[i + 3]
+    codigo_bloque, codigo_frecuencia = b2 >> 4, b2 & 0x0F
+    if codigo_bloque == 0 or codigo_frecuencia == 15 or (b3 >> 4) > 10 or b3 & 0x01:
+        return False
+    if (b3 >> 1) & 0x07 in (3, 7):
+        return False
+
+    # Número de trama/muestra codificado en UTF-8 (1 a 7 bytes)
+    primero = datos[i + 4]
+    if primero < 0x80:
+        largo = 1
+    elif primero >= 0xC0:
+        largo = 8 - (primero ^ 0xFF).bit_length()
+        if largo < 2 or largo > 7:
+            return False
+    else:
+        return False
+    fin = i + 4 + largo
+    fin += {6: 1, 7: 2}.get(codigo_bloque, 0)
+    fin += {12: 1, 13: 2, 14: 2}.get(codigo_frecuencia, 0)
+    if fin >= len(datos):
+        return False
+    return _crc8(datos[i:fin]) == datos[fin]
+
+
+def _buscar_trama_flac(f, desde, limite):
+    """
+    Devuelve el offset de la primera trama FLAC a partir de `desde`.
+    """
+    posicion = desde
+    while posicion < limite:
+        f.seek(posicion)
+        datos = f.read(min(TAM_BLOQUE + 32, limite - posicion + 32))
+        if len(datos) < 16:
+            break
+        i = datos.find(b"\xff")
+        while 0 <= i < len(datos) - 16:
+            if datos[i + 1] in (0xF8, 0xF9) and _es_cabecera_trama_flac(datos, i):
+                return posicion + i
+            i = datos.find(b"\xff", i + 1)
+        posicion += TAM_BLOQUE
+    return None
+
+
+def _fragmento_flac(f, ruta, inicio, duracion):
+    if f.read(4) != b"fLaC":
+        raise ValueError("Firma fLaC no válida")
+
+    streaminfo = None
+    while True:
+        cabecera = f.read(4)
+        if len(cabecera) < 4:
+            raise ValueError("Metadatos FLAC incompletos")
+        ultimo = cabecera[0] & 0x80
+        tipo = cabecera[0] & 0x7F
+        tamano = int.from_bytes(cabecera[1:4], "big")
+        if tipo == 0:
+            streaminfo = bytearray(f.read(tamano))
+        else:
+            f.seek(tamano, os.SEEK_CUR)
+        if ultimo:
+            break
+    if streaminfo is None or len(streaminfo) < 34:
+        raise ValueError("Falta el bloque STREAMINFO")
+
+    empaquetado = int.from_bytes(streaminfo[10:18], "big")
+    frecuencia = empaquetado >> 44
+    total_muestras = empaquetado & ((1 << 36) - 1)
+    inicio_audio = f.tell()
+    tamano_archivo = os.fstat(f.fileno()).st_size
+    bytes_audio = tamano_archivo - inicio_audio
+    total = total_muestras / frecuencia if frecuencia and total_muestras else 0.0
+    if not total:
+        raise ValueError("Duración FLAC desconocida")
+
+    inicio, duracion = _rango_recorte(inicio, duracion, total)
+    desde = _buscar_trama_flac(f, inicio_audio + int(bytes_audio * inicio / total), tamano_archivo)
+    if desde is None:
+        raise ValueError("No se encontró una trama FLAC")
+    fin_estimado = inicio_audio + int(bytes_audio * (inicio + duracion) / total)
+    hasta = _buscar_trama_flac(f, max(fin_estimado, desde + 1), tamano_archivo) or tamano_archivo
+
+    # STREAMINFO con número total de muestras desconocido (0) y MD5 a cero,
+    # porque ya no corresponden al fragmento; el resto de metadatos
+    # (portadas incluidas) no se envía
+    empaquetado &= ~((1 << 36) - 1)
+    streaminfo[10:18] = empaquetado.to_bytes(8, "big")
+    streaminfo[18:34] = bytes(16)
+    cabecera_nueva = b"fLaC" + bytes([0x80]) + len(streaminfo).to_bytes(3, "big") + bytes(streaminfo)
+
+    piezas = [cabecera_nueva, (desde, hasta - desde)]
+    return Fragmento(ruta, os.path.basename(ruta), "audio/flac", piezas, inicio, duracion)
+
+
+# --- Ogg (Vorbis / Opus) ---
+
+def _leer_pagina_ogg(f, offset):
+    """
+    Lee la cabecera de la página Ogg en `offset`.
+    Devuelve (granule, longitud_total, cuerpo_inicial) o None.
+    """
+    f.seek(offset)
+    cabecera = f.read(27)
+    if len(cabecera) < 27 or cabecera[:4] != b"OggS":
+        return None
+    granule = struct.unpack_from("<q", cabecera, 6)[0]
+    segmentos = f.read(cabecera[26])
+    longitud = 27 + len(segmentos) + sum(segmentos)
+    return granule, longitud, f.read(min(32, sum(segmentos)))
+
+
+def _buscar_pagina_ogg(f, desde, limite):
+    posicion = desde
+    while posicion < limite:
+        f.seek(posicion)
+        datos = f.read(TAM_BLOQUE + 4)
+        i = datos.find(b"OggS")
+        while i >= 0:
+            if _leer_pagina_ogg(f, posicion + i) is not None:
+                return posicion + i
+            i = datos.find(b"OggS", i + 1)
+        if len(datos) <= 4:
+            break
+        posicion += TAM_BLOQUE
+    return None
+
+
+def _ultimo_granule_ogg(f, tamano_archivo):
+    f.seek(max(tamano_archivo - TAM_BLOQUE, 0))
+    datos = f.read()
+    i = datos.rfind(b"OggS")
+    while i >= 0:
+        if i + 14 <= len(datos):
+            granule = struct.unpack_from("<q", datos, i + 6)[0]
+            if granule > 0:
+                return granule
+        i = datos.rfind(b"OggS", 0, i)
+    return 0
+
+
+def _fragmento_ogg(f, ruta, inicio, duracion):
+    tamano_archivo = os.fstat(f.fileno()).st_size
+    pagina = _leer_pagina_ogg(f, 0)
+    if pagina is None:
+        raise ValueError("Firma OggS no válida")
+
+    _, longitud, cuerpo = pagina
+    if cuerpo.startswith(b"\x01vorbis"):
+        frecuencia = struct.unpack_from("<I", cuerpo, 12)[0]
+        tipo_mime = "audio/ogg"
+    elif cuerpo.startswith(b"OpusHead"):
+        frecuencia = 48000
+        tipo_mime = "audio/ogg"
+    else:
+        raise ValueError("Códec Ogg no soportado")
+
+    # Las páginas de cabecera (granule 0) se copian siempre
+    offset = 0
+    while True:
+        pagina = _leer_pagina_ogg(f, offset)
+        if pagina is None or pagina[0] > 0:
+            break
+        offset += pagina[1]
+    fin_cabeceras = offset
+
+    total = _ultimo_granule_ogg(f, tamano_archivo) / frecuencia
+    if not total:
+        raise ValueError("Duración Ogg desconocida")
+    inicio, duracion = _rango_recorte(inicio, duracion, total)
+
+    bytes_audio = tamano_archivo - fin_cabeceras
+    desde = _buscar_pagina_ogg(f, fin_cabeceras + int(bytes_audio * inicio / total), tamano_archivo)
+    if desde is None:
+        raise ValueError("No se encontró una página Ogg")
+
+    # Avanzar página a página hasta cubrir la duración pedida
+    muestra_final = (inicio + duracion) * frecuencia
+    hasta = desde
+    while hasta < tamano_archivo:
+        pagina = _leer_pagina_ogg(f, hasta)
+        if pagina is None:
+            break
+        hasta += pagina[1]
+        if pagina[0] >= muestra_final:
+            break
+
+    # Las páginas se copian tal cual (sus CRC siguen siendo válidos); el salto
+    # en el número de secuencia se interpreta como datos perdidos, algo que
+    # los decodificadores toleran
+    piezas = [(0, fin_cabeceras), (desde, hasta - desde)]
+    return Fragmento(ruta, os.path.basename(ruta), tipo_mime, piezas, inicio, duracion)
+
+
+# --- MP3 ---
+
+
+def _buscar_trama_mp3(f, desde, limite):
+    posicion = desde
+    while posicion < min(limite, desde + VENTANA_BUSQUEDA):
+        f.seek(posicion)
+        datos = f.read(TAM_BLOQUE + 4)
+        i = datos.find(b"\xff")
+        while 0 <= i < len(datos) - 4:
+            cabecera = cabecera_mp3(datos, i)
+            if cabecera is not None:
+                return posicion + i, cabecera
+            i = datos.find(b"\xff", i + 1)
+        if len(datos) <= 4:
+            break
+        posicion += TAM_BLOQUE
+    return None, None
+
+
+def _fragmento_mp3(f, ruta, inicio, duracion):
+    tamano_archivo = os.fstat(f.fileno()).st_size
+    inicio_audio = inicio_audio_mp3(f.read(10))
+
+    primera, cabecera_trama = _buscar_trama_mp3(f, inicio_audio, tamano_archivo)
+    if primera is None:
+        raise ValueError("No se encontró una trama MP3")
+
+    # La duración real (Xing/VBRI o recorrido de tramas) da el bitrate medio,
+    # válido también en VBR; si no se pudo obtener se usa el de la primera trama
+    total = probar_duracion(ruta)
+    if total:
+        bytes_por_segundo = (tamano_archivo - primera) / total
+    else:
+        bytes_por_segundo = cabecera_trama[0] * 1000 / 8
+        total = (tamano_archivo - primera) / bytes_por_segundo
+    inicio, duracion = _rango_recorte(inicio, duracion, total)
+
+    desde, _ = _buscar_trama_mp3(f, primera + int(inicio * bytes_por_segundo), tamano_archivo)
+    if desde is None:
+        raise ValueError("No se encontró una trama MP3 en el punto de corte")
+    longitud = min(int(duracion * bytes_por_segundo), tamano_archivo - desde)
+    return Fragmento(ruta, os.path.basename(ruta), "audio/mpeg", [(desde, longitud)], inicio, duracion)
+
+
+_EXTRACTORES = {
+    ".wav": _fragmento_wav,
+    ".flac": _fragmento_flac,
+    ".ogg": _fragmento_ogg,
+    ".oga": _fragmento_ogg,
+    ".opus": _fragmento_ogg,
+    ".mp3": _fragmento_mp3,
+}
+
+
+def extraer_fragmento(ruta_archivo_audio, inicio=None, duracion=None):
+    """
+    Prepara un fragmento corto del audio (WAV, FLAC, Ogg o MP3) para
+    enviarlo a reconocimiento sin subir el archivo completo. Solo se leen
+    las cabeceras; el audio se lee en bloques al enviarlo.
+
+    Devuelve None si el formato no está soportado o no se pudo analizar.
+    Lanza FileNotFoundError si el archivo no existe.
+    """
+    inicio = float(os.getenv("AUDD_FRAGMENTO_INICIO", INICIO)) if inicio is None else inicio
+    duracion = float(os.getenv("AUDD_FRAGMENTO_DURACION", DURACION)) if duracion is None else duracion
+
+    extension = os.path.splitext(ruta_archivo_audio)[1].lower()
+    extractor = _EXTRACTORES.get(extension)
+    with open(ruta_archivo_audio, "rb") as f:
+        if extractor is None:
+            return None
+        try:
+            return extractor(f, ruta_archivo_audio, inicio, duracion)
+        except (ValueError, IndexError, struct.error, ZeroDivisionError):
+            return None
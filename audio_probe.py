@@ -0,0 +1,261 @@
+import mmap
+import os
+import struct
+
+# Bytes leídos del principio (y del final, en Ogg) de cada archivo
+TAM_CABECERA = 64 * 1024
+
+_BITRATES_MPEG1_L3 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_MPEG2_L3 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_FRECUENCIAS_MPEG1 = (44100, 48000, 32000)
+
+
+def cabecera_mp3(datos, i):
+    """
+    Interpreta una cabecera de trama MPEG capa III en datos[i:].
+    Devuelve (bitrate_kbps, frecuencia, muestras_por_trama, longitud_trama,
+    mono) o None si no es una cabecera válida.
+    """
+    if i + 4 > len(datos) or datos[i] != 0xFF or (datos[i + 1] & 0xE0) != 0xE0:
+        return None
+    version = (datos[i + 1] >> 3) & 0x03  # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+    capa = (datos[i + 1] >> 1) & 0x03  # 1 = capa III
+    indice_bitrate = datos[i + 2] >> 4
+    indice_frecuencia = (datos[i + 2] >> 2) & 0x03
+    if version == 1 or capa != 1 or indice_bitrate in (0, 15) or indice_frecuencia == 3:
+        return None
+    relleno = (datos[i + 2] >> 1) & 0x01
+    mono = (datos[i + 3] >> 6) == 3
+    if version == 3:
+        bitrate = _BITRATES_MPEG1_L3[indice_bitrate]
+        frecuencia = _FRECUENCIAS_MPEG1[indice_frecuencia]
+        return bitrate, frecuencia, 1152, 144000 * bitrate // frecuencia + relleno, mono
+    bitrate = _BITRATES_MPEG2_L3[indice_bitrate]
+    frecuencia = _FRECUENCIAS_MPEG1[indice_frecuencia] // (2 if version == 2 else 4)
+    return bitrate, frecuencia, 576, 72000 * bitrate // frecuencia + relleno, mono
+
+
+def inicio_audio_mp3(cabecera):
+    """
+    Offset donde termina la etiqueta ID3v2 (0 si no hay).
+    """
+    if len(cabecera) >= 10 and cabecera[:3] == b"ID3":
+        tamano = (cabecera[6] << 21) | (cabecera[7] << 14) | (cabecera[8] << 7) | cabecera[9]
+        pie = 10 if cabecera[5] & 0x10 else 0
+        return 10 + tamano + pie
+    return 0
+
+
+def _primera_trama_mp3(datos, desde):
+    """
+    Busca la primera trama que va seguida de otra trama válida (para no
+    confundir datos con el código de sincronía).
+    """
+    i = datos.find(b"\xff", desde)
+    while 0 <= i < len(datos) - 4:
+        trama = cabecera_mp3(datos, i)
+        if trama is not None:
+            siguiente = i + trama[3]
+            if siguiente + 4 > len(datos) or cabecera_mp3(datos, siguiente) is not None:
+                return i, trama
+        i = datos.find(b"\xff", i + 1)
+    return None, None
+
+
+def _duracion_mp3(f, tamano_archivo):
+    cabecera = f.read(10)
+    inicio = inicio_audio_mp3(cabecera)
+    f.seek(inicio)
+    datos = f.read(TAM_CABECERA)
+    offset, trama = _primera_trama_mp3(datos, 0)
+    if trama is None:
+        return None
+    bitrate, frecuencia, muestras, longitud, mono = trama
+
+    # Cabecera Xing/Info (codificadores LAME) tras la información lateral
+    if muestras == 1152:
+        lateral = 17 if mono else 32
+    else:
+        lateral = 9 if mono else 17
+    xing = offset + 4 + lateral
+    if datos[xing:xing + 4] in (b"Xing", b"Info"):
+        banderas = struct.unpack_from(">I", datos, xing + 4)[0]
+        if banderas & 0x01:
+            tramas = struct.unpack_from(">I", datos, xing + 8)[0]
+            return tramas * muestras / frecuencia
+
+    # Cabecera VBRI (codificador de Fraunhofer), siempre 32 bytes tras la cabecera
+    vbri = offset + 4 + 32
+    if datos[vbri:vbri + 4] == b"VBRI":
+        tramas = struct.unpack_from(">I", datos, vbri + 14)[0]
+        return tramas * muestras / frecuencia
+
+    bytes_audio = tamano_archivo - inicio - offset
+    # Sin cabecera VBR: si las primeras tramas tienen el mismo bitrate se
+    # asume CBR y basta con el tamaño del archivo
+    posicion = offset
+    constante = True
+    for _ in range(8):
+        posicion += cabecera_mp3(datos, posicion)[3]
+        siguiente = cabecera_mp3(datos, posicion)
+        if siguiente is None:
+            break
+        if siguiente[0] != bitrate:
+            constante = False
+            break
+    if constante:
+        return bytes_audio * 8 / (bitrate * 1000)
+
+    # VBR sin cabecera: recorrer todas las tramas sobre un mmap
+    return _recorrer_tramas_mp3(f, inicio + offset, muestras, frecuencia)
+
+
+def _recorrer_tramas_mp3(f, desde, muestras, frecuencia):
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+        total = 0
+        posicion = desde
+        limite = len(datos) - 4
+        while posicion <= limite:
+            trama = cabecera_mp3(datos, posicion)
+            if trama is None:
+                # Resincronizar (etiquetas intermedias, datos corruptos)
+                posicion = datos.find(b"\xff", posicion + 1)
+                if posicion < 0:
+                    break
+                continue
+            total += 1
+            posicion += trama[3]
+    return total * muestras / frecuencia if total else None
+
+
+def _duracion_wav(f, tamano_archivo):
+    cabecera = f.read(12)
+    if cabecera[:4] != b"RIFF" or cabecera[8:12] != b"WAVE":
+        return None
+    bytes_por_segundo = None
+    while True:
+        bloque = f.read(8)
+        if len(bloque) < 8:
+            return None
+        ident, tamano = struct.unpack("<4sI", bloque)
+        if ident == b"fmt ":
+            fmt = f.read(tamano)
+            bytes_por_segundo = struct.unpack_from("<I", fmt, 8)[0]
+            if tamano & 1:
+                f.seek(1, os.SEEK_CUR)
+        elif ident == b"data":
+            if not bytes_por_segundo:
+                return None
+            return min(tamano, tamano_archivo - f.tell()) / bytes_por_segundo
+        else:
+            f.seek(tamano + (tamano & 1), os.SEEK_CUR)
+
+
+def _duracion_flac(f, tamano_archivo):
+    cabecera = f.read(4 + 4 + 34)
+    if cabecera[:4] != b"fLaC" or (cabecera[4] & 0x7F) != 0:
+        return None
+    empaquetado = int.from_bytes(cabecera[18:26], "big")
+    frecuencia = empaquetado >> 44
+    total_muestras = empaquetado & ((1 << 36) - 1)
+    if not frecuencia or not total_muestras:
+        return None
+    return total_muestras / frecuencia
+
+
+def _duracion_ogg(f, tamano_archivo):
+    cabecera = f.read(TAM_CABECERA)
+    if cabecera[:4] != b"OggS":
+        return None
+    cuerpo = 27 + cabecera[26]
+    if cabecera[cuerpo:cuerpo + 7] == b"\x01vorbis":
+        frecuencia = struct.unpack_from("<I", cabecera, cuerpo + 12)[0]
+        pre_skip = 0
+    elif cabecera[cuerpo:cuerpo + 8] == b"OpusHead":
+        frecuencia = 48000
+        pre_skip = struct.unpack_from("<H", cabecera, cuerpo + 10)[0]
+    else:
+        return None
+
+    # El granule de la última página es el número total de muestras
+    tam_cola = TAM_CABECERA
+    while True:
+        f.seek(max(tamano_archivo - tam_cola, 0))
+        cola = f.read(tam_cola)
+        i = cola.rfind(b"OggS")
+        while i >= 0:
+            if i + 14 <= len(cola):
+                granule = struct.unpack_from("<q", cola, i + 6)[0]
+                if granule > 0:
+                    return max(granule - pre_skip, 0) / frecuencia
+            i = cola.rfind(b"OggS", 0, i)
+        if tam_cola >= tamano_archivo:
+            return None
+        tam_cola *= 4
+
+
+def _duracion_mp4(f, tamano_archivo):
+    """
+    Lee la duración del átomo moov/mvhd de un M4A/MP4.
+    """
+    posicion = 0
+    limite = tamano_archivo
+    contenedores = (b"moov",)
+    while posicion + 8 <= limite:
+        f.seek(posicion)
+        cabecera = f.read(16)
+        if len(cabecera) < 8:
+            return None
+        tamano, tipo = struct.unpack(">I4s", cabecera[:8])
+        cabecera_len = 8
+        if tamano == 1:
+            tamano = struct.unpack(">Q", cabecera[8:16])[0]
+            cabecera_len = 16
+        elif tamano == 0:
+            tamano = limite - posicion
+        if tamano < cabecera_len:
+            return None
+        if tipo in contenedores:
+            posicion += cabecera_len
+            limite = posicion - cabecera_len + tamano
+            contenedores = ()
+            continue
+        if tipo == b"mvhd":
+            f.seek(posicion + cabecera_len)
+            mvhd = f.read(32)
+            if mvhd[0] == 1:
+                escala, duracion = struct.unpack_from(">IQ", mvhd, 20)
+            else:
+                escala, duracion = struct.unpack_from(">II", mvhd, 12)
+            return duracion / escala if escala else None
+        posicion += tamano
+    return None
+
+
+_PROBADORES = {
+    ".mp3": _duracion_mp3,
+    ".wav": _duracion_wav,
+    ".flac": _duracion_flac,
+    ".ogg": _duracion_ogg,
+    ".oga": _duracion_ogg,
+    ".opus": _duracion_ogg,
+    ".m4a": _duracion_mp4,
+    ".mp4": _duracion_mp4,
+}
+
+
+def probar_duracion(ruta_archivo_audio):
+    """
+    Obtiene la duración en segundos leyendo solo las cabeceras del archivo
+    (MP3 con Xing/VBRI o recorrido de tramas, WAV, FLAC, Ogg Vorbis/Opus y
+    M4A). Devuelve None si el formato no está soportado o no se pudo leer.
+    """
+    extension = os.path.splitext(ruta_archivo_audio)[1].lower()
+    probador = _PROBADORES.get(extension)
+    if probador is None:
+        return None
+    try:
+        with open(ruta_archivo_audio, "rb") as f:
+            return probador(f, os.fstat(f.fileno()).st_size)
+    except (OSError, ValueError, IndexError, TypeError, struct.error):
+        return None
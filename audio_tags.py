@@ -0,0 +1,253 @@
+import os
+import struct
+from collections import namedtuple
+
+# Máximo de bytes leídos para buscar las etiquetas (las carátulas incrustadas
+# pueden ocupar megas; los campos de texto suelen ir antes)
+MAX_BYTES_ETIQUETAS = 256 * 1024
+
+Etiquetas = namedtuple("Etiquetas", ["artista", "titulo", "album"])
+
+ETIQUETAS_VACIAS = Etiquetas(None, None, None)
+
+_MARCOS_ID3 = {
+    "TPE1": "artista", "TP1": "artista",
+    "TIT2": "titulo", "TT2": "titulo",
+    "TALB": "album", "TAL": "album",
+}
+
+_CLAVES_VORBIS = {
+    "ARTIST": "artista",
+    "TITLE": "titulo",
+    "ALBUM": "album",
+    "ALBUMARTIST": "artista_album",
+}
+
+_CLAVES_INFO_WAV = {b"IART": "artista", b"INAM": "titulo", b"IPRD": "album"}
+
+
+def _limpiar(texto):
+    texto = texto.split("\x00", 1)[0].strip()
+    return texto or None
+
+
+def _syncsafe(datos):
+    return (datos[0] << 21) | (datos[1] << 14) | (datos[2] << 7) | datos[3]
+
+
+def _decodificar_texto_id3(datos):
+    if not datos:
+        return None
+    codificacion, cuerpo = datos[0], datos[1:]
+    if codificacion == 0:
+        return _limpiar(cuerpo.decode("latin-1"))
+    if codificacion == 1:
+        return _limpiar(cuerpo.decode("utf-16", errors="replace"))
+    if codificacion == 2:
+        return _limpiar(cuerpo.decode("utf-16-be", errors="replace"))
+    return _limpiar(cuerpo.decode("utf-8", errors="replace"))
+
+
+def _etiquetas_id3v2(f):
+    cabecera = f.read(10)
+    if len(cabecera) < 10 or cabecera[:3] != b"ID3":
+        return {}
+    version, banderas = cabecera[3], cabecera[5]
+    tamano = _syncsafe(cabecera[6:10])
+    datos = f.read(min(tamano, MAX_BYTES_ETIQUETAS))
+
+    if version < 4 and banderas & 0x80:
+        # Desincronización de toda la etiqueta (v2.2/v2.3)
+        datos = datos.replace(b"\xff\x00", b"\xff")
+    posicion = 0
+    if banderas & 0x40 and version >= 3:
+        extendida = _syncsafe(datos[:4]) if version == 4 else struct.unpack(">I", datos[:4])[0] + 4
+        posicion = extendida
+
+    if version == 2:
+        tam_id, tam_cabecera = 3, 6
+    else:
+        tam_id, tam_cabecera = 4, 10
+
+    valores = {}
+    while posicion + tam_cabecera <= len(datos) and len(valores) < 3:
+        ident = datos[posicion:posicion + tam_id]
+        if not ident.strip(b"\x00"):
+            break  # Relleno
+        if version == 2:
+            tamano_marco = int.from_bytes(datos[posicion + 3:posicion + 6], "big")
+        elif version == 4:
+            tamano_marco = _syncsafe(datos[posicion + 4:posicion + 8])
+        else:
+            tamano_marco = struct.unpack_from(">I", datos, posicion + 4)[0]
+        inicio = posicion + tam_cabecera
+        campo = _MARCOS_ID3.get(ident.decode("latin-1"))
+        if campo and campo not in valores:
+            texto = _decodificar_texto_id3(datos[inicio:inicio + tamano_marco])
+            if texto:
+                valores[campo] = texto
+        posicion = inicio + tamano_marco
+    return valores
+
+
+def _etiquetas_id3v1(f):
+    f.seek(0, os.SEEK_END)
+    if f.tell() < 128:
+        return {}
+    f.seek(-128, os.SEEK_END)
+    datos = f.read(128)
+    if datos[:3] != b"TAG":
+        return {}
+    valores = {
+        "titulo": _limpiar(datos[3:33].decode("latin-1")),
+        "artista": _limpiar(datos[33:63].decode("latin-1")),
+        "album": _limpiar(datos[63:93].decode("latin-1")),
+    }
+    return {campo: valor for campo, valor in valores.items() if valor}
+
+
+def _comentarios_vorbis(datos, posicion=0):
+    """
+    Interpreta un bloque de comentarios Vorbis (vendor + lista KEY=valor).
+    Tolera bloques truncados.
+    """
+    valores = {}
+    tam_vendor = struct.unpack_from("<I", datos, posicion)[0]
+    posicion += 4 + tam_vendor
+    cantidad = struct.unpack_from("<I", datos, posicion)[0]
+    posicion += 4
+    for _ in range(cantidad):
+        if posicion + 4 > len(datos):
+            break
+        longitud = struct.unpack_from("<I", datos, posicion)[0]
+        posicion += 4
+        comentario = datos[posicion:posicion + longitud]
+        posicion += longitud
+        clave, _, valor = comentario.partition(b"=")
+        campo = _CLAVES_VORBIS.get(clave.decode("ascii", errors="replace").upper())
+        if campo and campo not in valores:
+            valor = _limpiar(valor.decode("utf-8", errors="replace"))
+            if valor:
+                valores[campo] = valor
+    if "artista" not in valores and "artista_album" in valores:
+        # Algunos codificadores solo escriben ALBUMARTIST
+        valores["artista"] = valores["artista_album"]
+    return valores
+
+
+def _etiquetas_flac(f):
+    if f.read(4) != b"fLaC":
+        return {}
+    while True:
+        cabecera = f.read(4)
+        if len(cabecera) < 4:
+            return {}
+        tipo = cabecera[0] & 0x7F
+        tamano = int.from_bytes(cabecera[1:4], "big")
+        if tipo == 4:  # VORBIS_COMMENT
+            return _comentarios_vorbis(f.read(min(tamano, MAX_BYTES_ETIQUETAS)))
+        if cabecera[0] & 0x80:
+            return {}  # Último bloque de metadatos
+        f.seek(tamano, os.SEEK_CUR)
+
+
+def _etiquetas_ogg(f):
+    """
+    Reconstruye el segundo paquete (comentarios) de un Ogg Vorbis u Opus
+    a partir de las primeras páginas.
+    """
+    datos = f.read(MAX_BYTES_ETIQUETAS)
+    posicion = 0
+    paquetes = []
+    actual = bytearray()
+    while len(paquetes) < 2 and posicion + 27 <= len(datos) and datos[posicion:posicion + 4] == b"OggS":
+        segmentos = datos[posicion + 26]
+        tabla = datos[posicion + 27:posicion + 27 + segmentos]
+        cuerpo = posicion + 27 + segmentos
+        for tam in tabla:
+            actual += datos[cuerpo:cuerpo + tam]
+            cuerpo += tam
+            if tam < 255:
+                paquetes.append(bytes(actual))
+                actual = bytearray()
+                if len(paquetes) == 2:
+                    break
+        posicion = cuerpo
+    if len(paquetes) < 2:
+        # Paquete de comentarios truncado por el límite de lectura
+        paquetes.append(bytes(actual))
+    comentarios = paquetes[1]
+    if comentarios.startswith(b"\x03vorbis"):
+        return _comentarios_vorbis(comentarios, 7)
+    if comentarios.startswith(b"OpusTags"):
+        return _comentarios_vorbis(comentarios, 8)
+    return {}
+
+
+def _etiquetas_wav(f):
+    """
+    Busca la lista LIST/INFO y el bloque "id3 " de un WAV.
+    """
+    cabecera = f.read(12)
+    if cabecera[:4] != b"RIFF" or cabecera[8:12] != b"WAVE":
+        return {}
+    valores = {}
+    while True:
+        bloque = f.read(8)
+        if len(bloque) < 8:
+            return valores
+        ident, tamano = struct.unpack("<4sI", bloque)
+        siguiente = f.tell() + tamano + (tamano & 1)
+        if ident == b"LIST":
+            datos = f.read(min(tamano, MAX_BYTES_ETIQUETAS))
+            if datos[:4] == b"INFO":
+                posicion = 4
+                while posicion + 8 <= len(datos):
+                    sub, longitud = struct.unpack_from("<4sI", datos, posicion)
+                    campo = _CLAVES_INFO_WAV.get(sub)
+                    if campo:
+                        texto = datos[posicion + 8:posicion + 8 + longitud]
+                        valor = _limpiar(texto.decode("utf-8", errors="replace"))
+                        if valor:
+                            valores.setdefault(campo, valor)
+                    posicion += 8 + longitud + (longitud & 1)
+        elif ident in (b"id3 ", b"ID3 "):
+            # Las etiquetas ID3 tienen prioridad sobre LIST/INFO
+            valores.update(_etiquetas_id3v2(f))
+        f.seek(siguiente)
+
+
+def _etiquetas_mp3(f):
+    valores = _etiquetas_id3v2(f)
+    if len(valores) < 3:
+        for campo, valor in _etiquetas_id3v1(f).items():
+            valores.setdefault(campo, valor)
+    return valores
+
+
+_LECTORES = {
+    ".mp3": _etiquetas_mp3,
+    ".wav": _etiquetas_wav,
+    ".flac": _etiquetas_flac,
+    ".ogg": _etiquetas_ogg,
+    ".oga": _etiquetas_ogg,
+    ".opus": _etiquetas_ogg,
+}
+
+
+def leer_etiquetas(ruta_archivo_audio):
+    """
+    Lee artista, título y álbum de las etiquetas del archivo (ID3v2/ID3v1
+    en MP3, LIST/INFO o ID3 en WAV y comentarios Vorbis en FLAC y Ogg). Los campos ausentes valen
+    None; nunca lanza por etiquetas dañadas.
+    """
+    extension = os.path.splitext(ruta_archivo_audio)[1].lower()
+    lector = _LECTORES.get(extension)
+    if lector is None:
+        return ETIQUETAS_VACIAS
+    try:
+        with open(ruta_archivo_audio, "rb") as f:
+            valores = lector(f)
+    except (OSError, ValueError, IndexError, struct.error):
+        return ETIQUETAS_VACIAS
+    return Etiquetas(valores.get("artista"), valores.get("titulo"), valores.get("album"))
@@ -0,0 +1,110 @@
+"""
+Benchmark del parser LRC.
+
+Uso:
+    python benchmarks/bench_lrc_parser.py                # corpus sintético
+    python benchmarks/bench_lrc_parser.py carpeta_lrc/   # archivos .lrc reales
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lrc_parser import parse_lrc  # noqa: E402
+
+PALABRAS = "amor noche luz corazón baila canta sueño fuego mar cielo vida tiempo".split()
+
+
+def generar_lrc(rng, lineas=60, mejorado=False):
+    """
+    Genera un archivo LRC sintético con etiquetas repetidas y metadatos.
+    """
+    salida = ["[ar:Artista]", "[ti:Canción]", "[offset:+150]"]
+    t = 0.0
+    for _ in range(lineas):
+        t += rng.uniform(1.5, 6.0)
+        palabras = rng.choices(PALABRAS, k=rng.randint(3, 9))
+        if mejorado:
+            partes = []
+            tp = t
+            for palabra in palabras:
+                partes.append(f"<{int(tp // 60):02d}:{tp % 60:06.3f}>{palabra}")
+                tp += 0.3
+            texto = " ".join(partes)
+        else:
+            texto = " ".join(palabras)
+        etiqueta = f"[{int(t // 60):02d}:{t % 60:05.2f}]"
+        if rng.random() < 0.1:
+            t2 = t + 60
+            etiqueta += f"[{int(t2 // 60):02d}:{t2 % 60:05.2f}]"
+        salida.append(etiqueta + texto)
+    return "\n".join(salida)
+
+
+def parse_lrc_legado(lrc_text):
+    """
+    Implementación anterior (regex por línea, sin caché de patrón), como
+    referencia. No entiende etiquetas repetidas, [offset:] ni tiempos por
+    palabra, así que hace menos trabajo que parse_lrc en el LRC mejorado.
+    """
+    lines = []
+    for line in lrc_text.strip().split("\n"):
+        if not line.strip():
+            continue
+        m = re.match(r"\[(\d{2}):(\d{2})(?:\.(\d{2}))?\]", line)
+        if m:
+            text = line[m.end():].strip()
+            if text:
+                lines.append({"text": text, "timestamp": f"00:{m.group(1)}:{m.group(2)}.{m.group(3) or '00'}0"})
+    return lines
+
+
+def cargar_corpus(argv):
+    if len(argv) > 1:
+        corpus = []
+        for raiz, _, archivos in os.walk(argv[1]):
+            for nombre in archivos:
+                if nombre.lower().endswith(".lrc"):
+                    with open(os.path.join(raiz, nombre), encoding="utf-8", errors="replace") as f:
+                        corpus.append(f.read())
+        return corpus
+    rng = random.Random(42)
+    return [generar_lrc(rng, mejorado=(i % 5 == 0)) for i in range(5000)]
+
+
+def medir(nombre, funcion, corpus, repeticiones=3):
+    lineas = sum(texto.count("\n") + 1 for texto in corpus)
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for texto in corpus:
+            funcion(texto)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    print(
+        f"{nombre:<12} {len(corpus) / mejor:>10.0f} archivos/s "
+        f"{lineas / mejor:>12.0f} líneas/s  ({mejor * 1000:.1f} ms)"
+    )
+
+
+def main():
+    corpus = cargar_corpus(sys.argv)
+    if not corpus:
+        print("❌ No se encontraron archivos .lrc")
+        return 1
+    print(f"📚 Corpus: {len(corpus)} archivos")
+    medir("parse_lrc", parse_lrc, corpus)
+    medir("legado", parse_lrc_legado, corpus)
+
+    simples = [texto for texto in corpus if "<" not in texto]
+    if simples and len(simples) != len(corpus):
+        print(f"📄 Solo LRC simple: {len(simples)} archivos")
+        medir("parse_lrc", parse_lrc, simples)
+        medir("legado", parse_lrc_legado, simples)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
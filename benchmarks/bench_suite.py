@@ -0,0 +1,449 @@
+"""
+Suite de benchmarks: parser LRC, timestamps simulados, alineación con el
+audio, log JSONL, paquete de letras y la búsqueda completa de obtener_letra_sincronizada contra servidores falsos
+de LRCLIB y Audd.io (ver stub_servers.py).
+
+Uso:
+    python benchmarks/bench_suite.py                          # todo
+    python benchmarks/bench_suite.py --solo parseo,log        # algunos casos
+    python benchmarks/bench_suite.py --latencia 0.1 --fallos 0.05 --hilos 16
+    python benchmarks/bench_suite.py --guardar base.json      # guardar referencia
+    python benchmarks/bench_suite.py --comparar base.json     # detectar regresiones
+
+Con --comparar, el código de salida es 1 si algún caso empeora más que la
+tolerancia (por defecto 20 %) en rendimiento o en p95.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_lrc_parser import PALABRAS, generar_lrc  # noqa: E402
+from stub_servers import ConfiguracionStub, iniciar_stub  # noqa: E402
+
+CASOS = ("parseo", "timestamps", "alineacion", "log", "paquete", "e2e")
+
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    posicion = (len(valores_ordenados) - 1) * p / 100.0
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * (
+        posicion - inferior
+    )
+
+
+def resultado(nombre, latencias, operaciones, duracion, **extra):
+    """
+    Resume un caso: operaciones por segundo y percentiles de latencia (ms).
+    """
+    latencias = sorted(latencias)
+    datos = {
+        "nombre": nombre,
+        "operaciones": operaciones,
+        "ops_s": operaciones / duracion if duracion else 0.0,
+    }
+    for p in (50, 95, 99):
+        # Sin latencias por operación (p. ej. un vaciado en bloque) no hay percentiles
+        datos[f"p{p}_ms"] = _percentil(latencias, p) * 1000 if latencias else None
+    datos.update(extra)
+    return datos
+
+
+def medir_lotes(nombre, funcion, entradas, lote, repeticiones):
+    """
+    Mide funcion(entrada) por lotes (así la medición no pesa más que las
+    llamadas muy cortas); la latencia de cada operación es la media de su lote.
+    """
+    latencias = []
+    total = 0.0
+    for _ in range(repeticiones):
+        for i in range(0, len(entradas), lote):
+            bloque = entradas[i:i + lote]
+            inicio = time.perf_counter()
+            for entrada in bloque:
+                funcion(entrada)
+            transcurrido = time.perf_counter() - inicio
+            total += transcurrido
+            latencias.extend([transcurrido / len(bloque)] * len(bloque))
+    return resultado(nombre, latencias, len(entradas) * repeticiones, total)
+
+
+def caso_parseo(args):
+    from lyrics_finder import parse_lrc_lyrics
+
+    rng = random.Random(42)
+    corpus = [generar_lrc(rng, mejorado=(i % 5 == 0)) for i in range(args.canciones)]
+    return [medir_lotes("parse_lrc_lyrics", parse_lrc_lyrics, corpus, 10, args.repeticiones)]
+
+
+def caso_timestamps(args):
+    from lyrics_finder import calcular_tiempo_linea, crear_timestamps_inteligentes
+
+    rng = random.Random(7)
+    letras = []
+    for _ in range(args.canciones):
+        lineas = [" ".join(rng.choices(PALABRAS, k=rng.randint(2, 12))) for _ in range(rng.randint(20, 60))]
+        lineas[0] = "[Verse 1]"
+        lineas[len(lineas) // 2] = "[Chorus]"
+        letras.append(lineas)
+    lineas_sueltas = [(linea, i, letra) for letra in letras[:200] for i, linea in enumerate(letra)]
+    return [
+        medir_lotes(
+            "crear_timestamps_inteligentes", crear_timestamps_inteligentes, letras, 10, args.repeticiones
+        ),
+        medir_lotes(
+            "calcular_tiempo_linea",
+            lambda entrada: calcular_tiempo_linea(*entrada),
+            lineas_sueltas,
+            100,
+            args.repeticiones,
+        ),
+    ]
+
+
+def _crear_wav_cantado(ruta, rng, segundos):
+    """
+    WAV sintético con un fondo de bajo y ruido y "frases" armónicas en
+    instantes aleatorios. Devuelve el número de frases.
+    """
+    import numpy as np
+
+    frecuencia = 22050
+    t = np.arange(frecuencia * segundos) / frecuencia
+    ruido = np.random.default_rng(rng.randrange(2 ** 32)).standard_normal(t.size)
+    audio = 0.15 * np.sin(2 * np.pi * 70 * t) + 0.02 * ruido
+    instante, frases = rng.uniform(2, 8), 0
+    while instante < segundos - 5:
+        largo = rng.uniform(1.5, 4.0)
+        i0, i1 = int(instante * frecuencia), int((instante + largo) * frecuencia)
+        fase = 2 * np.pi * rng.uniform(180, 350) * (t[i0:i1] - instante)
+        audio[i0:i1] += 0.25 * sum(np.sin(k * fase) / k for k in range(1, 7))
+        instante += largo + rng.uniform(0.6, 2.5)
+        frases += 1
+    with wave.open(ruta, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(frecuencia)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return frases
+
+
+def caso_alineacion(args):
+    """
+    alinear_lineas sobre canciones sintéticas de 3 minutos (decodificación,
+    envolvente, frases y reparto). Informa también de cuántas veces más
+    rápido que el tiempo real se procesa el audio.
+    """
+    from lyrics_alignment import alinear_lineas, numpy_disponible
+
+    if not numpy_disponible():
+        print("⚠️ Alineación omitida: NumPy no está instalado", file=sys.stderr)
+        return []
+
+    carpeta = tempfile.mkdtemp(prefix="bench-alineacion-")
+    rng = random.Random(5)
+    segundos = 180
+    entradas = []
+    try:
+        for i in range(4):
+            ruta = os.path.join(carpeta, f"cancion{i}.wav")
+            frases = _crear_wav_cantado(ruta, rng, segundos)
+            lineas = [" ".join(rng.choices(PALABRAS, k=rng.randint(3, 9))) for _ in range(frases)]
+            entradas.append((ruta, lineas))
+        datos = medir_lotes(
+            "alinear_lineas (3 min)", lambda entrada: alinear_lineas(*entrada), entradas, 1, args.repeticiones
+        )
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    datos["x_tiempo_real"] = round(datos["ops_s"] * segundos, 1)
+    return [datos]
+
+
+def caso_log(args):
+    from api_logger import RegistroJsonl
+
+    carpeta = tempfile.mkdtemp(prefix="bench-log-")
+    try:
+        registro = RegistroJsonl(ruta=os.path.join(carpeta, "log.jsonl"), max_bytes=1 << 40)
+        registros = [
+            {
+                "timestamp": "2024-01-01T00:00:00.000",
+                "endpoint": "lrclib_search",
+                "status": "success",
+                "request": {"track": f"Canción {i}", "artist": "Artista", "api_token": "secreto"},
+                "response": {"syncedLyrics": generar_lrc(random.Random(i), lineas=20), "found": True},
+            }
+            for i in range(args.registros)
+        ]
+        # Lo que paga quien llama: encolar sin bloquear
+        encolado = medir_lotes("log_api_response (encolar)", registro.registrar, registros, 100, 1)
+        inicio = time.perf_counter()
+        registro.cerrar(timeout=60)
+        vaciado = time.perf_counter() - inicio
+        escritos = resultado(
+            "log_api_response (escritura)",
+            [],
+            args.registros - registro.descartados,
+            vaciado,
+            descartados=registro.descartados,
+        )
+        return [encolado, escritos]
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def caso_paquete(args):
+    from lrc_parser import parse_lrc
+    from lyrics_pack import ConstructorPaquete, PaqueteLetras
+    from timeline import LyricsTimeline
+
+    rng = random.Random(11)
+    carpeta = tempfile.mkdtemp(prefix="bench-paquete-")
+    ruta = os.path.join(carpeta, "letras.slpk")
+    try:
+        canciones = [
+            (f"Artista {i % 500}", f"Canción {i}", 150 + i % 120, generar_lrc(rng, mejorado=(i % 5 == 0)))
+            for i in range(args.canciones)
+        ]
+        inicio = time.perf_counter()
+        with ConstructorPaquete(ruta) as constructor:
+            for artista, titulo, duracion, lrc in canciones:
+                letras = LyricsTimeline.desde_lineas(parse_lrc(lrc).lineas)
+                constructor.agregar(artista, titulo, duracion, letras, "LRCLIB")
+        construccion = time.perf_counter() - inicio
+        tamano = os.path.getsize(ruta)
+
+        # Abrir el paquete no debe depender del número de canciones
+        apertura = medir_lotes("paquete (abrir)", lambda _: PaqueteLetras(ruta).cerrar(), [None] * 200, 20, 1)
+        apertura["construccion_s"] = round(construccion, 2)
+        apertura["kb_por_cancion"] = round(tamano / 1024 / len(canciones), 2)
+
+        consultas = [rng.choice(canciones)[:3] for _ in range(2000)]
+        with PaqueteLetras(ruta) as paquete:
+            busqueda = medir_lotes(
+                "paquete (buscar)", lambda consulta: paquete.buscar(*consulta), consultas, 50, args.repeticiones
+            )
+        return [apertura, busqueda]
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def _crear_wav(ruta, rng, segundos=3):
+    with wave.open(ruta, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        tamano = 8000 * 2 * segundos
+        f.writeframes(rng.getrandbits(8 * tamano).to_bytes(tamano, "little"))
+
+
+def caso_e2e(args):
+    """
+    obtener_letra_sincronizada de punta a punta contra los servidores falsos:
+    primero con la caché vacía (red) y después con la caché caliente.
+    """
+    import lyrics_finder
+    from metrics import resumen_etapas
+
+    carpeta = tempfile.mkdtemp(prefix="bench-e2e-")
+    rng = random.Random(99)
+    rutas = []
+    for i in range(args.archivos):
+        ruta = os.path.join(carpeta, f"Canción {i:04d} - Artista {i % 37}.wav")
+        _crear_wav(ruta, rng)
+        rutas.append(ruta)
+
+    def resolver(ruta):
+        inicio = time.perf_counter()
+        try:
+            letras, fuente = lyrics_finder.obtener_letra_sincronizada(ruta)
+        except Exception:
+            letras, fuente = None, "error"
+        return time.perf_counter() - inicio, fuente if letras else (fuente or "sin_letra")
+
+    resultados = []
+    try:
+        for fase in ("fría", "caliente"):
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+                    medidas = list(pool.map(resolver, rutas))
+            duracion = time.perf_counter() - inicio
+            fuentes = {}
+            for _, fuente in medidas:
+                fuentes[fuente] = fuentes.get(fuente, 0) + 1
+            resultados.append(
+                resultado(
+                    f"obtener_letra_sincronizada (caché {fase})",
+                    [latencia for latencia, _ in medidas],
+                    len(rutas),
+                    duracion,
+                    fuentes=fuentes,
+                )
+            )
+            if fase == "fría":
+                # Dónde se van los segundos con la caché vacía
+                resultados[-1]["segundos_por_etapa"] = {
+                    etapa: round(datos["suma"], 3) for etapa, datos in resumen_etapas().items()
+                }
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return resultados
+
+
+def configurar_entorno(args, url_stub, carpeta):
+    """
+    Apunta lyrics_finder a los servidores falsos y a archivos temporales.
+    Debe llamarse antes de importar lyrics_finder.
+    """
+    os.environ.update(
+        {
+            "LRCLIB_API_URL": url_stub + "api/",
+            "AUDD_API_URL": url_stub,
+            "API_TOKEN": "benchmark",
+            "LYRICS_CACHE_FILE": os.path.join(carpeta, "cache.sqlite3"),
+            "LYRICS_SEARCH_FILE": os.path.join(carpeta, "busqueda.sqlite3"),
+            "LIBRARY_INDEX_FILE": os.path.join(carpeta, "biblioteca.sqlite3"),
+            "LOG_FILE": os.path.join(carpeta, "api_responses.jsonl"),
+            "LRCLIB_MAX_CONCURRENCIA": str(args.hilos),
+            "AUDD_MAX_CONCURRENCIA": str(args.hilos),
+            "LRCLIB_PETICIONES_POR_SEGUNDO": "0",
+            "AUDD_PETICIONES_POR_SEGUNDO": "0",
+            "PROVIDER_QUOTA_FILE": os.path.join(carpeta, "cuota.sqlite3"),
+            "LYRICS_PACK_FILE": "",
+            "METRICAS_PUERTO": "0",
+            "METRICAS_ARCHIVO": "",
+        }
+    )
+
+
+def imprimir(resultados):
+    print(f"{'caso':<44}{'ops/s':>12}{'p50':>11}{'p95':>11}{'p99':>11}")
+    for r in resultados:
+        percentiles = "".join(
+            f"{r[clave]:>9.3f}ms" if r[clave] is not None else f"{'—':>11}"
+            for clave in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        print(f"{r['nombre']:<44}{r['ops_s']:>12.1f}{percentiles}")
+        if r.get("fuentes"):
+            print(f"{'':<4}fuentes: {r['fuentes']}")
+        if r.get("x_tiempo_real"):
+            print(f"{'':<4}{r['x_tiempo_real']}x más rápido que el tiempo real")
+        if r.get("segundos_por_etapa"):
+            etapas = sorted(r["segundos_por_etapa"].items(), key=lambda e: -e[1])
+            print(f"{'':<4}segundos por etapa: " + ", ".join(f"{e}={s}" for e, s in etapas[:6]))
+
+
+def comparar(resultados, ruta_base, tolerancia):
+    """
+    Compara con una referencia guardada. Devuelve el número de regresiones.
+    """
+    with open(ruta_base, encoding="utf-8") as f:
+        base = {r["nombre"]: r for r in json.load(f)["resultados"]}
+    regresiones = 0
+    print(f"\n📏 Comparación con {ruta_base} (tolerancia {tolerancia:.0%})")
+    for r in resultados:
+        referencia = base.get(r["nombre"])
+        if referencia is None:
+            print(f"   {r['nombre']}: sin referencia")
+            continue
+        cambio_ops = r["ops_s"] / referencia["ops_s"] - 1 if referencia["ops_s"] else 0.0
+        cambio_p95 = (
+            r["p95_ms"] / referencia["p95_ms"] - 1 if r["p95_ms"] and referencia["p95_ms"] else 0.0
+        )
+        empeora = cambio_ops < -tolerancia or cambio_p95 > tolerancia
+        regresiones += empeora
+        marca = "❌" if empeora else "✅"
+        print(f"   {marca} {r['nombre']}: ops/s {cambio_ops:+.1%}, p95 {cambio_p95:+.1%}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de sound-lyrics.")
+    parser.add_argument("--solo", help=f"Casos separados por comas ({', '.join(CASOS)})")
+    parser.add_argument("--canciones", type=int, default=2000, help="Letras para parseo y timestamps")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--registros", type=int, default=20000, help="Registros para el log")
+    parser.add_argument("--archivos", type=int, default=200, help="Archivos para la prueba completa")
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos de la prueba completa")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia de LRCLIB falso (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Latencia extra aleatoria máxima (s)")
+    parser.add_argument("--latencia-audd", type=float, default=0.2, help="Latencia de Audd.io falso (s)")
+    parser.add_argument("--fallos", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--aciertos-lrclib", type=float, default=0.7, help="Fracción de canciones en LRCLIB")
+    parser.add_argument("--guardar", help="Guardar los resultados como referencia (JSON)")
+    parser.add_argument("--comparar", help="Comparar con una referencia guardada")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento admitido (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    casos = args.solo.split(",") if args.solo else list(CASOS)
+    desconocidos = set(casos) - set(CASOS)
+    if desconocidos:
+        parser.error(f"casos desconocidos: {', '.join(sorted(desconocidos))}")
+
+    config = ConfiguracionStub(
+        args.latencia, args.jitter, args.latencia_audd, args.fallos, args.aciertos_lrclib
+    )
+    servidor, url = iniciar_stub(config)
+    carpeta = tempfile.mkdtemp(prefix="bench-suite-")
+    configurar_entorno(args, url, carpeta)
+
+    funciones = {
+        "parseo": caso_parseo,
+        "timestamps": caso_timestamps,
+        "alineacion": caso_alineacion,
+        "log": caso_log,
+        "paquete": caso_paquete,
+        "e2e": caso_e2e,
+    }
+    resultados = []
+    try:
+        import lyrics_finder  # noqa: F401
+        for caso in casos:
+            print(f"⏱️ {caso}...", file=sys.stderr)
+            resultados.extend(funciones[caso](args))
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    imprimir(resultados)
+    if "e2e" in casos:
+        print(f"🧪 Peticiones a los servidores falsos: {config.peticiones}")
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "maquina": platform.machine(),
+                    "parametros": vars(args),
+                    "resultados": resultados,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"💾 Referencia guardada en {args.guardar}")
+
+    if args.comparar:
+        return 1 if comparar(resultados, args.comparar, args.tolerancia) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
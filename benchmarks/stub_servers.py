@@ -0,0 +1,179 @@
+"""
+Servidores HTTP locales que imitan a LRCLIB y Audd.io para los benchmarks,
+con latencia y fallos configurables.
+
+Uso independiente (por ejemplo, para probar el servicio o la precarga):
+    python benchmarks/stub_servers.py --puerto 8767 --latencia 0.05 --fallos 0.02
+y después LRCLIB_API_URL=http://127.0.0.1:8767/api/ AUDD_API_URL=http://127.0.0.1:8767/
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LETRA_LRC = "\n".join(
+    f"[{i * 4 // 60:02d}:{i * 4 % 60:02d}.00]línea {i} de la canción de prueba" for i in range(1, 41)
+)
+LETRA_TEXTO = "\n".join(f"línea {i} de la canción de prueba" for i in range(1, 41))
+
+
+class ConfiguracionStub:
+    """
+    Comportamiento de los servidores falsos.
+
+    latencia/jitter: segundos de espera por petición (base + uniforme);
+    fallos: fracción de peticiones que responden 500;
+    aciertos_lrclib: fracción de canciones que LRCLIB "tiene" (se decide
+    por el título, así una misma canción siempre da el mismo resultado).
+    """
+
+    def __init__(
+        self, latencia=0.05, jitter=0.0, latencia_audd=0.2, fallos=0.0, aciertos_lrclib=0.7, semilla=1234
+    ):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.latencia_audd = latencia_audd
+        self.fallos = fallos
+        self.aciertos_lrclib = aciertos_lrclib
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+        self.peticiones = {}
+
+    def esperar(self, base):
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(base + extra)
+
+    def falla(self):
+        with self._lock:
+            return self._rng.random() < self.fallos
+
+    def contar(self, ruta):
+        with self._lock:
+            self.peticiones[ruta] = self.peticiones.get(ruta, 0) + 1
+
+    def lrclib_tiene(self, titulo):
+        return (zlib.crc32(titulo.encode("utf-8")) % 1000) / 1000 < self.aciertos_lrclib
+
+
+def _registro_lrclib(titulo, artista, duracion):
+    return {
+        "id": zlib.crc32(f"{artista}|{titulo}".encode("utf-8")),
+        "trackName": titulo,
+        "artistName": artista,
+        "albumName": "",
+        "duration": duracion or 180,
+        "instrumental": False,
+        "plainLyrics": LETRA_TEXTO,
+        "syncedLyrics": LETRA_LRC,
+    }
+
+
+def _crear_manejador(config):
+    class ManejadorStub(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parametros = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+            if url.path.rstrip("/").endswith("findLyrics"):
+                self._audd(url.path, {"status": "success", "result": [
+                    {"artist": "Artista", "title": "Canción", "lyrics": LETRA_TEXTO}
+                ]})
+                return
+
+            config.contar(url.path)
+            config.esperar(config.latencia)
+            if config.falla():
+                self._json(500, {"error": "fallo inyectado"})
+                return
+            titulo = parametros.get("track_name", "")
+            artista = parametros.get("artist_name", "")
+            if url.path.endswith("/get"):
+                if titulo and config.lrclib_tiene(titulo):
+                    duracion = int(parametros.get("duration") or 0)
+                    self._json(200, _registro_lrclib(titulo, artista, duracion))
+                else:
+                    self._json(404, {"code": 404, "name": "TrackNotFound", "message": "Failed to find specified track"})
+            elif url.path.endswith("/search"):
+                titulo = titulo or parametros.get("q", "")
+                resultados = [_registro_lrclib(titulo, artista, 0)] if config.lrclib_tiene(titulo) else []
+                self._json(200, resultados)
+            else:
+                self._json(404, {"error": "ruta desconocida"})
+
+        def do_POST(self):
+            longitud = int(self.headers.get("Content-Length", 0))
+            restante = longitud
+            while restante:
+                bloque = self.rfile.read(min(65536, restante))
+                if not bloque:
+                    break
+                restante -= len(bloque)
+            self._audd(urlparse(self.path).path, {"status": "success", "result": {
+                "artist": "Artista", "title": "Canción", "lyrics": LETRA_TEXTO
+            }})
+
+        def _audd(self, ruta, respuesta):
+            config.contar(ruta)
+            config.esperar(config.latencia_audd)
+            if config.falla():
+                self._json(500, {"error": "fallo inyectado"})
+            else:
+                self._json(200, respuesta)
+
+        def _json(self, codigo, cuerpo):
+            datos = json.dumps(cuerpo).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ManejadorStub
+
+
+def iniciar_stub(config=None, host="127.0.0.1", puerto=0):
+    """
+    Arranca el servidor falso (LRCLIB en /api/ y Audd.io en /) en un hilo.
+    Devuelve (servidor, url_base); con puerto=0 se elige uno libre.
+    """
+    config = config or ConfiguracionStub()
+    servidor = ThreadingHTTPServer((host, puerto), _crear_manejador(config))
+    servidor.daemon_threads = True
+    servidor.config = config
+    threading.Thread(target=servidor.serve_forever, name="stub-http", daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidores falsos de LRCLIB y Audd.io.")
+    parser.add_argument("--puerto", type=int, default=8767)
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos por petición a LRCLIB")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latencia extra aleatoria máxima")
+    parser.add_argument("--latencia-audd", type=float, default=0.2, help="Segundos por petición a Audd.io")
+    parser.add_argument("--fallos", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--aciertos-lrclib", type=float, default=0.7, help="Fracción de canciones en LRCLIB")
+    args = parser.parse_args()
+
+    config = ConfiguracionStub(args.latencia, args.jitter, args.latencia_audd, args.fallos, args.aciertos_lrclib)
+    servidor, url = iniciar_stub(config, puerto=args.puerto)
+    print(f"🧪 LRCLIB falso en {url}api/ y Audd.io falso en {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
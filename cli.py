@@ -0,0 +1,217 @@
+"""
+Interfaz de línea de comandos no interactiva, pensada para scripts.
+
+    python cli.py buscar "fragmento de la letra" [--artista X]
+    python cli.py sincronizar sounds/cancion.mp3
+    python cli.py sincronizar --artista X --titulo Y [--duracion 215]
+    python cli.py karaoke sounds/cancion.mp3
+    python cli.py precargar sounds --workers 8
+    python cli.py exportar sounds --procesos 4
+
+Los resultados se escriben en JSON por la salida estándar y los mensajes
+de los proveedores se descartan (o van a stderr con --detallado). Cada
+comando importa solo lo que necesita, así `--help` responde al instante.
+
+Códigos de salida: 0 correcto, 1 sin resultados, 2 uso incorrecto, 3 error
+(también si los proveedores no responden: sin red, timeout o circuito
+abierto; en precargar, si falla alguna canción).
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+SALIDA_OK = 0
+SALIDA_SIN_RESULTADOS = 1
+SALIDA_USO = 2
+SALIDA_ERROR = 3
+
+
+def _imprimir_json(datos):
+    json.dump(datos, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+
+@contextlib.contextmanager
+def _mensajes(detallado):
+    """
+    Destino de los mensajes de las búsquedas: stderr con --detallado; si
+    no, se descartan (sin acumularlos en memoria).
+    """
+    if detallado:
+        yield sys.stderr
+    else:
+        with open(os.devnull, "w") as nulo:
+            yield nulo
+
+
+@contextlib.contextmanager
+def _silenciar(detallado):
+    """
+    Desvía lo que imprimen las búsquedas para no mezclarlo con el JSON.
+    """
+    with _mensajes(detallado) as destino, contextlib.redirect_stdout(destino):
+        yield
+
+
+def _resolver(args):
+    """
+    Resuelve la letra de un archivo o de artista/título.
+    Devuelve (letras, fuente, artista, titulo, duracion); si ningún
+    proveedor responde lanza ProveedoresNoDisponibles (salida 3).
+    """
+    if args.ruta:
+        from library_index import leer_pista
+        from lyrics_finder import obtener_letra_sincronizada
+
+        if not os.path.isfile(args.ruta):
+            raise FileNotFoundError(f"No existe el archivo: {args.ruta}")
+        pista = leer_pista(args.ruta)
+        with _silenciar(args.detallado):
+            letras, fuente = obtener_letra_sincronizada(args.ruta, pista, estricto=True)
+        return letras, fuente, pista.artista, pista.titulo, pista.duracion
+
+    from lyrics_finder import obtener_letra_sincronizada_metadatos
+
+    with _silenciar(args.detallado):
+        letras, fuente = obtener_letra_sincronizada_metadatos(
+            args.artista, args.titulo, args.duracion, estricto=True
+        )
+    return letras, fuente, args.artista, args.titulo, args.duracion
+
+
+def comando_buscar(args):
+    from lyrics_search import obtener_indice_letras
+
+    resultados = obtener_indice_letras().buscar(args.consulta, artista=args.artista, limite=args.limite)
+    _imprimir_json({"resultados": [resultado._asdict() for resultado in resultados]})
+    return SALIDA_OK if resultados else SALIDA_SIN_RESULTADOS
+
+
+def comando_sincronizar(args):
+    from timeline import timeline_a_json
+
+    letras, fuente, artista, titulo, duracion = _resolver(args)
+    _imprimir_json(timeline_a_json(letras, fuente, artista, titulo, duracion))
+    return SALIDA_OK if letras else SALIDA_SIN_RESULTADOS
+
+
+def comando_karaoke(args):
+    letras, fuente, artista, titulo, _ = _resolver(args)
+    if not letras:
+        print(f"❌ No se encontró letra para '{os.path.basename(args.ruta or titulo)}'", file=sys.stderr)
+        return SALIDA_SIN_RESULTADOS
+
+    from main import simular_karaoke
+
+    simular_karaoke(letras, os.path.basename(args.ruta) if args.ruta else f"{artista} - {titulo}", fuente)
+    return SALIDA_OK
+
+
+def comando_precargar(args):
+    from prefetch import listar_archivos_audio, precargar_biblioteca
+
+    rutas = listar_archivos_audio(args.carpeta)
+    if not rutas:
+        print(f"❌ No hay archivos de audio en '{args.carpeta}'.", file=sys.stderr)
+        return SALIDA_SIN_RESULTADOS
+    with _mensajes(args.detallado) as salida:
+        resumen = precargar_biblioteca(rutas, args.workers, args.lrclib, args.audd, salida=salida)
+    latencias = resumen.pop("latencias")
+    resumen["fallidas"] = [{"ruta": ruta, "motivo": motivo} for ruta, motivo in resumen["fallidas"]]
+    resumen["latencia_media"] = sum(latencias) / len(latencias) if latencias else 0.0
+    _imprimir_json(resumen)
+    if resumen["errores"]:
+        return SALIDA_ERROR
+    return SALIDA_OK if resumen["encontradas"] else SALIDA_SIN_RESULTADOS
+
+
+def comando_exportar(args):
+    from library_index import obtener_indice
+    from lrc_sidecar import exportar_biblioteca
+
+    if not os.path.isdir(args.carpeta):
+        print(f"❌ No existe la carpeta '{args.carpeta}'.", file=sys.stderr)
+        return SALIDA_USO
+    indice = obtener_indice()
+    indice.escanear(args.carpeta)
+    pistas = indice.pistas(args.carpeta)
+    if not pistas:
+        print(f"❌ No hay archivos de audio en '{args.carpeta}'.", file=sys.stderr)
+        return SALIDA_SIN_RESULTADOS
+    with _mensajes(args.detallado) as salida:
+        resumen = exportar_biblioteca(pistas, args.procesos, args.sobrescribir, salida=salida)
+    resumen["fallidas"] = [{"ruta": ruta, "motivo": motivo} for ruta, motivo in resumen["fallidas"]]
+    _imprimir_json(resumen)
+    return SALIDA_OK if resumen["exportadas"] or resumen["existentes"] else SALIDA_SIN_RESULTADOS
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="Letras sincronizadas desde la línea de comandos (salida JSON)."
+    )
+    parser.add_argument("--env", help="Archivo de variables de entorno (por defecto, .env)")
+    parser.add_argument(
+        "--detallado", action="store_true", help="Mostrar por stderr los mensajes de cada búsqueda"
+    )
+    comandos = parser.add_subparsers(dest="comando", metavar="comando")
+    comandos.required = True
+
+    buscar = comandos.add_parser("buscar", help="Buscar en las letras descargadas (sin conexión)")
+    buscar.add_argument("consulta", help="Fragmento de la letra, título o artista")
+    buscar.add_argument("--artista", help="Limitar la búsqueda a un artista")
+    buscar.add_argument("--limite", type=int, default=10, help="Resultados máximos")
+    buscar.set_defaults(funcion=comando_buscar)
+
+    for nombre, ayuda, funcion in (
+        ("sincronizar", "Obtener la letra sincronizada en JSON", comando_sincronizar),
+        ("karaoke", "Mostrar la letra sincronizada en la terminal", comando_karaoke),
+    ):
+        sub = comandos.add_parser(nombre, help=ayuda)
+        sub.add_argument("ruta", nargs="?", help="Archivo de audio")
+        sub.add_argument("--artista", help="Artista (sin archivo de audio)")
+        sub.add_argument("--titulo", help="Título (sin archivo de audio)")
+        sub.add_argument("--duracion", type=float, help="Duración en segundos (opcional)")
+        sub.set_defaults(funcion=funcion)
+
+    precargar = comandos.add_parser("precargar", help="Precargar en la caché las letras de una carpeta")
+    precargar.add_argument("carpeta", nargs="?", default="sounds", help="Carpeta con los archivos de audio")
+    precargar.add_argument("--workers", type=int, default=8, help="Hilos de trabajo")
+    precargar.add_argument("--lrclib", type=int, default=None, help="Peticiones simultáneas máximas a LRCLIB")
+    precargar.add_argument("--audd", type=int, default=None, help="Peticiones simultáneas máximas a Audd.io")
+    precargar.set_defaults(funcion=comando_precargar)
+
+    exportar = comandos.add_parser("exportar", help="Guardar como .lrc junto a cada audio las letras resueltas")
+    exportar.add_argument("carpeta", nargs="?", default="sounds", help="Carpeta con los archivos de audio")
+    exportar.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (uno por CPU)")
+    exportar.add_argument("--sobrescribir", action="store_true", help="Reemplazar los .lrc que ya existan")
+    exportar.set_defaults(funcion=comando_exportar)
+    return parser
+
+
+def main(argv=None):
+    parser = crear_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return SALIDA_OK if e.code == 0 else SALIDA_USO
+    if args.comando in ("sincronizar", "karaoke") and not args.ruta and not (args.artista and args.titulo):
+        parser.print_usage(sys.stderr)
+        print(f"{parser.prog}: error: indica un archivo de audio o --artista y --titulo", file=sys.stderr)
+        return SALIDA_USO
+
+    from env_config import cargar_entorno
+
+    cargar_entorno(args.env)
+    try:
+        return args.funcion(args)
+    except (KeyboardInterrupt, BrokenPipeError):
+        return SALIDA_ERROR
+    except Exception as e:
+        print(f"💥 Error: {e}", file=sys.stderr)
+        return SALIDA_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import os
+
+# Archivo de variables de entorno por defecto
+ENV_FILE = ".env"
+
+_cargado = False
+
+
+def _buscar_archivo(ruta):
+    if ruta:
+        return ruta if os.path.isfile(ruta) else None
+    # Primero en la carpeta actual y después junto al programa
+    for carpeta in (os.getcwd(), os.path.dirname(os.path.abspath(__file__))):
+        candidato = os.path.join(carpeta, ENV_FILE)
+        if os.path.isfile(candidato):
+            return candidato
+    return None
+
+
+def cargar_entorno(ruta=None):
+    """
+    Carga las variables del archivo .env en os.environ (una sola vez y sin
+    pisar las que ya estén definidas). La llaman los puntos de entrada
+    (menú, CLI, servicio, precarga) antes de usar los proveedores; importar
+    los módulos no lee el .env. Devuelve True si se cargó un archivo.
+    """
+    global _cargado
+    if _cargado:
+        return False
+    _cargado = True
+    archivo = _buscar_archivo(ruta or os.getenv("ENV_FILE"))
+    if archivo is None:
+        return False
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return False
+    return load_dotenv(archivo, override=False)
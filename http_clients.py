@@ -0,0 +1,111 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+POOL_CONEXIONES = 4  # Número de hosts distintos con pool propio
+POOL_MAXIMO = 16  # Conexiones keep-alive por host
+TIMEOUT_CONEXION = 5.0  # Segundos para establecer la conexión
+TIMEOUT_LECTURA = 30.0  # Segundos sin recibir datos antes de abortar
+LRCLIB_API_URL = "https://lrclib.net/api/"
+
+_lock = threading.Lock()
+_sesion = None
+_cliente_lrclib = None
+# Prefijo de URL -> función a la que se avisa cuando ese servicio responde 429
+_avisos_limite = {}
+
+
+class SesionConTimeout(requests.Session):
+    """
+    Sesión de requests que aplica un timeout por defecto a todas las
+    peticiones, para que una conexión colgada nunca bloquee el menú.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+def crear_sesion(pool_conexiones=None, pool_maximo=None, timeout_conexion=None, timeout_lectura=None):
+    """
+    Crea una sesión HTTP con pool de conexiones keep-alive y timeouts.
+    """
+    pool_conexiones = pool_conexiones or int(os.getenv("HTTP_POOL_CONEXIONES", POOL_CONEXIONES))
+    pool_maximo = pool_maximo or int(os.getenv("HTTP_POOL_MAXIMO", POOL_MAXIMO))
+    timeout_conexion = timeout_conexion or float(os.getenv("HTTP_TIMEOUT_CONEXION", TIMEOUT_CONEXION))
+    timeout_lectura = timeout_lectura or float(os.getenv("HTTP_TIMEOUT_LECTURA", TIMEOUT_LECTURA))
+
+    sesion = SesionConTimeout(timeout=(timeout_conexion, timeout_lectura))
+    adaptador = HTTPAdapter(pool_connections=pool_conexiones, pool_maxsize=pool_maximo)
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    sesion.hooks["response"].append(_avisar_limite)
+    return sesion
+
+
+def al_limitar(url, funcion):
+    """
+    Registra funcion(retry_after) para cuando un servicio bajo `url`
+    responda 429 Too Many Requests. Así también se detectan los límites de
+    LRCLIB, cuyas respuestas no llegan a verse fuera de lrcup.
+    """
+    _avisos_limite[url] = funcion
+
+
+def _avisar_limite(response, *args, **kwargs):
+    if response.status_code != 429:
+        return
+    # El prefijo más largo: LRCLIB y Audd.io pueden compartir host en pruebas
+    prefijos = [url for url in list(_avisos_limite) if response.url.startswith(url)]
+    if prefijos:
+        _avisos_limite[max(prefijos, key=len)](response.headers.get("Retry-After"))
+
+
+def obtener_sesion():
+    """
+    Devuelve la sesión HTTP compartida por todo el proceso.
+    """
+    global _sesion
+    if _sesion is None:
+        with _lock:
+            if _sesion is None:
+                _sesion = crear_sesion()
+    return _sesion
+
+
+def obtener_cliente_lrclib():
+    """
+    Devuelve el cliente de LRCLIB del proceso, que reutiliza la sesión
+    HTTP compartida en lugar de abrir una propia.
+    """
+    global _cliente_lrclib
+    if _cliente_lrclib is None:
+        from lrcup import LRCLib
+
+        sesion = obtener_sesion()
+        with _lock:
+            if _cliente_lrclib is None:
+                cliente = LRCLib(api_url=os.getenv("LRCLIB_API_URL", LRCLIB_API_URL))
+                cliente.session = sesion
+                _cliente_lrclib = cliente
+    return _cliente_lrclib
+
+
+def cerrar_sesiones():
+    """
+    Cierra las conexiones abiertas (útil al terminar el programa).
+    """
+    global _sesion, _cliente_lrclib
+    with _lock:
+        if _sesion is not None:
+            _sesion.close()
+        _sesion = None
+        _cliente_lrclib = None
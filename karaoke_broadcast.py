@@ -0,0 +1,656 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import struct
+import sys
+import time
+from bisect import bisect_right
+from collections import deque
+from urllib.parse import parse_qs, unquote, urlparse
+
+from env_config import cargar_entorno
+from karaoke_scheduler import COLA_FINAL, RelojReproduccion
+from lyrics_finder import obtener_letra_sincronizada_metadatos
+from lyrics_server import ErrorPeticion
+from metrics import TIPO_CONTENIDO, activar_exportacion, obtener_metricas
+from timeline import timeline_a_json
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+HOST = "127.0.0.1"
+PUERTO = 8090
+ADELANTO = 0.5  # Segundos de antelación con que se envía cada evento
+COLA_CLIENTE = 256  # Mensajes pendientes por pantalla antes de desconectarla por lenta
+INTERVALO_RELOJ = 10.0  # Segundos entre sincronizaciones de reloj por WebSocket
+LATIDO = 15.0  # Segundos sin mensajes antes de enviar un latido por SSE
+
+MUESTRAS_RELOJ = 8  # Muestras de sincronización que se conservan por pantalla
+MUESTRAS_INICIALES = 3  # Muestras seguidas al conectarse por WebSocket
+ESPERA_CABECERAS = 10.0  # Segundos para recibir las cabeceras de una petición
+MAX_MENSAJE_WS = 64 * 1024
+
+_GUID_WEBSOCKET = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_RAZONES = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 500: "Internal Server Error",
+}
+
+_metricas = obtener_metricas()
+_mensajes = _metricas.contador(
+    "sound_lyrics_difusion_mensajes_total", "Eventos difundidos a las salas por tipo", ["tipo"]
+)
+_desconexiones = _metricas.contador(
+    "sound_lyrics_difusion_desconexiones_total", "Pantallas desconectadas por motivo", ["motivo"]
+)
+_retraso = _metricas.histograma(
+    "sound_lyrics_difusion_retraso_segundos", "Retraso del temporizador respecto al plazo de cada evento"
+)
+
+
+class Suscriptor:
+    """
+    Una pantalla conectada a una sala. Los mensajes esperan en una cola
+    acotada que vacía la tarea de su conexión; si se llena, la pantalla
+    no da abasto y se desconecta en lugar de frenar al resto.
+
+    `desfase` es la diferencia entre el reloj de la pantalla y el del
+    servidor: el instante `en` de cada evento se envía ya convertido al
+    reloj de la pantalla.
+    """
+
+    __slots__ = ("sala", "transporte", "cola", "desfase", "rtt", "tarea", "_muestras")
+
+    def __init__(self, sala, transporte, tam_cola, desfase=0.0):
+        self.sala = sala
+        self.transporte = transporte
+        self.cola = asyncio.Queue(tam_cola)
+        self.desfase = desfase
+        self.rtt = None
+        self.tarea = asyncio.current_task()
+        self._muestras = deque(maxlen=MUESTRAS_RELOJ)
+
+    def registrar_muestra(self, t1, t2, t3):
+        """
+        Muestra de sincronización al estilo NTP: el servidor envió su hora
+        t1, la pantalla respondió con la suya t2 y la respuesta llegó en t3.
+        Se usa la muestra de menor ida y vuelta de las últimas, que es la
+        que menos error arrastra de la red.
+        """
+        self._muestras.append((t3 - t1, t2 - (t1 + t3) / 2))
+        self.rtt, self.desfase = min(self._muestras)
+        return len(self._muestras)
+
+    def enviar(self, en, cuerpo):
+        """
+        Encola un mensaje (JSON ya serializado) para la pantalla.
+        Devuelve False si la cola está llena.
+        """
+        try:
+            self.cola.put_nowait((en, cuerpo))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def formatear(self, en, cuerpo):
+        if en is None:
+            return cuerpo
+        return f'{{"en":{en + self.desfase:.3f},{cuerpo[1:]}'
+
+
+class Sala:
+    """
+    Una canción que se reproduce a la vez en varias pantallas. Los eventos
+    (líneas, palabras y fin) se serializan una sola vez al cargar la letra;
+    al difundirlos solo cambia el instante `en` de cada pantalla.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.timeline = None
+        self.info = {}
+        self.reloj = RelojReproduccion()
+        self.suscriptores = set()
+        self.generacion = 0  # Cambia con cada pausa, salto o desfase: anula lo programado
+        self.cursor = 0  # Siguiente evento por programar
+        self.posiciones = []
+        self.eventos = []
+        self.letra = None
+
+    def cargar(self, timeline, fuente, artista=None, titulo=None, duracion=None):
+        self.timeline = timeline
+        self.info = {"artista": artista, "titulo": titulo, "fuente": fuente}
+        self.reloj = RelojReproduccion()
+        self.generacion += 1
+        self.cursor = 0
+
+        letra = timeline_a_json(timeline, fuente, artista, titulo, duracion)
+        self.letra = json.dumps({"tipo": "letra", "sala": self.nombre, **letra}, ensure_ascii=False)
+        eventos = []
+        for indice, linea in enumerate(timeline):
+            entrada = {
+                "tipo": "linea", "sala": self.nombre, "indice": indice, "texto": linea.texto,
+                "inicio": round(linea.inicio, 3), "siguiente": timeline.siguiente_inicio(indice),
+            }
+            if linea.palabras:
+                entrada["palabras"] = [
+                    {"inicio": round(inicio, 3), "texto": palabra} for inicio, palabra in linea.palabras
+                ]
+            eventos.append((linea.inicio, entrada))
+            for n, (inicio, palabra) in enumerate(linea.palabras):
+                eventos.append((inicio, {
+                    "tipo": "palabra", "sala": self.nombre, "indice": indice, "palabra": n,
+                    "texto": palabra, "inicio": round(inicio, 3),
+                }))
+        eventos.append((timeline.duracion + COLA_FINAL, {"tipo": "fin", "sala": self.nombre}))
+        # Orden estable: una palabra nunca adelanta a su línea
+        eventos.sort(key=lambda evento: evento[0])
+        self.posiciones = [posicion for posicion, _ in eventos]
+        self.eventos = [(e["tipo"], json.dumps(e, ensure_ascii=False)) for _, e in eventos]
+
+    @property
+    def activa(self):
+        return self.timeline is not None and self.reloj.iniciado and not self.reloj.pausado
+
+    def instante_de(self, posicion):
+        """
+        Instante monotónico en que la letra alcanza la posición dada.
+        """
+        return time.monotonic() + (posicion - self.reloj.posicion_letra())
+
+    def estado(self):
+        posicion = self.reloj.posicion_letra() if self.reloj.iniciado else 0.0
+        return {
+            "tipo": "estado",
+            "sala": self.nombre,
+            **self.info,
+            "posicion": round(posicion, 3),
+            "pausada": not self.activa,
+            "linea": self.timeline.indice_en(posicion) if self.timeline is not None else -1,
+            "desfase": self.reloj.desfase,
+            "pantallas": len(self.suscriptores),
+        }
+
+
+class ServidorDifusion:
+    """
+    Difunde letras sincronizadas a muchas pantallas desde un solo proceso
+    asyncio, sin un hilo por pantalla. Cada sala tiene su canción y su
+    reloj; un único montículo de plazos (compartido por todas las salas)
+    guarda el siguiente evento de cada una, y una sola alarma del bucle
+    de eventos despierta en el plazo más cercano.
+
+    Las pantallas se suscriben por Server-Sent Events o WebSocket y
+    reciben cada evento ADELANTO segundos antes, con el instante `en` en
+    que deben mostrarlo expresado en su propio reloj.
+    """
+
+    def __init__(self, adelanto=None, tam_cola=None):
+        self.adelanto = adelanto if adelanto is not None else float(os.getenv("DIFUSION_ADELANTO", ADELANTO))
+        self.tam_cola = tam_cola or int(os.getenv("DIFUSION_COLA_CLIENTE", COLA_CLIENTE))
+        self.intervalo_reloj = float(os.getenv("DIFUSION_INTERVALO_RELOJ", INTERVALO_RELOJ))
+        self.salas = {}
+        self._monticulo = []
+        self._secuencia = itertools.count()
+        self._alarma = None
+        self._alarma_en = None
+        # Hora del servidor: monotónica, anclada una vez al reloj de pared
+        self._ancla = time.time() - time.monotonic()
+        _metricas.indicador(
+            "sound_lyrics_difusion_pantallas", "Pantallas conectadas por sala",
+            lambda: {(sala.nombre,): len(sala.suscriptores) for sala in self.salas.values()}, ["sala"],
+        )
+
+    def hora(self, instante=None):
+        """
+        Hora del servidor (segundos desde la época) para un instante
+        monotónico; la que usan las pantallas para sincronizarse.
+        """
+        return (time.monotonic() if instante is None else instante) + self._ancla
+
+    def sala(self, nombre):
+        sala = self.salas.get(nombre)
+        if sala is None:
+            sala = self.salas[nombre] = Sala(nombre)
+        return sala
+
+    # --- Temporizador ---
+
+    def _programar(self, sala):
+        """
+        Programa el siguiente evento de la sala (si está sonando).
+        """
+        if not sala.activa or sala.cursor >= len(sala.eventos):
+            return
+        posicion = sala.posiciones[sala.cursor]
+        instante = sala.instante_de(posicion) - self.adelanto
+        heapq.heappush(self._monticulo, (instante, next(self._secuencia), sala, sala.generacion, sala.cursor))
+        self._rearmar()
+
+    def _rearmar(self):
+        if not self._monticulo:
+            return
+        primero = self._monticulo[0][0]
+        if self._alarma is not None:
+            if self._alarma_en <= primero:
+                return
+            self._alarma.cancel()
+        self._alarma_en = primero
+        self._alarma = asyncio.get_running_loop().call_later(max(primero - time.monotonic(), 0), self._vencer)
+
+    def _vencer(self):
+        self._alarma = None
+        ahora = time.monotonic()
+        while self._monticulo and self._monticulo[0][0] <= ahora:
+            instante, _, sala, generacion, indice = heapq.heappop(self._monticulo)
+            if generacion != sala.generacion:
+                continue  # Programado antes de una pausa, un salto o una carga
+            _retraso.observar(ahora - instante)
+            tipo, cuerpo = sala.eventos[indice]
+            self._difundir(sala, tipo, self.hora(instante + self.adelanto), cuerpo)
+            sala.cursor = indice + 1
+            self._programar(sala)
+        self._rearmar()
+
+    def _replanificar(self, sala):
+        """
+        Descarta lo programado y vuelve a programar desde la posición actual.
+        """
+        sala.generacion += 1
+        if sala.timeline is not None and sala.reloj.iniciado:
+            sala.cursor = bisect_right(sala.posiciones, sala.reloj.posicion_letra())
+        self._programar(sala)
+        self._difundir(sala, "estado", self.hora(), self._estado(sala))
+
+    # --- Difusión ---
+
+    def _estado(self, sala):
+        return json.dumps(sala.estado(), ensure_ascii=False)
+
+    def _difundir(self, sala, tipo, en, cuerpo):
+        _mensajes.inc(tipo=tipo)
+        lentas = [s for s in sala.suscriptores if not s.enviar(en, cuerpo)]
+        for suscriptor in lentas:
+            _desconexiones.inc(motivo="lenta")
+            self._baja(suscriptor)
+            suscriptor.tarea.cancel()
+
+    def _alta(self, sala, suscriptor):
+        sala.suscriptores.add(suscriptor)
+        if sala.letra is not None:
+            suscriptor.enviar(None, sala.letra)
+        suscriptor.enviar(self.hora(), self._estado(sala))
+
+    def _baja(self, suscriptor):
+        suscriptor.sala.suscriptores.discard(suscriptor)
+
+    # --- Control de las salas ---
+
+    async def cargar(self, nombre, artista, titulo, duracion=None):
+        """
+        Resuelve la letra (en un hilo: las búsquedas son bloqueantes) y la
+        carga en la sala, que queda detenida hasta iniciar().
+        """
+        letras, fuente = await asyncio.get_running_loop().run_in_executor(
+            None, obtener_letra_sincronizada_metadatos, artista, titulo, duracion
+        )
+        if not letras:
+            return False
+        self.cargar_timeline(nombre, letras, fuente, artista, titulo, duracion)
+        return True
+
+    def cargar_timeline(self, nombre, timeline, fuente, artista=None, titulo=None, duracion=None):
+        sala = self.sala(nombre)
+        sala.cargar(timeline, fuente, artista, titulo, duracion)
+        for suscriptor in list(sala.suscriptores):
+            suscriptor.enviar(None, sala.letra)
+        self._replanificar(sala)
+
+    def iniciar(self, nombre, posicion=0.0):
+        sala = self._sala_cargada(nombre)
+        sala.reloj.iniciar(posicion)
+        self._replanificar(sala)
+
+    def pausar(self, nombre):
+        sala = self._sala_cargada(nombre)
+        sala.reloj.pausar()
+        self._replanificar(sala)
+
+    def reanudar(self, nombre):
+        sala = self._sala_cargada(nombre)
+        sala.reloj.reanudar()
+        self._replanificar(sala)
+
+    def saltar(self, nombre, posicion):
+        sala = self._sala_cargada(nombre)
+        sala.reloj.seek(posicion)
+        self._replanificar(sala)
+
+    def ajustar_desfase(self, nombre, segundos):
+        sala = self._sala_cargada(nombre)
+        sala.reloj.ajustar_desfase(segundos)
+        self._replanificar(sala)
+
+    def _sala_cargada(self, nombre):
+        sala = self.salas.get(nombre)
+        if sala is None or sala.timeline is None:
+            raise ErrorPeticion(409, f"La sala '{nombre}' no tiene ninguna canción cargada")
+        return sala
+
+    # --- HTTP ---
+
+    async def atender(self, lector, escritor):
+        """
+        Atiende una conexión: una petición de control (y se cierra) o una
+        suscripción que dura hasta que la pantalla se desconecta.
+        """
+        try:
+            try:
+                cabecera = await asyncio.wait_for(lector.readuntil(b"\r\n\r\n"), ESPERA_CABECERAS)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            linea, *resto = cabecera.decode("latin-1").split("\r\n")
+            try:
+                metodo, ruta, _ = linea.split(" ", 2)
+            except ValueError:
+                return
+            cabeceras = {}
+            for campo in resto:
+                nombre, separador, valor = campo.partition(":")
+                if separador:
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+            url = urlparse(ruta)
+            parametros = parse_qs(url.query)
+            partes = [unquote(parte) for parte in url.path.strip("/").split("/") if parte]
+
+            if metodo == "GET" and len(partes) == 3 and partes[0] == "salas" and partes[2] == "eventos":
+                await self._servir_sse(lector, escritor, self.sala(partes[1]), parametros)
+                return
+            if metodo == "GET" and len(partes) == 3 and partes[0] == "salas" and partes[2] == "ws":
+                await self._servir_websocket(lector, escritor, self.sala(partes[1]), cabeceras)
+                return
+            try:
+                codigo, cuerpo = await self._controlar(metodo, partes, parametros)
+            except ErrorPeticion as e:
+                codigo, cuerpo = e.codigo, {"error": str(e)}
+            except Exception as e:
+                codigo, cuerpo = 500, {"error": f"Error interno: {e}"}
+            if isinstance(cuerpo, dict):
+                datos, tipo = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+            else:
+                datos, tipo = cuerpo, TIPO_CONTENIDO
+            escritor.write(
+                f"HTTP/1.1 {codigo} {_RAZONES.get(codigo, '')}\r\nContent-Type: {tipo}\r\n"
+                f"Content-Length: {len(datos)}\r\nAccess-Control-Allow-Origin: *\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + datos
+            )
+            await escritor.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _controlar(self, metodo, partes, parametros):
+        if metodo == "GET" and partes == ["salud"]:
+            pantallas = sum(len(sala.suscriptores) for sala in self.salas.values())
+            return 200, {"estado": "ok", "salas": len(self.salas), "pantallas": pantallas}
+        if metodo == "GET" and partes == ["reloj"]:
+            # Sincronización para SSE: la pantalla envía su hora t0 y, con
+            # la hora de llegada de la respuesta t3, desfase = (t0 + t3) / 2 - t1
+            return 200, {"t0": _numero(parametros, "t0"), "t1": self.hora()}
+        if metodo == "GET" and partes == ["metrics"]:
+            return 200, obtener_metricas().exportar().encode("utf-8")
+        if metodo == "GET" and partes == ["salas"]:
+            return 200, {"salas": [sala.estado() for sala in self.salas.values()]}
+        if len(partes) < 2 or partes[0] != "salas":
+            raise ErrorPeticion(404, f"Ruta desconocida: /{'/'.join(partes)}")
+
+        nombre = partes[1]
+        accion = partes[2] if len(partes) == 3 else None
+        if metodo == "GET" and accion is None:
+            sala = self.salas.get(nombre)
+            if sala is None:
+                raise ErrorPeticion(404, f"No existe la sala '{nombre}'")
+            letra = json.loads(sala.letra) if sala.letra else None
+            return 200, {**sala.estado(), "letra": letra}
+        if metodo != "POST":
+            raise ErrorPeticion(405, "Las acciones sobre una sala se piden con POST")
+
+        if accion == "cargar":
+            artista = _texto(parametros, "artista")
+            titulo = _texto(parametros, "titulo")
+            if not (artista and titulo):
+                raise ErrorPeticion(400, "Faltan los parámetros 'artista' y 'titulo'")
+            if not await self.cargar(nombre, artista, titulo, _numero(parametros, "duracion")):
+                raise ErrorPeticion(404, f"No se encontró letra para '{artista} - {titulo}'")
+        elif accion == "iniciar":
+            self.iniciar(nombre, _numero(parametros, "posicion") or 0.0)
+        elif accion == "pausar":
+            self.pausar(nombre)
+        elif accion == "reanudar":
+            self.reanudar(nombre)
+        elif accion == "saltar":
+            posicion = _numero(parametros, "posicion")
+            if posicion is None:
+                raise ErrorPeticion(400, "Falta el parámetro 'posicion'")
+            self.saltar(nombre, posicion)
+        elif accion == "desfase":
+            segundos = _numero(parametros, "segundos")
+            if segundos is None:
+                raise ErrorPeticion(400, "Falta el parámetro 'segundos'")
+            self.ajustar_desfase(nombre, segundos)
+        else:
+            raise ErrorPeticion(404, f"Acción desconocida: {accion}")
+        return 200, self.salas[nombre].estado()
+
+    # --- Server-Sent Events ---
+
+    async def _servir_sse(self, lector, escritor, sala, parametros):
+        """
+        Suscripción por Server-Sent Events. Como el canal solo va del
+        servidor a la pantalla, el desfase lo indica ella: `desfase` (medido
+        con /reloj) o `hora`, su hora al conectarse (sin descontar la red).
+        """
+        desfase = _numero(parametros, "desfase")
+        if desfase is None:
+            hora = _numero(parametros, "hora")
+            desfase = hora - self.hora() if hora is not None else 0.0
+        escritor.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+            b"Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\n"
+            b"X-Accel-Buffering: no\r\nConnection: keep-alive\r\n\r\n"
+        )
+        suscriptor = Suscriptor(sala, "sse", self.tam_cola, desfase)
+        # La pantalla no envía nada: la lectura solo termina cuando se desconecta
+        cierre = asyncio.ensure_future(lector.read())
+        cierre.add_done_callback(lambda tarea: tarea.cancelled() or suscriptor.tarea.cancel())
+        self._alta(sala, suscriptor)
+        try:
+            while True:
+                try:
+                    en, cuerpo = await asyncio.wait_for(suscriptor.cola.get(), LATIDO)
+                except asyncio.TimeoutError:
+                    escritor.write(b": latido\n\n")
+                else:
+                    escritor.write(f"data: {suscriptor.formatear(en, cuerpo)}\n\n".encode("utf-8"))
+                await escritor.drain()
+        except ConnectionError:
+            _desconexiones.inc(motivo="cliente")
+        except asyncio.CancelledError:
+            if cierre.done():
+                _desconexiones.inc(motivo="cliente")
+            raise
+        finally:
+            self._baja(suscriptor)
+            cierre.cancel()
+
+    # --- WebSocket ---
+
+    async def _servir_websocket(self, lector, escritor, sala, cabeceras):
+        """
+        Suscripción por WebSocket. El servidor mide el desfase de cada
+        pantalla: envía {"tipo": "reloj", "t1": hora} y la pantalla responde
+        con el mismo mensaje y su hora en "t2".
+        """
+        clave = cabeceras.get("sec-websocket-key")
+        if cabeceras.get("upgrade", "").lower() != "websocket" or not clave:
+            escritor.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await escritor.drain()
+            return
+        aceptacion = base64.b64encode(hashlib.sha1((clave + _GUID_WEBSOCKET).encode()).digest()).decode()
+        escritor.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {aceptacion}\r\n\r\n".encode("latin-1")
+        )
+        suscriptor = Suscriptor(sala, "websocket", self.tam_cola)
+        lectura = asyncio.ensure_future(self._leer_websocket(lector, escritor, suscriptor))
+        self._alta(sala, suscriptor)
+        try:
+            escritor.write(_trama(json.dumps({"tipo": "reloj", "t1": self.hora()})))
+            proxima_sincronizacion = time.monotonic() + self.intervalo_reloj
+            while not lectura.done():
+                espera = proxima_sincronizacion - time.monotonic()
+                try:
+                    en, cuerpo = await asyncio.wait_for(suscriptor.cola.get(), max(espera, 0))
+                except asyncio.TimeoutError:
+                    escritor.write(_trama(json.dumps({"tipo": "reloj", "t1": self.hora()})))
+                    proxima_sincronizacion = time.monotonic() + self.intervalo_reloj
+                else:
+                    if cuerpo is None:
+                        break  # La lectura recibió el cierre
+                    escritor.write(_trama(suscriptor.formatear(en, cuerpo)))
+                await escritor.drain()
+        except ConnectionError:
+            _desconexiones.inc(motivo="cliente")
+        finally:
+            self._baja(suscriptor)
+            lectura.cancel()
+
+    async def _leer_websocket(self, lector, escritor, suscriptor):
+        """
+        Lee los mensajes de la pantalla: respuestas de sincronización,
+        pings y el cierre. Al terminar deja en la cola un mensaje vacío para
+        que la tarea de escritura acabe.
+        """
+        try:
+            while True:
+                codigo, datos = await _leer_trama(lector)
+                if codigo == 0x8:  # Cierre
+                    escritor.write(_trama(datos[:2], 0x8))
+                    break
+                if codigo == 0x9:  # Ping
+                    escritor.write(_trama(datos, 0xA))
+                    continue
+                if codigo != 0x1:
+                    continue
+                try:
+                    mensaje = json.loads(datos)
+                except ValueError:
+                    continue
+                if not isinstance(mensaje, dict) or mensaje.get("tipo") != "reloj":
+                    continue
+                if "t2" in mensaje and "t1" in mensaje:
+                    muestras = suscriptor.registrar_muestra(float(mensaje["t1"]), float(mensaje["t2"]), self.hora())
+                    if muestras < MUESTRAS_INICIALES:
+                        escritor.write(_trama(json.dumps({"tipo": "reloj", "t1": self.hora()})))
+                    elif muestras == MUESTRAS_INICIALES:
+                        # Estado con el reloj ya corregido
+                        suscriptor.enviar(self.hora(), self._estado(suscriptor.sala))
+                elif "t0" in mensaje:
+                    escritor.write(_trama(json.dumps({"tipo": "reloj", "t0": mensaje["t0"], "t1": self.hora()})))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, TypeError):
+            pass
+        finally:
+            try:
+                suscriptor.cola.put_nowait((None, None))
+            except asyncio.QueueFull:
+                suscriptor.tarea.cancel()
+
+    async def servir(self, host, puerto):
+        servidor = await asyncio.start_server(self.atender, host, puerto)
+        async with servidor:
+            await servidor.serve_forever()
+
+
+def _trama(texto, codigo=0x1):
+    """
+    Trama WebSocket del servidor (sin máscara y sin fragmentar).
+    """
+    datos = texto.encode("utf-8") if isinstance(texto, str) else texto
+    longitud = len(datos)
+    if longitud < 126:
+        cabecera = struct.pack("!BB", 0x80 | codigo, longitud)
+    elif longitud < 1 << 16:
+        cabecera = struct.pack("!BBH", 0x80 | codigo, 126, longitud)
+    else:
+        cabecera = struct.pack("!BBQ", 0x80 | codigo, 127, longitud)
+    return cabecera + datos
+
+
+async def _leer_trama(lector):
+    """
+    Lee una trama de la pantalla (siempre con máscara). Devuelve
+    (código, datos). Los mensajes fragmentados no se admiten.
+    """
+    primero, segundo = await lector.readexactly(2)
+    if not primero & 0x80:
+        raise ValueError("Mensajes fragmentados no admitidos")
+    longitud = segundo & 0x7F
+    if longitud == 126:
+        (longitud,) = struct.unpack("!H", await lector.readexactly(2))
+    elif longitud == 127:
+        (longitud,) = struct.unpack("!Q", await lector.readexactly(8))
+    if longitud > MAX_MENSAJE_WS:
+        raise ValueError("Mensaje demasiado largo")
+    mascara = await lector.readexactly(4) if segundo & 0x80 else b"\0\0\0\0"
+    datos = await lector.readexactly(longitud)
+    datos = bytes(b ^ mascara[i % 4] for i, b in enumerate(datos))
+    return primero & 0x0F, datos
+
+
+def _texto(parametros, nombre):
+    valores = parametros.get(nombre)
+    return valores[0].strip() if valores else None
+
+
+def _numero(parametros, nombre):
+    valor = _texto(parametros, nombre)
+    if not valor:
+        return None
+    try:
+        return float(valor)
+    except ValueError:
+        raise ErrorPeticion(400, f"'{nombre}' debe ser un número")
+
+
+def main():
+    # Antes de crear el parser: los valores por defecto salen del .env
+    cargar_entorno()
+    parser = argparse.ArgumentParser(description="Difunde letras sincronizadas a varias pantallas (SSE y WebSocket).")
+    parser.add_argument("--host", default=os.getenv("DIFUSION_HOST", HOST), help="Dirección de escucha")
+    parser.add_argument(
+        "--puerto", type=int, default=int(os.getenv("DIFUSION_PUERTO", PUERTO)), help="Puerto de escucha"
+    )
+    parser.add_argument("--adelanto", type=float, default=None, help="Segundos de antelación de cada evento")
+    parser.add_argument("--detallado", action="store_true", help="Mostrar la salida de cada búsqueda")
+    args = parser.parse_args()
+
+    activar_exportacion()
+    servidor = ServidorDifusion(args.adelanto)
+    print(f"📡 Difusión de karaoke escuchando en http://{args.host}:{args.puerto}")
+    sys.stdout.flush()
+    if not args.detallado:
+        # Las búsquedas imprimen mucho pensando en la terminal interactiva
+        sys.stdout = open(os.devnull, "w")
+    try:
+        asyncio.run(servidor.servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import os
+import shutil
+import sys
+from bisect import bisect_right
+from itertools import accumulate
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+FPS = 20  # Fotogramas por segundo como máximo
+LINEAS_SIGUIENTES = 4  # Líneas de la vista previa bajo la línea actual
+LINEAS_ANTERIORES = 1  # Líneas ya cantadas que se siguen viendo
+
+# Secuencias ANSI
+INICIO = "\033[H"  # Cursor a la esquina superior izquierda
+BORRAR_LINEA = "\033[K"  # Borra hasta el final de la línea
+BORRAR_RESTO = "\033[J"  # Borra desde el cursor hasta el final de la pantalla
+PANTALLA_ALTERNATIVA = "\033[?1049h\033[?25l"  # Pantalla aparte y cursor oculto
+PANTALLA_NORMAL = "\033[?25h\033[?1049l"
+
+FIN = "\033[0m"
+NEGRITA = "\033[1m"
+TENUE = "\033[2m"
+VERDE = "\033[92m"
+AMARILLO = "\033[93m"
+CIAN = "\033[96m"
+BLANCO = "\033[97m"
+
+# Segundos por carácter del efecto de escritura (como la antigua escritura
+# carácter a carácter): las pausas de puntuación y espacios son más largas
+_PAUSA_LETRA = 0.01
+_PAUSA_ESPACIO = 0.02
+_PAUSA_PUNTUACION = 0.05
+
+# Cada cuántos fotogramas se vuelve a consultar el tamaño de la terminal
+_CONSULTA_TAMANO = 20
+
+
+def _es_seccion(texto):
+    return texto.startswith("[") and texto.endswith("]")
+
+
+def _formatear_tiempo(segundos):
+    segundos = max(int(segundos), 0)
+    return f"{segundos // 60:02d}:{segundos % 60:02d}"
+
+
+def _recortar(texto, ancho):
+    return texto if len(texto) <= ancho else texto[: max(ancho - 1, 0)] + "…"
+
+
+class RenderizadorTerminal:
+    """
+    Dibuja el karaoke por fotogramas: cada fotograma se compone en memoria
+    (cabecera, tiempo, línea anterior, línea actual resaltada y vista
+    previa de las siguientes) y se emite con una sola escritura, sin borrar
+    la pantalla, volviendo el cursor al inicio y borrando solo lo que
+    sobra. Los fotogramas idénticos al anterior no se escriben.
+
+    Con tiempos por palabra (LRC mejorado) se resaltan las palabras ya
+    cantadas; si no, las letras sincronizadas reales aparecen con un efecto
+    de escritura calculado a partir del reloj, que no consume tiempo del
+    programa. Si la salida no es una terminal, se escribe cada línea una vez.
+    """
+
+    def __init__(self, timeline, titulo="Canción", fuente=None, salida=None, fps=None,
+                 lineas_siguientes=None, lineas_anteriores=None):
+        self.timeline = timeline
+        self.titulo = titulo
+        self.fuente = fuente
+        self.salida = salida or sys.stdout
+        self.fps = fps or float(os.getenv("KARAOKE_FPS", FPS))
+        self.lineas_siguientes = (
+            lineas_siguientes if lineas_siguientes is not None
+            else int(os.getenv("KARAOKE_LINEAS_SIGUIENTES", LINEAS_SIGUIENTES))
+        )
+        self.lineas_anteriores = LINEAS_ANTERIORES if lineas_anteriores is None else lineas_anteriores
+        self.interactivo = hasattr(self.salida, "isatty") and self.salida.isatty()
+        self.efecto_escritura = fuente == "LRCLIB"
+        self.fotogramas = 0  # Fotogramas escritos (los repetidos no cuentan)
+
+        self._abierto = False
+        self._anterior = None
+        self._escrita = -1  # Última línea escrita en modo no interactivo
+        self._ancho = 80
+        self._alto = 24
+        self._consultas = 0
+        self._pausas_linea = {}
+        self._cabecera = self._componer_cabecera()
+
+    # --- Ciclo de vida ---
+
+    def abrir(self):
+        """
+        Pasa a la pantalla alternativa (la terminal recupera su contenido al
+        cerrar) y fuerza un fotograma completo.
+        """
+        if self.interactivo and not self._abierto:
+            self.salida.write(PANTALLA_ALTERNATIVA)
+            self.salida.flush()
+        self._abierto = True
+        self._anterior = None
+
+    def cerrar(self):
+        if self.interactivo and self._abierto:
+            self.salida.write(PANTALLA_NORMAL)
+            self.salida.flush()
+        self._abierto = False
+
+    def __enter__(self):
+        self.abrir()
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # --- Composición ---
+
+    def _componer_cabecera(self):
+        fuente = self.fuente or "Desconocida"
+        if fuente == "LRCLIB":
+            detalle = f"{VERDE}🌐 LRCLIB · timestamps reales de la música{FIN}"
+        elif fuente == "AUDD":
+            detalle = f"{AMARILLO}🎤 Audd.io · timestamps alineados o simulados{FIN}"
+        else:
+            detalle = f"{BLANCO}📝 Fuente: {fuente}{FIN}"
+        return [
+            f"{CIAN}{'═' * 60}{FIN}",
+            f"{NEGRITA}{AMARILLO}🎤 KARAOKE - {self.titulo} 🎤{FIN}",
+            detalle,
+            f"{BLANCO}⏸️ Ctrl+C: pausa, ajuste de desfase y saltos{FIN}",
+            f"{CIAN}{'─' * 60}{FIN}",
+        ]
+
+    def _pausas(self, indice):
+        """
+        Instantes acumulados del efecto de escritura de una línea.
+        """
+        pausas = self._pausas_linea.get(indice)
+        if pausas is None:
+            texto = self.timeline.textos[indice]
+            pausas = list(accumulate(
+                _PAUSA_ESPACIO if c == " " else _PAUSA_PUNTUACION if c in ".,!?" else _PAUSA_LETRA
+                for c in texto
+            ))
+            self._pausas_linea = {indice: pausas}  # Solo interesa la línea actual
+        return pausas
+
+    def _linea_actual(self, indice, posicion, ancho):
+        timeline = self.timeline
+        texto = timeline.textos[indice]
+        if _es_seccion(texto):
+            return f"{TENUE}{CIAN}  {_recortar(texto, ancho - 2)}{FIN}"
+
+        palabras = timeline.palabras[indice] if timeline.palabras is not None else None
+        if palabras:
+            # LRC mejorado: palabras cantadas en verde y la actual subrayada
+            cantadas = bisect_right([inicio for inicio, _ in palabras], posicion)
+            partes = []
+            restante = ancho - 2
+            for n, (_, palabra) in enumerate(palabras):
+                if restante <= 0:
+                    break
+                palabra = _recortar(palabra, restante)
+                restante -= len(palabra) + 1
+                if n < cantadas - 1:
+                    partes.append(f"{VERDE}{palabra}{FIN}")
+                elif n == cantadas - 1:
+                    partes.append(f"{VERDE}\033[4m{palabra}{FIN}")
+                else:
+                    partes.append(f"{BLANCO}{palabra}{FIN}")
+            return f"{NEGRITA}▶ {FIN}{NEGRITA}{' '.join(partes)}{FIN}"
+
+        texto = _recortar(texto, ancho - 2)
+        if self.efecto_escritura:
+            # Efecto de escritura: como mucho la mitad del hueco hasta la
+            # línea siguiente, calculado a partir del reloj
+            pausas = self._pausas(indice)
+            total = pausas[-1] if pausas else 0.0
+            siguiente = timeline.siguiente_inicio(indice)
+            hueco = (siguiente - timeline.inicios[indice]) if siguiente is not None else 2.0
+            escala = min(1.0, hueco * 0.5 / total) if total > 0 else 0.0
+            transcurrido = posicion - timeline.inicios[indice]
+            if escala > 0:
+                # El primer carácter aparece en cuanto empieza la línea
+                texto = texto[: bisect_right(pausas, transcurrido / escala) + 1]
+        return f"{NEGRITA}▶ {BLANCO}{texto}{FIN}"
+
+    def componer(self, posicion):
+        """
+        Devuelve el fotograma (texto con secuencias ANSI) para la posición
+        de la letra indicada, en segundos.
+        """
+        if self._consultas % _CONSULTA_TAMANO == 0:
+            tamano = shutil.get_terminal_size((80, 24))
+            self._ancho, self._alto = max(tamano.columns, 20), max(tamano.lines, 2)
+        self._consultas += 1
+        ancho = self._ancho
+
+        timeline = self.timeline
+        indice = timeline.indice_en(posicion)
+        total = timeline.duracion
+        progreso = min(max(posicion / total, 0.0), 1.0) if total > 0 else 0.0
+        barra = int(progreso * 30)
+
+        lineas = list(self._cabecera)
+        lineas.append(
+            f"{CIAN}⏱️ {_formatear_tiempo(posicion)} / {_formatear_tiempo(total)} "
+            f"{'█' * barra}{TENUE}{'░' * (30 - barra)}{FIN}"
+        )
+        lineas.append("")
+        for previa in range(max(indice - self.lineas_anteriores, 0), max(indice, 0)):
+            lineas.append(f"{TENUE}  {_recortar(timeline.textos[previa], ancho - 2)}{FIN}")
+        if indice >= 0:
+            lineas.append(self._linea_actual(indice, posicion, ancho))
+        else:
+            lineas.append(f"{TENUE}  ♪ ♪ ♪{FIN}")
+        for n, siguiente in enumerate(range(indice + 1, min(indice + 1 + self.lineas_siguientes, len(timeline)))):
+            estilo = BLANCO if n == 0 else TENUE
+            lineas.append(f"{estilo}  {_recortar(timeline.textos[siguiente], ancho - 2)}{FIN}")
+        # Un fotograma más alto que la terminal la haría desplazarse
+        del lineas[self._alto - 1:]
+        return INICIO + "".join(linea + BORRAR_LINEA + "\n" for linea in lineas) + BORRAR_RESTO
+
+    # --- Dibujo ---
+
+    def dibujar(self, posicion):
+        """
+        Dibuja el fotograma de la posición indicada con una sola escritura
+        (nada si es igual al anterior).
+        """
+        if not self.interactivo:
+            self._escribir_linea(posicion)
+            return
+        fotograma = self.componer(posicion)
+        if fotograma == self._anterior:
+            return
+        self._anterior = fotograma
+        self.salida.write(fotograma)
+        self.salida.flush()
+        self.fotogramas += 1
+
+    def _escribir_linea(self, posicion):
+        indice = self.timeline.indice_en(posicion)
+        if indice < 0 or indice == self._escrita:
+            return
+        self._escrita = indice
+        texto = self.timeline.textos[indice]
+        if not _es_seccion(texto):
+            self.salida.write(texto + "\n")
+            self.salida.flush()
+            self.fotogramas += 1
@@ -0,0 +1,192 @@
+import threading
+import time
+
+# Espera máxima de cada tramo: acota lo que tarda en notarse una pausa,
+# un salto o un cambio de desfase hecho desde otro hilo
+TRAMO_ESPERA = 0.1
+
+# Segundos que se mantiene la última línea antes de terminar
+COLA_FINAL = 3.0
+
+
+class RelojReproduccion:
+    """
+    Reloj de reproducción basado en time.monotonic(), medido desde el inicio
+    de la canción. Admite pausa, reanudación, salto (seek) y un desfase
+    global ajustable. Todas las operaciones son seguras entre hilos.
+
+    Desfase positivo = la letra aparece más tarde respecto al audio.
+    """
+
+    def __init__(self, desfase=0.0, reloj=time.monotonic):
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._cambio = threading.Event()
+        self._origen = None  # Instante monotónico que corresponde a la posición 0
+        self._pausado_en = None  # Posición congelada mientras está en pausa
+        self.desfase = desfase
+        self.saltos = 0  # Se incrementa con cada seek
+
+    def iniciar(self, posicion=0.0):
+        with self._lock:
+            self._origen = self._reloj() - posicion
+            self._pausado_en = None
+        self._notificar()
+
+    def posicion(self):
+        """
+        Segundos transcurridos de la canción (sin desfase).
+        """
+        with self._lock:
+            if self._origen is None:
+                return 0.0
+            if self._pausado_en is not None:
+                return self._pausado_en
+            return self._reloj() - self._origen
+
+    def posicion_letra(self):
+        """
+        Posición en la línea de tiempo de la letra (con el desfase aplicado).
+        """
+        return self.posicion() - self.desfase
+
+    @property
+    def iniciado(self):
+        return self._origen is not None
+
+    @property
+    def pausado(self):
+        return self._pausado_en is not None
+
+    def pausar(self):
+        with self._lock:
+            if self._origen is not None and self._pausado_en is None:
+                self._pausado_en = self._reloj() - self._origen
+        self._notificar()
+
+    def reanudar(self):
+        with self._lock:
+            if self._pausado_en is not None:
+                self._origen = self._reloj() - self._pausado_en
+                self._pausado_en = None
+        self._notificar()
+
+    def seek(self, posicion):
+        """
+        Salta a una posición de la canción (en segundos).
+        """
+        posicion = max(posicion, 0.0)
+        with self._lock:
+            if self._pausado_en is not None:
+                self._pausado_en = posicion
+            else:
+                self._origen = self._reloj() - posicion
+            self.saltos += 1
+        self._notificar()
+
+    def ajustar_desfase(self, delta):
+        with self._lock:
+            self.desfase += delta
+        self._notificar()
+
+    def esperar_hasta(self, posicion_letra, detener=None):
+        """
+        Duerme hasta que la posición de la letra alcance el objetivo.
+        El plazo se recalcula en cada tramo a partir del reloj, así que el
+        error no se acumula. Devuelve False si se interrumpe por un cambio
+        (pausa, salto, desfase) o por `detener`; True si se alcanzó.
+        """
+        self._cambio.clear()
+        while True:
+            if detener is not None and detener.is_set():
+                return False
+            if not self.pausado:
+                restante = posicion_letra - self.posicion_letra()
+                if restante <= 0:
+                    return True
+            else:
+                restante = TRAMO_ESPERA
+            if self._cambio.wait(min(restante, TRAMO_ESPERA)):
+                return False
+
+    def _notificar(self):
+        self._cambio.set()
+
+
+class ProgramadorKaraoke:
+    """
+    Programa la aparición de las líneas de un LyricsTimeline según plazos
+    absolutos medidos desde el inicio de la canción. El tiempo que tarde en
+    dibujarse una línea no retrasa las siguientes: cada línea se muestra
+    cuando la posición del reloj alcanza su inicio.
+    """
+
+    def __init__(self, timeline, reloj=None):
+        self.timeline = timeline
+        self.reloj = reloj or RelojReproduccion()
+        self.detener = threading.Event()
+
+    def ejecutar(self, mostrar_linea, posicion_inicial=0.0, cola_final=COLA_FINAL):
+        """
+        Reproduce la letra llamando a mostrar_linea(indice, linea, limite),
+        donde `limite` es la posición (en la línea de tiempo de la letra)
+        en la que empieza la línea siguiente, o None si es la última.
+        Devuelve True si la canción terminó y False si se detuvo.
+        """
+        timeline = self.timeline
+        reloj = self.reloj
+        if not reloj.iniciado:
+            reloj.iniciar(posicion_inicial)
+
+        mostrada = -1
+        saltos = reloj.saltos
+        while not self.detener.is_set():
+            if reloj.saltos != saltos:
+                # Tras un salto se vuelve a mostrar la línea vigente
+                saltos = reloj.saltos
+                mostrada = -1
+            indice = timeline.avanzar(reloj.posicion_letra())
+            if indice >= 0 and indice != mostrada:
+                mostrada = indice
+                mostrar_linea(indice, timeline[indice], timeline.siguiente_inicio(indice))
+                # Si dibujar la línea tardó más que el hueco, se re-evalúa
+                # enseguida y se salta directamente a la línea vigente
+                continue
+
+            siguiente = timeline.siguiente_inicio(indice)
+            if siguiente is None:
+                fin = (timeline.duracion if len(timeline) else 0.0) + cola_final
+                if reloj.esperar_hasta(fin, self.detener):
+                    return True
+            else:
+                reloj.esperar_hasta(siguiente, self.detener)
+        return False
+
+    def ejecutar_fotogramas(self, dibujar, fps, posicion_inicial=0.0, cola_final=COLA_FINAL):
+        """
+        Reproduce la letra por fotogramas: llama a dibujar(posicion_letra)
+        como mucho `fps` veces por segundo. Cada fotograma se programa en un
+        instante absoluto; si dibujar tarda más que un periodo se omiten
+        fotogramas en lugar de acumular retraso. Devuelve True si la canción
+        terminó y False si se detuvo.
+        """
+        timeline = self.timeline
+        reloj = self.reloj
+        if not reloj.iniciado:
+            reloj.iniciar(posicion_inicial)
+
+        periodo = 1.0 / fps
+        fin = (timeline.duracion if len(timeline) else 0.0) + cola_final
+        proximo = time.monotonic()
+        while not self.detener.is_set():
+            posicion = reloj.posicion_letra()
+            dibujar(posicion)
+            if posicion >= fin and not reloj.pausado:
+                return True
+            ahora = time.monotonic()
+            proximo += periodo
+            if proximo <= ahora:
+                # Fotogramas perdidos: se sigue desde el instante actual
+                proximo = ahora + periodo
+            self.detener.wait(proximo - ahora)
+        return False
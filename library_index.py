@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_probe import probar_duracion
+from audio_tags import leer_etiquetas
+
+# Formatos de audio aceptados
+EXTENSIONES_AUDIO = (".mp3", ".wav", ".flac", ".ogg")
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+INDICE_FILE = "library_index.sqlite3"
+HILOS_LECTURA = 8  # Lecturas de etiquetas simultáneas (útil en almacenamiento de red)
+
+PistaBiblioteca = namedtuple("PistaBiblioteca", ["ruta", "artista", "titulo", "album", "duracion"])
+
+
+def metadatos_desde_nombre(ruta_archivo_audio):
+    """
+    Deduce (artista, canción) del nombre del archivo cuando no hay etiquetas.
+    Formato esperado: "Canción - Artista.mp3".
+    """
+    nombre_sin_extension = os.path.splitext(os.path.basename(ruta_archivo_audio))[0]
+    if " - " in nombre_sin_extension:
+        partes = nombre_sin_extension.split(" - ")
+        # Tomar la última parte como artista (más común)
+        return partes[-1].strip(), " - ".join(partes[:-1]).strip()
+    # Si no hay separador, usar el nombre completo como canción
+    return "Unknown", nombre_sin_extension
+
+
+def leer_pista(ruta_archivo_audio):
+    """
+    Lee artista, título, álbum y duración de un archivo: primero de sus
+    etiquetas y, para lo que falte, del nombre del archivo.
+    """
+    etiquetas = leer_etiquetas(ruta_archivo_audio)
+    artista, titulo = etiquetas.artista, etiquetas.titulo
+    if not (artista and titulo):
+        artista_nombre, titulo_nombre = metadatos_desde_nombre(ruta_archivo_audio)
+        artista = artista or artista_nombre
+        titulo = titulo or titulo_nombre
+    return PistaBiblioteca(
+        ruta_archivo_audio, artista, titulo, etiquetas.album, probar_duracion(ruta_archivo_audio)
+    )
+
+
+def _es_audio(nombre):
+    return nombre.lower().endswith(EXTENSIONES_AUDIO)
+
+
+def _bajo(carpeta):
+    """
+    Condición SQL (y parámetros) para las rutas dentro de una carpeta.
+    """
+    prefijo = carpeta.rstrip(os.sep) + os.sep
+    return "(ruta = ? OR substr(ruta, 1, ?) = ?)", (carpeta, len(prefijo), prefijo)
+
+
+class IndiceBiblioteca:
+    """
+    Índice persistente (SQLite) de los archivos de audio de una biblioteca
+    con sus etiquetas y duración.
+
+    Cada archivo se guarda con su tamaño y fecha de modificación, y cada
+    carpeta con su fecha de modificación. Al reescanear solo se leen los
+    archivos nuevos o modificados; las carpetas cuya fecha no cambió se
+    reutilizan sin listarlas (sus archivos no se vuelven a consultar salvo
+    en un escaneo completo).
+    """
+
+    def __init__(self, ruta=None, hilos=None):
+        self.ruta = ruta or os.getenv("LIBRARY_INDEX_FILE", INDICE_FILE)
+        self.hilos = hilos or int(os.getenv("LIBRARY_INDEX_HILOS", HILOS_LECTURA))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archivos (
+                ruta TEXT PRIMARY KEY,
+                carpeta TEXT NOT NULL,
+                tamano INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                artista TEXT,
+                titulo TEXT,
+                album TEXT,
+                duracion REAL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS carpetas (
+                ruta TEXT PRIMARY KEY,
+                padre TEXT,
+                mtime_ns INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def escanear(self, carpeta, completo=False):
+        """
+        Recorre la carpeta (y sus subcarpetas) y actualiza el índice.
+        Con completo=True se comprueba también el tamaño y la fecha de cada
+        archivo de las carpetas sin cambios (detecta ediciones in situ).
+        Devuelve un diccionario con el resumen del escaneo.
+        """
+        inicio = time.perf_counter()
+        raiz = os.path.abspath(carpeta)
+        condicion, parametros = _bajo(raiz)
+        with self._lock:
+            archivos_conocidos = {
+                ruta: (carpeta_archivo, tamano, mtime_ns)
+                for ruta, carpeta_archivo, tamano, mtime_ns in self._conn.execute(
+                    f"SELECT ruta, carpeta, tamano, mtime_ns FROM archivos WHERE {condicion}",
+                    parametros,
+                )
+            }
+            carpetas_conocidas = {
+                ruta: (padre, mtime_ns)
+                for ruta, padre, mtime_ns in self._conn.execute(
+                    f"SELECT ruta, padre, mtime_ns FROM carpetas WHERE {condicion}", parametros
+                )
+            }
+
+        archivos_por_carpeta = {}
+        for ruta, (carpeta_archivo, _, _) in archivos_conocidos.items():
+            archivos_por_carpeta.setdefault(carpeta_archivo, []).append(ruta)
+        subcarpetas = {}
+        for ruta, (padre, _) in carpetas_conocidas.items():
+            subcarpetas.setdefault(padre, []).append(ruta)
+
+        vistos = set()
+        carpetas_vistas = {}
+        pendientes = []  # (ruta, carpeta, tamano, mtime_ns) a (re)leer
+        omitidas = 0
+
+        pila = [(raiz, None)]
+        while pila:
+            actual, padre = pila.pop()
+            try:
+                mtime_carpeta = os.stat(actual).st_mtime_ns
+            except OSError:
+                continue
+            carpetas_vistas[actual] = (padre, mtime_carpeta)
+
+            conocida = carpetas_conocidas.get(actual)
+            if not completo and conocida is not None and conocida[1] == mtime_carpeta:
+                # La carpeta no cambió: mismos archivos y subcarpetas
+                omitidas += 1
+                vistos.update(archivos_por_carpeta.get(actual, ()))
+                pila.extend((sub, actual) for sub in subcarpetas.get(actual, ()))
+                continue
+
+            try:
+                with os.scandir(actual) as entradas:
+                    for entrada in entradas:
+                        if entrada.is_dir(follow_symlinks=False):
+                            pila.append((entrada.path, actual))
+                        elif _es_audio(entrada.name) and entrada.is_file():
+                            stat = entrada.stat()
+                            vistos.add(entrada.path)
+                            previo = archivos_conocidos.get(entrada.path)
+                            if previo is None or previo[1:] != (stat.st_size, stat.st_mtime_ns):
+                                pendientes.append(
+                                    (entrada.path, actual, stat.st_size, stat.st_mtime_ns)
+                                )
+            except OSError:
+                continue
+
+        # Leer etiquetas y duración solo de los archivos nuevos o modificados
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            pistas = list(pool.map(leer_pista, [p[0] for p in pendientes]))
+        filas = [
+            (ruta, carpeta_archivo, tamano, mtime_ns, pista.artista, pista.titulo, pista.album, pista.duracion)
+            for (ruta, carpeta_archivo, tamano, mtime_ns), pista in zip(pendientes, pistas)
+        ]
+        eliminados = [(ruta,) for ruta in archivos_conocidos if ruta not in vistos]
+        carpetas_eliminadas = [(ruta,) for ruta in carpetas_conocidas if ruta not in carpetas_vistas]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO archivos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas
+            )
+            self._conn.executemany("DELETE FROM archivos WHERE ruta = ?", eliminados)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO carpetas VALUES (?, ?, ?)",
+                [(ruta, padre, mtime) for ruta, (padre, mtime) in carpetas_vistas.items()],
+            )
+            self._conn.executemany("DELETE FROM carpetas WHERE ruta = ?", carpetas_eliminadas)
+            self._conn.commit()
+
+        nuevos = sum(1 for p in pendientes if p[0] not in archivos_conocidos)
+        return {
+            "total": len(vistos),
+            "nuevos": nuevos,
+            "actualizados": len(pendientes) - nuevos,
+            "eliminados": len(eliminados),
+            "carpetas_omitidas": omitidas,
+            "duracion": time.perf_counter() - inicio,
+        }
+
+    def pistas(self, carpeta):
+        """
+        Devuelve las pistas indexadas dentro de la carpeta, ordenadas por ruta.
+        """
+        condicion, parametros = _bajo(os.path.abspath(carpeta))
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT ruta, artista, titulo, album, duracion FROM archivos "
+                f"WHERE {condicion} ORDER BY ruta",
+                parametros,
+            ).fetchall()
+        return [PistaBiblioteca(*fila) for fila in filas]
+
+    def buscar(self, ruta_archivo_audio):
+        """
+        Devuelve la pista indexada de un archivo si sigue vigente (mismo
+        tamaño y fecha de modificación), o None.
+        """
+        ruta = os.path.abspath(ruta_archivo_audio)
+        try:
+            stat = os.stat(ruta)
+        except OSError:
+            return None
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT ruta, artista, titulo, album, duracion FROM archivos "
+                "WHERE ruta = ? AND tamano = ? AND mtime_ns = ?",
+                (ruta, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        return PistaBiblioteca(*fila) if fila else None
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice():
+    """
+    Devuelve la instancia compartida del índice (se crea al primer uso).
+    """
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceBiblioteca()
+    return _indice
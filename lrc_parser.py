@@ -0,0 +1,167 @@
+import re
+from collections import namedtuple
+from operator import itemgetter
+
+# Etiqueta de tiempo: [mm:ss], [mm:ss.x], [mm:ss.xx], [mm:ss.xxx] o [mm:ss:xx]
+_TIEMPO = r"(\d+):(\d{1,2})(?:[.:](\d{1,3}))?"
+_RE_TIEMPO = re.compile(r"\[" + _TIEMPO + r"\]")
+# Línea de letra (primera etiqueta, etiquetas repetidas y texto) o de metadatos
+# ([ar:Artista], [offset:+250], ...), reconocidas en una única pasada
+_RE_LINEA = re.compile(
+    r"^[ \t]*\[(?:"
+    + _TIEMPO
+    + r"\]((?:\[\d+:\d{1,2}(?:[.:]\d{1,3})?\])*)(.*)|([A-Za-z#]+):([^\]\n]*)\])",
+    re.M,
+)
+# Etiqueta de tiempo de palabra (LRC mejorado) seguida de su texto: <mm:ss.xx>palabra
+_RE_PALABRA = re.compile(r"<" + _TIEMPO + r">([^<]*)")
+_RE_ETIQUETA_PALABRA = re.compile(r"<\d+:\d{1,2}(?:[.:]\d{1,3})?>")
+
+_DIVISORES = (1, 10, 100, 1000)
+
+LrcParseado = namedtuple("LrcParseado", ["lineas", "metadatos", "offset"])
+
+
+def _a_segundos(minutos, segundos, fraccion):
+    if fraccion:
+        return int(minutos) * 60 + int(segundos) + int(fraccion) / _DIVISORES[len(fraccion)]
+    return int(minutos) * 60 + int(segundos)
+
+
+def formatear_timestamp(segundos):
+    """
+    Convierte segundos a un timestamp con formato HH:MM:SS.fff.
+    """
+    milisegundos_totales = int(round(max(segundos, 0.0) * 1000))
+    horas, resto = divmod(milisegundos_totales, 3600000)
+    minutos, resto = divmod(resto, 60000)
+    segs, milisegundos = divmod(resto, 1000)
+    return f"{horas:02d}:{minutos:02d}:{segs:02d}.{milisegundos:03d}"
+
+
+def _parsear_palabras(texto):
+    """
+    Separa una línea de LRC mejorado en texto plano y tiempos por palabra.
+    """
+    palabras = []
+    for minutos, segundos, fraccion, fragmento in _RE_PALABRA.findall(texto):
+        fragmento = fragmento.strip()
+        if fragmento:
+            palabras.append((_a_segundos(minutos, segundos, fraccion), fragmento))
+    plano = _RE_ETIQUETA_PALABRA.sub("", texto)
+    if "  " in plano:
+        plano = " ".join(plano.split())
+    return plano.strip(), palabras
+
+
+def parse_lrc(lrc_text, incluir_vacias=False):
+    """
+    Parsea texto LRC en una sola pasada.
+
+    Soporta varias etiquetas de tiempo por línea ([00:12.00][01:30.00]coro),
+    fracciones de 1 a 3 dígitos, la etiqueta [offset:] (en milisegundos,
+    positiva adelanta la letra) y tiempos por palabra del LRC mejorado
+    (<mm:ss.xx>). Devuelve un LrcParseado cuyas líneas son tuplas
+    (segundos, texto, palabras) ordenadas por tiempo, donde palabras es una
+    lista de tuplas (segundos, palabra).
+    """
+    metadatos = {}
+    offset = 0.0
+    lineas = []
+    agregar = lineas.append
+    ordenado = True
+    anterior = -1.0
+    for minutos, segundos, fraccion, repetidas, texto, clave, valor in _RE_LINEA.findall(lrc_text):
+        if clave:
+            clave = clave.lower()
+            if clave == "offset":
+                try:
+                    offset = int(valor.strip()) / 1000.0
+                except ValueError:
+                    pass
+            else:
+                metadatos[clave] = valor.strip()
+            continue
+
+        texto = texto.strip()
+        if not texto and not incluir_vacias:
+            continue
+
+        if fraccion:
+            tiempo = int(minutos) * 60 + int(segundos) + int(fraccion) / _DIVISORES[len(fraccion)]
+        else:
+            tiempo = int(minutos) * 60 + int(segundos)
+        if "<" in texto:
+            texto, palabras = _parsear_palabras(texto)
+        else:
+            palabras = []
+        agregar((tiempo, texto, palabras))
+        if tiempo < anterior:
+            ordenado = False
+        anterior = tiempo
+
+        if repetidas:
+            # Línea repetida ([00:12.00][01:30.00]coro): los tiempos por
+            # palabra se desplazan junto con ella
+            ordenado = False
+            for extra in _RE_TIEMPO.findall(repetidas):
+                desplazamiento = _a_segundos(*extra) - tiempo
+                palabras_extra = [(t + desplazamiento, palabra) for t, palabra in palabras]
+                agregar((tiempo + desplazamiento, texto, palabras_extra))
+
+    if not ordenado:
+        # sort es estable: las líneas con el mismo tiempo conservan su orden
+        lineas.sort(key=itemgetter(0))
+
+    if offset:
+        # La etiqueta [offset:] puede aparecer en cualquier parte del archivo,
+        # así que se aplica al final
+        lineas = [
+            (
+                max(tiempo - offset, 0.0),
+                texto,
+                [(max(t - offset, 0.0), palabra) for t, palabra in palabras],
+            )
+            for tiempo, texto, palabras in lineas
+        ]
+    return LrcParseado(lineas, metadatos, offset)
+
+
+def _etiqueta_tiempo(segundos):
+    centesimas = int(round(max(segundos, 0.0) * 100))
+    minutos, centesimas = divmod(centesimas, 6000)
+    return f"{minutos:02d}:{centesimas // 100:02d}.{centesimas % 100:02d}"
+
+
+def _prefijo_sin_tiempo(texto, palabras):
+    """
+    Texto de la línea anterior a la primera palabra con tiempo
+    ("[00:10.00]Oh <00:10.50>yeah" -> "Oh "): no está entre las palabras.
+    """
+    cuerpo = " ".join(" ".join(palabra.split()) for _, palabra in palabras)
+    texto = " ".join(texto.split())
+    if len(texto) > len(cuerpo) and texto.endswith(cuerpo):
+        return texto[: len(texto) - len(cuerpo)]
+    return ""
+
+
+def componer_lrc(lineas, metadatos=None):
+    """
+    Operación inversa de parse_lrc: genera texto LRC a partir de líneas
+    (segundos, texto, palabras), como las de un LyricsTimeline. Las líneas
+    con tiempos por palabra se escriben en LRC mejorado (<mm:ss.xx>) y
+    `metadatos` ({"ar": "Artista", ...}) se escribe como cabecera.
+    """
+    partes = [
+        # Una etiqueta por línea y sin corchetes dentro del valor
+        f"[{clave}:{' '.join(str(valor).split()).replace(']', ')')}]"
+        for clave, valor in (metadatos or {}).items()
+        if valor is not None
+    ]
+    for tiempo, texto, palabras in lineas:
+        if palabras:
+            prefijo = _prefijo_sin_tiempo(texto, palabras)
+            texto = prefijo + " ".join(f"<{_etiqueta_tiempo(t)}>{palabra}" for t, palabra in palabras)
+        partes.append(f"[{_etiqueta_tiempo(tiempo)}]{texto}")
+    partes.append("")
+    return "\n".join(partes)
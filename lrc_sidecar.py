@@ -0,0 +1,186 @@
+import argparse
+import os
+import sys
+import time
+
+from lrc_parser import componer_lrc, parse_lrc
+from lyrics_cache import EntradaCache, clave_metadatos, huella_archivo
+from metrics import medir_etapa
+from timeline import LyricsTimeline
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+ACTIVO = True  # Usar el .lrc que haya junto al audio antes que la caché y la red
+ESCRIBIR = False  # Guardar un .lrc junto al audio cada vez que se resuelve una letra
+
+EXTENSION = ".lrc"
+FUENTE_DESCONOCIDA = "LRC"  # Fuente de los .lrc que no escribió este programa
+CREADOR = "sound-lyrics"
+
+_VERDADERO = ("1", "true", "si", "sí", "yes")
+
+
+def sidecar_activo():
+    return os.getenv("SIDECAR_ACTIVO", str(ACTIVO)).lower() in _VERDADERO
+
+
+def escribir_al_resolver():
+    return os.getenv("SIDECAR_ESCRIBIR", str(ESCRIBIR)).lower() in _VERDADERO
+
+
+def ruta_sidecar(ruta_archivo_audio):
+    """
+    Ruta del .lrc que acompaña al audio: mismo nombre, otra extensión.
+    """
+    return os.path.splitext(ruta_archivo_audio)[0] + EXTENSION
+
+
+def leer_sidecar(ruta_archivo_audio):
+    """
+    Lee el .lrc que acompaña al archivo de audio. Devuelve una EntradaCache
+    (letras, fuente) o None si no existe o no tiene líneas con tiempo.
+    La fuente es la de la etiqueta [fuente:] o "LRC" si no la tiene.
+    """
+    ruta = ruta_sidecar(ruta_archivo_audio)
+    try:
+        with medir_etapa("sidecar_lectura"):
+            with open(ruta, encoding="utf-8-sig", errors="replace") as f:
+                parseado = parse_lrc(f.read())
+    except OSError:
+        return None
+    if not parseado.lineas:
+        return None
+    fuente = parseado.metadatos.get("fuente") or FUENTE_DESCONOCIDA
+    return EntradaCache(LyricsTimeline.desde_lineas(parseado.lineas), fuente)
+
+
+def escribir_sidecar(ruta_archivo_audio, letras, fuente, artista=None, titulo=None, duracion=None):
+    """
+    Escribe la letra junto al audio en formato LRC (LRC mejorado si hay
+    tiempos por palabra). La escritura es atómica: un reproductor nunca ve
+    un archivo a medias. Devuelve la ruta escrita.
+    """
+    metadatos = {"ar": artista, "ti": titulo}
+    if duracion:
+        minutos, segundos = divmod(int(round(duracion)), 60)
+        metadatos["length"] = f"{minutos:02d}:{segundos:02d}"
+    metadatos["re"] = CREADOR
+    metadatos["fuente"] = fuente
+    ruta = ruta_sidecar(ruta_archivo_audio)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with medir_etapa("sidecar_escritura"):
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                f.write(componer_lrc(letras, metadatos))
+            os.replace(temporal, ruta)
+        except OSError:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+    return ruta
+
+
+def _exportar_lote(pistas, sobrescribir):
+    """
+    Trabajo de cada proceso: escribe el .lrc de las pistas cuya letra está
+    en la caché local. Devuelve (contadores, fallidas).
+    """
+    from lyrics_cache import obtener_cache
+
+    cache = obtener_cache()
+    contadores = {"exportadas": 0, "existentes": 0, "sin_letra": 0, "errores": 0}
+    fallidas = []
+    for ruta, artista, titulo, duracion in pistas:
+        try:
+            if not sobrescribir and os.path.exists(ruta_sidecar(ruta)):
+                contadores["existentes"] += 1
+                continue
+            entrada = cache.buscar([huella_archivo(ruta), clave_metadatos(artista, titulo, duracion)])
+            if entrada is None or not entrada.letras:
+                contadores["sin_letra"] += 1
+                continue
+            escribir_sidecar(ruta, entrada.letras, entrada.fuente, artista, titulo, duracion)
+            contadores["exportadas"] += 1
+        except (OSError, ValueError) as e:
+            contadores["errores"] += 1
+            fallidas.append((ruta, str(e)))
+    return contadores, fallidas
+
+
+def exportar_biblioteca(pistas, procesos=None, sobrescribir=False, salida=None):
+    """
+    Escribe en paralelo (un pool de procesos) el .lrc de cada pista cuya
+    letra ya está resuelta en la caché local, para que la biblioteca
+    funcione después sin caché ni conexión. `pistas` son PistaBiblioteca.
+    Devuelve un diccionario con el resumen.
+    """
+    # El pool de procesos solo se carga al exportar
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    salida = salida or sys.stdout
+    procesos = procesos or os.cpu_count() or 1
+    datos = [(p.ruta, p.artista, p.titulo, p.duracion) for p in pistas]
+    tam_lote = max(1, min(200, -(-len(datos) // (procesos * 4))))
+    lotes = [datos[i:i + tam_lote] for i in range(0, len(datos), tam_lote)]
+
+    resumen = {"total": len(datos), "exportadas": 0, "existentes": 0, "sin_letra": 0, "errores": 0}
+    resumen["fallidas"] = []
+    inicio = time.perf_counter()
+    # spawn: el proceso principal tiene hilos (log, métricas) y hacer fork
+    # con hilos activos no es seguro
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(procesos, len(lotes) or 1), mp_context=contexto) as pool:
+        futuros = [pool.submit(_exportar_lote, lote, sobrescribir) for lote in lotes]
+        hechas = 0
+        for futuro in as_completed(futuros):
+            contadores, fallidas = futuro.result()
+            for clave, valor in contadores.items():
+                resumen[clave] += valor
+            resumen["fallidas"].extend(fallidas)
+            hechas += sum(contadores.values())
+            salida.write(f"[{hechas}/{len(datos)}] 📄 {resumen['exportadas']} exportadas\n")
+            salida.flush()
+    resumen["duracion_total"] = time.perf_counter() - inicio
+    return resumen
+
+
+def main():
+    from env_config import cargar_entorno
+    from library_index import obtener_indice
+
+    parser = argparse.ArgumentParser(
+        description="Exporta como .lrc junto a cada archivo las letras ya resueltas en la caché."
+    )
+    parser.add_argument("carpeta", nargs="?", default="sounds", help="Carpeta con los archivos de audio")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (por defecto, uno por CPU)")
+    parser.add_argument("--sobrescribir", action="store_true", help="Reemplazar los .lrc que ya existan")
+    args = parser.parse_args()
+    cargar_entorno()
+
+    if not os.path.isdir(args.carpeta):
+        print(f"❌ No existe la carpeta '{args.carpeta}'.")
+        return 1
+    indice = obtener_indice()
+    indice.escanear(args.carpeta)
+    pistas = indice.pistas(args.carpeta)
+    if not pistas:
+        print(f"❌ No hay archivos de audio en '{args.carpeta}'.")
+        return 1
+
+    print(f"📄 Exportando las letras de {len(pistas)} canciones...")
+    resumen = exportar_biblioteca(pistas, args.procesos, args.sobrescribir)
+    print("=" * 60)
+    print(f"✅ Exportadas: {resumen['exportadas']}")
+    print(f"📄 Ya tenían .lrc: {resumen['existentes']}")
+    print(f"❌ Sin letra en la caché: {resumen['sin_letra']}")
+    print(f"💥 Errores: {resumen['errores']}")
+    for ruta, motivo in resumen["fallidas"][:10]:
+        print(f"   - {os.path.basename(ruta)}: {motivo}")
+    print(f"⏱️ Tiempo total: {resumen['duracion_total']:.1f}s")
+    if resumen["sin_letra"]:
+        print("💡 Ejecuta antes `python prefetch.py` para resolver las canciones que faltan")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+import os
+import shutil
+import struct
+import subprocess
+from array import array
+
+from timeline import LyricsTimeline
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+ACTIVA = True  # Alinear las letras sin tiempos con el audio local
+FFMPEG = "ffmpeg"  # Decodificador para los formatos sin soporte directo
+
+BLOQUE_SEGUNDOS = 10.0  # Audio decodificado y analizado de una vez
+TRAMA_SEGUNDOS = 0.02  # Resolución de la envolvente
+FRECUENCIA_FFMPEG = 16000  # Frecuencia a la que ffmpeg entrega el audio
+BANDA_VOZ = (250.0, 3500.0)  # Hz donde se concentra la voz cantada
+SUAVIZADO_SEGUNDOS = 0.25  # Ventana de la media móvil de la energía
+UMBRAL = 0.4  # Fracción del rango dinámico (en dB) que marca actividad
+RANGO_MINIMO_DB = 6.0  # Por debajo, el audio es demasiado plano para alinear
+PAUSA_MINIMA = 0.35  # Silencios más cortos no separan frases
+FRASE_MINIMA = 0.3  # Segundos mínimos de una frase
+AJUSTE_INICIO = 0.15  # Segundos alrededor del inicio donde se busca el ataque
+COBERTURA_MINIMA = 0.1  # Fracción del audio con voz por debajo de la cual se descarta
+
+
+def numpy_disponible():
+    return np is not None
+
+
+def alineacion_activa():
+    return np is not None and os.getenv("ALINEACION_ACTIVA", str(ACTIVA)).lower() in (
+        "1", "true", "si", "sí", "yes"
+    )
+
+
+# --- Decodificación en bloques (audio mono en float32) ---
+
+def _muestras_pcm(datos, bits, flotante):
+    if flotante:
+        return np.frombuffer(datos, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    if bits == 8:
+        return (np.frombuffer(datos, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if bits == 16:
+        return np.frombuffer(datos, dtype="<i2").astype(np.float32) / 32768.0
+    if bits == 24:
+        trios = np.frombuffer(datos, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        valores = trios[:, 0] | (trios[:, 1] << 8) | (trios[:, 2] << 16)
+        valores -= (valores & 0x800000) << 1
+        return valores.astype(np.float32) / 8388608.0
+    if bits == 32:
+        return np.frombuffer(datos, dtype="<i4").astype(np.float32) / 2147483648.0
+    raise ValueError(f"Profundidad de bits no soportada: {bits}")
+
+
+def _bloques_wav(ruta):
+    """
+    Lee un WAV (PCM entero, flotante o WAVE_FORMAT_EXTENSIBLE) recorriendo
+    sus bloques RIFF. Devuelve (frecuencia, generador de bloques mono).
+    """
+    f = open(ruta, "rb")
+    try:
+        cabecera = f.read(12)
+        if cabecera[:4] != b"RIFF" or cabecera[8:12] != b"WAVE":
+            raise ValueError("No es un archivo WAV")
+        formato = None
+        while True:
+            bloque = f.read(8)
+            if len(bloque) < 8:
+                raise ValueError("WAV sin bloque de datos")
+            ident, tamano = struct.unpack("<4sI", bloque)
+            if ident == b"fmt ":
+                fmt = f.read(tamano)
+                etiqueta, canales, frecuencia = struct.unpack_from("<HHI", fmt, 0)
+                alineacion, bits = struct.unpack_from("<HH", fmt, 12)
+                if etiqueta == 0xFFFE and len(fmt) >= 26:
+                    etiqueta = struct.unpack_from("<H", fmt, 24)[0]
+                if etiqueta not in (1, 3):
+                    raise ValueError(f"Codificación WAV no soportada: {etiqueta}")
+                formato = (canales, frecuencia, alineacion, bits, etiqueta == 3)
+                if tamano & 1:
+                    f.seek(1, os.SEEK_CUR)
+            elif ident == b"data":
+                if formato is None:
+                    raise ValueError("WAV sin bloque de formato")
+                break
+            else:
+                f.seek(tamano + (tamano & 1), os.SEEK_CUR)
+    except Exception:
+        f.close()
+        raise
+
+    canales, frecuencia, alineacion, bits, flotante = formato
+    bytes_bloque = max(1, int(BLOQUE_SEGUNDOS * frecuencia)) * alineacion
+
+    def bloques():
+        with f:
+            restante = tamano
+            while restante > 0:
+                datos = f.read(min(bytes_bloque, restante))
+                datos = datos[: len(datos) - len(datos) % alineacion]
+                if not datos:
+                    break
+                restante -= len(datos)
+                muestras = _muestras_pcm(datos, bits, flotante)
+                yield muestras.reshape(-1, canales).mean(axis=1) if canales > 1 else muestras
+
+    return frecuencia, bloques()
+
+
+def _bloques_soundfile(ruta):
+    frecuencia = soundfile.info(ruta).samplerate
+    tam = max(1, int(BLOQUE_SEGUNDOS * frecuencia))
+
+    def bloques():
+        for bloque in soundfile.blocks(ruta, blocksize=tam, dtype="float32", always_2d=True):
+            yield bloque.mean(axis=1)
+
+    return frecuencia, bloques()
+
+
+def _bloques_ffmpeg(ruta, ejecutable):
+    comando = [
+        ejecutable, "-nostdin", "-v", "error", "-i", ruta,
+        "-f", "f32le", "-ac", "1", "-ar", str(FRECUENCIA_FFMPEG), "-",
+    ]
+    bytes_bloque = int(BLOQUE_SEGUNDOS * FRECUENCIA_FFMPEG) * 4
+
+    def bloques():
+        proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                datos = proceso.stdout.read(bytes_bloque)
+                datos = datos[: len(datos) - len(datos) % 4]
+                if not datos:
+                    break
+                yield np.frombuffer(datos, dtype="<f4")
+        finally:
+            proceso.stdout.close()
+            if proceso.poll() is None:
+                proceso.kill()
+            proceso.wait()
+
+    return FRECUENCIA_FFMPEG, bloques()
+
+
+def decodificar(ruta_archivo_audio):
+    """
+    Prepara la lectura del audio en bloques de BLOQUE_SEGUNDOS, sin cargarlo
+    entero en memoria. WAV se lee directamente; el resto usa soundfile o
+    ffmpeg si están instalados. Devuelve (frecuencia, bloques) o None si no
+    hay forma de decodificar el archivo.
+    """
+    extension = os.path.splitext(ruta_archivo_audio)[1].lower()
+    if extension == ".wav":
+        try:
+            return _bloques_wav(ruta_archivo_audio)
+        except (ValueError, struct.error):
+            pass  # Codificación poco habitual: se prueba con los decodificadores externos
+    if soundfile is not None:
+        try:
+            return _bloques_soundfile(ruta_archivo_audio)
+        except RuntimeError:
+            pass  # Formato que libsndfile no entiende (por ejemplo, MP3 antiguo)
+    ejecutable = shutil.which(os.getenv("ALINEACION_FFMPEG", FFMPEG))
+    if ejecutable:
+        return _bloques_ffmpeg(ruta_archivo_audio, ejecutable)
+    return None
+
+
+# --- Envolvente de energía y ataques ---
+
+def calcular_envolvente(frecuencia, bloques):
+    """
+    Energía en la banda de la voz (dB) y flujo espectral (ataques) por
+    trama de TRAMA_SEGUNDOS. Cada bloque se procesa de forma vectorizada
+    con una FFT por trama; las muestras sobrantes pasan al bloque siguiente.
+    """
+    tam = max(16, int(round(frecuencia * TRAMA_SEGUNDOS)))
+    ventana = np.hanning(tam).astype(np.float32)
+    frecuencias = np.fft.rfftfreq(tam, 1.0 / frecuencia)
+    banda = (frecuencias >= BANDA_VOZ[0]) & (frecuencias <= BANDA_VOZ[1])
+
+    energias = []
+    flujos = []
+    resto = np.empty(0, dtype=np.float32)
+    anterior = None
+    for bloque in bloques:
+        datos = np.concatenate((resto, bloque)) if resto.size else bloque
+        n = len(datos) // tam
+        resto = datos[n * tam:]
+        if n == 0:
+            continue
+        tramas = datos[: n * tam].reshape(n, tam) * ventana
+        espectro = np.abs(np.fft.rfft(tramas, axis=1))[:, banda]
+        energias.append(10.0 * np.log10((espectro ** 2).sum(axis=1) + 1e-10))
+        magnitud = np.log1p(espectro)
+        previa = np.vstack((magnitud[:1] if anterior is None else anterior, magnitud[:-1]))
+        flujos.append(np.maximum(magnitud - previa, 0.0).sum(axis=1))
+        anterior = magnitud[-1:]
+
+    if not energias:
+        return np.empty(0), np.empty(0), tam / frecuencia
+    return np.concatenate(energias), np.concatenate(flujos), tam / frecuencia
+
+
+def detectar_frases(energia, flujo, paso):
+    """
+    Segmenta la envolvente en frases: tramas cuya energía suavizada supera
+    un umbral relativo al rango dinámico de la canción, uniendo pausas
+    cortas y descartando frases breves. El inicio de cada frase se ajusta
+    al ataque (máximo del flujo espectral) más cercano.
+    Devuelve una lista de (inicio, fin) en segundos.
+    """
+    if energia.size == 0:
+        return []
+    ancho = max(1, int(round(SUAVIZADO_SEGUNDOS / paso)))
+    suavizada = np.convolve(energia, np.ones(ancho) / ancho, mode="same")
+    piso, techo = np.percentile(suavizada, [15, 95])
+    if techo - piso < RANGO_MINIMO_DB:
+        return []
+    activa = (suavizada > piso + UMBRAL * (techo - piso)).astype(np.int8)
+
+    bordes = np.flatnonzero(np.diff(np.concatenate(([0], activa, [0]))))
+    segmentos = []
+    for inicio, fin in zip(bordes[0::2], bordes[1::2]):
+        if segmentos and (inicio - segmentos[-1][1]) * paso < PAUSA_MINIMA:
+            segmentos[-1][1] = fin
+        else:
+            segmentos.append([inicio, fin])
+
+    radio = max(1, int(round(AJUSTE_INICIO / paso)))
+    frases = []
+    for inicio, fin in segmentos:
+        if (fin - inicio) * paso < FRASE_MINIMA:
+            continue
+        desde = max(0, inicio - radio)
+        ataque = desde + int(np.argmax(flujo[desde: inicio + radio + 1]))
+        frases.append((ataque * paso, fin * paso))
+    return frases
+
+
+# --- Reparto de las líneas ---
+
+def _es_seccion(linea):
+    return linea.startswith("[") and linea.endswith("]")
+
+
+def _particion(a, b, maximo):
+    """
+    Parte la secuencia `a` en len(b) grupos contiguos y no vacíos cuyas
+    sumas se parezcan lo más posible (en proporción) a los valores de `b`.
+    Programación dinámica con grupos de como mucho `maximo` elementos.
+    Devuelve los len(b) + 1 cortes sobre `a`.
+    """
+    a = np.asarray(a, dtype=float) / sum(a)
+    b = np.asarray(b, dtype=float) / sum(b)
+    acumulado = np.concatenate(([0.0], np.cumsum(a)))
+    n, m = len(a), len(b)
+    infinito = float("inf")
+    coste = np.full((m + 1, n + 1), infinito)
+    origen = np.zeros((m + 1, n + 1), dtype=int)
+    coste[0, 0] = 0.0
+    for k in range(m):
+        # Los grupos restantes necesitan al menos un elemento cada uno
+        for i in range(k, n - (m - k) + 1):
+            if coste[k, i] == infinito:
+                continue
+            fin = min(n - (m - k - 1), i + maximo)
+            sumas = acumulado[i + 1: fin + 1] - acumulado[i]
+            costes = coste[k, i] + np.log(sumas / b[k]) ** 2
+            destinos = coste[k + 1, i + 1: fin + 1]
+            mejora = costes < destinos
+            destinos[mejora] = costes[mejora]
+            origen[k + 1, i + 1: fin + 1][mejora] = i
+    if coste[m, n] == infinito:
+        return None
+    cortes = [n]
+    for k in range(m, 0, -1):
+        cortes.append(origen[k, cortes[-1]])
+    return cortes[::-1]
+
+
+def distribuir_lineas(lineas, frases):
+    """
+    Reparte las líneas entre las frases detectadas: con más frases que
+    líneas, cada línea empieza en una frase y se queda con las siguientes
+    hasta la próxima; con menos, cada frase agrupa varias líneas seguidas
+    que se reparten su duración según su longitud. Los grupos se eligen
+    para que la duración de cada uno se parezca a la longitud de su texto.
+    Los títulos de sección ([Coro], ...) no consumen tiempo y se muestran
+    justo antes de su primera línea. Devuelve un LyricsTimeline o None.
+    """
+    cantadas = [i for i, linea in enumerate(lineas) if not _es_seccion(linea)]
+    pesos = [max(len(lineas[i].replace(" ", "")), 1) for i in cantadas]
+    duraciones = [fin - inicio for inicio, fin in frases]
+    tiempos = []
+    if len(frases) >= len(cantadas):
+        maximo = max(4, 3 * -(-len(frases) // len(cantadas)))
+        cortes = _particion(duraciones, pesos, maximo)
+        if cortes is None:
+            return None
+        tiempos = [frases[corte][0] for corte in cortes[:-1]]
+    else:
+        maximo = max(4, 3 * -(-len(cantadas) // len(frases)))
+        cortes = _particion(pesos, duraciones, maximo)
+        if cortes is None:
+            return None
+        for (inicio, fin), desde, hasta in zip(frases, cortes[:-1], cortes[1:]):
+            grupo = pesos[desde:hasta]
+            total = sum(grupo)
+            acumulado = 0
+            for peso in grupo:
+                tiempos.append(inicio + (fin - inicio) * acumulado / total)
+                acumulado += peso
+
+    inicios = dict(zip(cantadas, tiempos))
+    resultado = array("d")
+    siguiente = None
+    for i in range(len(lineas) - 1, -1, -1):
+        if i in inicios:
+            siguiente = inicios[i]
+            resultado.append(siguiente)
+        else:
+            # Sección: justo antes de su primera línea (o al final si no la hay)
+            previo = max((inicios[j] for j in cantadas if j < i), default=0.0)
+            if siguiente is None:
+                resultado.append(previo + 1.0)
+            else:
+                resultado.append(max(previo, siguiente - 1.0, 0.0))
+    resultado.reverse()
+    return LyricsTimeline(resultado, list(lineas))
+
+
+def alinear_lineas(ruta_archivo_audio, lineas):
+    """
+    Asigna tiempos a letras sin sincronizar a partir de las frases vocales
+    detectadas en el audio local. Devuelve un LyricsTimeline, o None si no
+    se puede alinear (sin NumPy, formato sin decodificador, audio sin
+    frases claras); en ese caso se usan los timestamps simulados.
+    """
+    if not lineas or not alineacion_activa():
+        return None
+    if not any(not _es_seccion(linea) for linea in lineas):
+        return None
+    decodificado = decodificar(ruta_archivo_audio)
+    if decodificado is None:
+        return None
+    energia, flujo, paso = calcular_envolvente(*decodificado)
+    frases = detectar_frases(energia, flujo, paso)
+    if len(frases) < 2:
+        return None
+    con_voz = sum(fin - inicio for inicio, fin in frases)
+    if con_voz < COBERTURA_MINIMA * energia.size * paso:
+        return None
+    return distribuir_lineas(lineas, frases)
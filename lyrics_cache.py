@@ -0,0 +1,328 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from metrics import medir_etapa, obtener_metricas
+from query_normalizer import clave_consulta, plegar
+from timeline import LyricsTimeline
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+CACHE_FILE = "lyrics_cache.sqlite3"
+TTL_POSITIVO_DIAS = 30
+TTL_NEGATIVO_HORAS = 6
+MAX_ENTRADAS = 20000
+MAX_MEGABYTES = 100
+HUELLAS_MAX = 4096  # Huellas de archivos que se recuerdan en memoria (LRU)
+
+# Bytes leídos al principio y al final del archivo para calcular su huella
+BLOQUE_HUELLA = 64 * 1024
+
+# Cada cuántas escrituras se ejecuta el desalojo por tamaño
+DESALOJO_CADA = 50
+# Los accesos (para el desalojo LRU) se acumulan en memoria y se guardan
+# con la siguiente escritura, al purgar o al llegar a estos límites
+ACCESOS_PENDIENTES = 256
+ACCESOS_CADA = 60.0  # Segundos
+
+EntradaCache = namedtuple("EntradaCache", ["letras", "fuente"])
+
+_consultas = obtener_metricas().contador(
+    "sound_lyrics_cache_consultas_total",
+    "Consultas a la caché local (acierto, negativo o fallo)",
+    ["resultado"],
+)
+
+_huellas_memo = OrderedDict()
+_huellas_lock = threading.Lock()
+
+
+def normalizar_texto(texto):
+    """
+    Normaliza un texto para usarlo como parte de una clave de caché:
+    minúsculas, sin acentos y con los espacios colapsados.
+    """
+    return plegar(texto)
+
+
+def clave_metadatos(nombre_artista, nombre_cancion, duracion=None):
+    """
+    Construye la clave de caché a partir de artista, canción y duración.
+    Artista y título se reducen a su forma canónica (sin "feat.",
+    "(Remastered)"... y con los alias aplicados), así todas las variantes
+    de una canción comparten entrada.
+    """
+    duracion_txt = str(int(round(duracion))) if duracion else ""
+    return "meta:{}|{}".format(clave_consulta(nombre_artista, nombre_cancion), duracion_txt)
+
+
+def huella_archivo(ruta_archivo_audio):
+    """
+    Calcula una huella rápida del archivo de audio (tamaño + primeros y
+    últimos 64 KB). Se memoriza por ruta, tamaño y fecha de modificación
+    para no volver a leer el archivo en consultas repetidas (hasta
+    LYRICS_CACHE_HUELLAS_MAX archivos, desalojando los menos usados).
+    """
+    stat = os.stat(ruta_archivo_audio)
+    memo_key = (os.path.abspath(ruta_archivo_audio), stat.st_size, stat.st_mtime_ns)
+    with _huellas_lock:
+        if memo_key in _huellas_memo:
+            _huellas_memo.move_to_end(memo_key)
+            return _huellas_memo[memo_key]
+
+    sha1 = hashlib.sha1(str(stat.st_size).encode("ascii"))
+    with open(ruta_archivo_audio, "rb") as f:
+        sha1.update(f.read(BLOQUE_HUELLA))
+        if stat.st_size > 2 * BLOQUE_HUELLA:
+            f.seek(-BLOQUE_HUELLA, os.SEEK_END)
+            sha1.update(f.read(BLOQUE_HUELLA))
+    huella = "file:" + sha1.hexdigest()
+
+    maximo = max(int(os.getenv("LYRICS_CACHE_HUELLAS_MAX", HUELLAS_MAX)), 1)
+    with _huellas_lock:
+        _huellas_memo[memo_key] = huella
+        _huellas_memo.move_to_end(memo_key)
+        while len(_huellas_memo) > maximo:
+            _huellas_memo.popitem(last=False)
+    return huella
+
+
+def _deserializar(datos):
+    """
+    Convierte el JSON guardado en un LyricsTimeline. Acepta también el
+    formato antiguo de lista de diccionarios con 'text' y 'timestamp'.
+    """
+    if datos is None:
+        return None
+    letras = json.loads(datos)
+    if isinstance(letras, dict):
+        return LyricsTimeline.desde_dict(letras)
+    return LyricsTimeline.desde_dicts(letras)
+
+
+class LyricsCache:
+    """
+    Caché persistente de letras sincronizadas sobre SQLite.
+
+    Guarda las letras ya parseadas bajo una o varias claves (metadatos y
+    huella del archivo). Los resultados negativos se guardan con un TTL más
+    corto, y las entradas se desalojan por antigüedad y por tamaño total.
+    """
+
+    def __init__(
+        self,
+        ruta=None,
+        ttl_positivo=None,
+        ttl_negativo=None,
+        max_entradas=None,
+        max_bytes=None,
+    ):
+        self.ruta = ruta or os.getenv("LYRICS_CACHE_FILE", CACHE_FILE)
+        self.ttl_positivo = ttl_positivo or float(
+            os.getenv("LYRICS_CACHE_TTL_DIAS", TTL_POSITIVO_DIAS)
+        ) * 86400
+        self.ttl_negativo = ttl_negativo or float(
+            os.getenv("LYRICS_CACHE_TTL_NEGATIVO_HORAS", TTL_NEGATIVO_HORAS)
+        ) * 3600
+        self.max_entradas = max_entradas or int(
+            os.getenv("LYRICS_CACHE_MAX_ENTRADAS", MAX_ENTRADAS)
+        )
+        self.max_bytes = max_bytes or int(
+            float(os.getenv("LYRICS_CACHE_MAX_MB", MAX_MEGABYTES)) * 1024 * 1024
+        )
+
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self._accesos = {}  # clave -> último acceso aún sin guardar
+        self._accesos_guardados = time.monotonic()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entradas (
+                clave TEXT PRIMARY KEY,
+                fuente TEXT,
+                datos TEXT,
+                creado REAL NOT NULL,
+                expira REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL,
+                tamano INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entradas_acceso ON entradas (ultimo_acceso)"
+        )
+        self._conn.commit()
+        self.purgar()
+
+    def buscar(self, claves):
+        """
+        Busca la primera clave vigente. Devuelve una EntradaCache (con
+        letras=None si es un resultado negativo) o None si no hay entrada.
+        Solo lee: el acceso se apunta en memoria y se guarda más tarde.
+        """
+        ahora = time.time()
+        with medir_etapa("cache_consulta"), self._lock:
+            for clave in claves:
+                if not clave:
+                    continue
+                fila = self._conn.execute(
+                    "SELECT fuente, datos FROM entradas WHERE clave = ? AND expira > ?",
+                    (clave, ahora),
+                ).fetchone()
+                if fila is None:
+                    continue
+                self._accesos[clave] = ahora
+                if (
+                    len(self._accesos) >= ACCESOS_PENDIENTES
+                    or time.monotonic() - self._accesos_guardados >= ACCESOS_CADA
+                ):
+                    self._guardar_accesos()
+                    self._conn.commit()
+                fuente, datos = fila
+                _consultas.inc(resultado="acierto" if datos is not None else "negativo")
+                return EntradaCache(_deserializar(datos), fuente)
+        _consultas.inc(resultado="fallo")
+        return None
+
+    def guardar(self, claves, letras, fuente):
+        """
+        Guarda letras encontradas bajo todas las claves indicadas.
+        """
+        if isinstance(letras, LyricsTimeline):
+            letras = letras.a_dict()
+        datos = json.dumps(letras, ensure_ascii=False, separators=(",", ":"))
+        self._escribir(claves, fuente, datos, self.ttl_positivo)
+
+    def guardar_negativo(self, claves):
+        """
+        Registra que no hay letras para estas claves (TTL corto).
+        """
+        self._escribir(claves, None, None, self.ttl_negativo)
+
+    def _escribir(self, claves, fuente, datos, ttl):
+        ahora = time.time()
+        tamano = len(datos.encode("utf-8")) if datos is not None else 0
+        filas = [
+            (clave, fuente, datos, ahora, ahora + ttl, ahora, tamano)
+            for clave in claves
+            if clave
+        ]
+        with medir_etapa("cache_escritura"), self._lock:
+            self._guardar_accesos()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?, ?)", filas
+            )
+            self._conn.commit()
+            self._escrituras += 1
+            desalojar = self._escrituras % DESALOJO_CADA == 0
+        if desalojar:
+            self.purgar()
+
+    def _guardar_accesos(self):
+        # Con el lock tomado; el commit lo hace quien llama
+        if self._accesos:
+            self._conn.executemany(
+                "UPDATE entradas SET ultimo_acceso = ? WHERE clave = ?",
+                [(ahora, clave) for clave, ahora in self._accesos.items()],
+            )
+            self._accesos.clear()
+        self._accesos_guardados = time.monotonic()
+
+    def guardar_accesos(self):
+        """
+        Guarda en SQLite los accesos pendientes.
+        """
+        with self._lock:
+            if self._accesos:
+                self._guardar_accesos()
+                self._conn.commit()
+
+    def purgar(self):
+        """
+        Elimina entradas caducadas y, si se superan los límites de entradas
+        o de tamaño, las menos usadas recientemente.
+        """
+        with self._lock:
+            # El orden LRU tiene en cuenta los accesos aún en memoria
+            self._guardar_accesos()
+            self._conn.execute("DELETE FROM entradas WHERE expira <= ?", (time.time(),))
+
+            total = self._conn.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+            if total > self.max_entradas:
+                self._conn.execute(
+                    """
+                    DELETE FROM entradas WHERE clave IN (
+                        SELECT clave FROM entradas ORDER BY ultimo_acceso LIMIT ?
+                    )
+                    """,
+                    (total - self.max_entradas,),
+                )
+
+            tamano_total = self._conn.execute(
+                "SELECT COALESCE(SUM(tamano), 0) FROM entradas"
+            ).fetchone()[0]
+            if tamano_total > self.max_bytes:
+                exceso = tamano_total - self.max_bytes
+                liberado = 0
+                claves = []
+                for clave, tamano in self._conn.execute(
+                    "SELECT clave, tamano FROM entradas ORDER BY ultimo_acceso"
+                ):
+                    claves.append((clave,))
+                    liberado += tamano
+                    if liberado >= exceso:
+                        break
+                self._conn.executemany("DELETE FROM entradas WHERE clave = ?", claves)
+
+            self._conn.commit()
+
+    def entradas_metadatos(self):
+        """
+        Devuelve (clave, fuente, letras) de las entradas positivas vigentes
+        guardadas bajo una clave de metadatos.
+        """
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT clave, fuente, datos FROM entradas "
+                "WHERE clave LIKE 'meta:%' AND datos IS NOT NULL AND expira > ?",
+                (time.time(),),
+            ).fetchall()
+        return [(clave, fuente, _deserializar(datos)) for clave, fuente, datos in filas]
+
+    def limpiar(self):
+        """
+        Vacía la caché por completo.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entradas")
+            self._conn.commit()
+
+    def cerrar(self):
+        with self._lock:
+            self._guardar_accesos()
+            self._conn.commit()
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache():
+    """
+    Devuelve la instancia compartida de la caché (se crea al primer uso).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LyricsCache()
+                atexit.register(_cache.guardar_accesos)
+    return _cache
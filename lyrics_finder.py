@@ -1,116 +1,285 @@
-import os
-import requests
-import json
+import contextlib
 import datetime
-import re
-from dotenv import load_dotenv
+import importlib.util
+import os
+import threading
+from array import array
+from urllib.parse import urljoin
+
+from api_logger import obtener_registro
+from audio_excerpt import CuerpoMultipart, Fragmento, extraer_fragmento
+from library_index import PistaBiblioteca, leer_pista
+from lrc_parser import parse_lrc
+from lrc_sidecar import escribir_al_resolver, escribir_sidecar, leer_sidecar, ruta_sidecar, sidecar_activo
+from lyrics_cache import clave_metadatos, huella_archivo, obtener_cache
+from lyrics_pack import buscar_en_paquete
+from lyrics_search import obtener_indice_letras
+from metrics import medir_etapa, obtener_metricas
+from provider_strategy import CircuitBreaker, Proveedor, marcar_envio, obtener_estrategia, plazo_llamada
+from query_normalizer import normalizar_consulta, puntuar_resultado
+from request_scheduler import PLANIFICADORES, CuotaAgotada, SinTurno, obtener_planificador, prioridad_actual
+from single_flight import SingleFlight
+from timeline import LyricsTimeline
+
+# Importar este módulo no carga requests ni lrcup, no imprime nada y no lee
+# el .env: la configuración se consulta al usarse (los puntos de entrada
+# cargan el .env con env_config.cargar_entorno antes de llamar a nada).
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+AUDD_API_URL = "https://api.audd.io/"
+
+# Turnos por proveedor (ver request_scheduler): peticiones simultáneas,
+# peticiones por segundo y ráfaga por defecto; el .env las sobreescribe
+# con <PROVEEDOR>_MAX_CONCURRENCIA, _PETICIONES_POR_SEGUNDO, _RAFAGA y
+# _CUOTA_DIARIA
+_PLANIFICACION_POR_DEFECTO = {
+    "lrclib": {"concurrencia": 4, "tasa": 5.0, "rafaga": 10},
+    "audd": {"concurrencia": 2, "tasa": 2.0, "rafaga": 4},
+}
+# Errores de límite de Audd.io: sin api_token y límite alcanzado (901) y
+# límite del api_token alcanzado (902)
+_ERRORES_LIMITE_AUDD = (901, 902)
+
+# Timeouts, reintentos y circuit breaker de cada proveedor (ver provider_strategy);
+# se crean al primer uso con la configuración del .env
+_OPCIONES_PROVEEDOR = {
+    "lrclib": {"timeout": 15.0, "errores_definitivos": (CuotaAgotada,), "errores_locales": (SinTurno,)},
+    "audd": {
+        "timeout": 30.0,
+        "errores_definitivos": (FileNotFoundError, CuotaAgotada),
+        "errores_locales": (SinTurno,),
+    },
+}
+PROVEEDORES = {}
+
+_config_lock = threading.Lock()
+_lrclib_disponible = None
+
+# Peticiones en curso, para que las consultas idénticas simultáneas se
+# agrupen; quien se une a una no espera más allá del plazo de su llamada
+_vuelos = SingleFlight(plazo=plazo_llamada)
+
+# Métricas (ver metrics.py); se exportan solo si se configuran en el .env
+_metricas = obtener_metricas()
+_resoluciones = _metricas.contador(
+    "sound_lyrics_resoluciones_total",
+    "Canciones resueltas por obtener_letra_sincronizada según la fuente",
+    ["fuente"],
+)
+_compartidas = _metricas.contador(
+    "sound_lyrics_peticiones_compartidas_total",
+    "Consultas resueltas con la respuesta de una consulta idéntica en curso",
+    ["proveedor"],
+)
+_bytes_audd = _metricas.contador(
+    "sound_lyrics_audd_bytes_enviados_total", "Bytes de audio enviados a Audd.io"
+)
+_metricas.indicador(
+    "sound_lyrics_circuito_abierto",
+    "1 si el circuit breaker del proveedor está abierto o semiabierto",
+    lambda: {
+        (nombre,): int(proveedor.breaker.estado != CircuitBreaker.CERRADO)
+        for nombre, proveedor in list(PROVEEDORES.items())
+    },
+    ["proveedor"],
+)
+
+
+class ProveedoresNoDisponibles(Exception):
+    """
+    Ningún proveedor pudo responder (error de red, timeout, circuito
+    abierto, sin turno...): no se sabe si la canción tiene letra.
+    """
 
-try:
-    from lrcup import LRCLib
-    LRCLIB_AVAILABLE = True
-    print("✅ LRCLIB disponible - Letras sincronizadas reales habilitadas")
-except ImportError:
-    LRCLIB_AVAILABLE = False
-    print("⚠️ LRCLIB no está disponible. Instala con: pip install lrcup")
 
-# Carga las variables del archivo .env
-load_dotenv()
-API_TOKEN = os.getenv("API_TOKEN")
+def lrclib_disponible():
+    """
+    Indica si lrcup está instalado (sin importarlo).
+    """
+    global _lrclib_disponible
+    if _lrclib_disponible is None:
+        _lrclib_disponible = importlib.util.find_spec("lrcup") is not None
+    return _lrclib_disponible
 
-# Configuración de logging
-LOG_FILE = "api_responses.log"
 
+def _api_token():
+    return os.getenv("API_TOKEN")
 
-def parse_lrc_lyrics(lrc_text):
+
+def _audd_api_url():
+    return os.getenv("AUDD_API_URL", AUDD_API_URL)
+
+
+def _audd_fragmento():
+    # Enviar a Audd.io solo un fragmento del audio en lugar del archivo completo
+    return os.getenv("AUDD_FRAGMENTO", "true").lower() in ("1", "true", "si", "sí", "yes")
+
+
+def _planificador(proveedor):
+    planificador = PLANIFICADORES.get(proveedor)
+    if planificador is None:
+        from http_clients import LRCLIB_API_URL, al_limitar
+
+        planificador = obtener_planificador(proveedor, **_PLANIFICACION_POR_DEFECTO[proveedor])
+        # Los 429 (con su Retry-After) pausan al proveedor que los envía
+        url = os.getenv("LRCLIB_API_URL", LRCLIB_API_URL) if proveedor == "lrclib" else _audd_api_url()
+        al_limitar(url, planificador.registrar_limite)
+    return planificador
+
+
+@contextlib.contextmanager
+def _turno(proveedor):
     """
-    Parsea texto LRC y lo convierte al formato esperado por el karaoke.
+    Espera turno para una petición al proveedor según la prioridad del
+    contexto (interactiva por defecto, de fondo en la precarga). Dentro de
+    la estrategia de proveedores la espera termina con SinTurno al agotarse
+    el plazo de la llamada, y el timeout del proveedor cuenta desde que se
+    consigue el turno.
     """
-    lines = []
-    for line in lrc_text.strip().split("\n"):
-        if not line.strip():
-            continue
-
-        # Buscar timestamp en formato [mm:ss.xx] o [mm:ss]
-        timestamp_match = re.match(r"\[(\d{2}):(\d{2})(?:\.(\d{2}))?\]", line)
-        if timestamp_match:
-            minutes = int(timestamp_match.group(1))
-            seconds = int(timestamp_match.group(2))
-            centiseconds = int(timestamp_match.group(3) or 0)
+    with _planificador(proveedor).turno(plazo=plazo_llamada()):
+        marcar_envio()
+        yield
 
-            # Convertir a segundos totales
-            total_seconds = minutes * 60 + seconds + centiseconds / 100.0
 
-            # Extraer el texto de la línea (después del timestamp)
-            text = line[timestamp_match.end() :].strip()
+def _clave_vuelo(*partes):
+    """
+    Clave para agrupar peticiones idénticas. Lleva la prioridad: la
+    petición corre con la prioridad y el plazo de quien la lanza, así que
+    una búsqueda interactiva no se une a una precarga de fondo.
+    """
+    return (prioridad_actual(),) + partes
 
-            if text:  # Solo agregar si hay texto
-                # Formatear timestamp como HH:MM:SS.fff
-                timestamp = f"00:{minutes:02d}:{seconds:02d}.{centiseconds:02d}0"
-                lines.append({"text": text, "timestamp": timestamp})
 
-    return lines
+def _proveedor(nombre):
+    proveedor = PROVEEDORES.get(nombre)
+    if proveedor is None:
+        with _config_lock:
+            if nombre not in PROVEEDORES:
+                PROVEEDORES[nombre] = Proveedor.desde_entorno(nombre, **_OPCIONES_PROVEEDOR[nombre])
+            proveedor = PROVEEDORES[nombre]
+    return proveedor
 
 
-def obtener_letra_sincronizada_lrclib(nombre_cancion, nombre_artista, duracion=None):
+def configurar_concurrencia_proveedores(lrclib=None, audd=None):
     """
-    Obtiene letras sincronizadas usando LRCLIB API.
+    Cambia el número máximo de peticiones simultáneas por proveedor.
     """
-    if not LRCLIB_AVAILABLE:
-        print("❌ LRCLIB no está disponible. Usando método alternativo.")
-        return None
+    if lrclib:
+        _planificador("lrclib").configurar_concurrencia(lrclib)
+    if audd:
+        _planificador("audd").configurar_concurrencia(audd)
 
-    try:
-        lrclib = LRCLib()
 
-        # Log de la consulta
-        request_data = {
-            "track": nombre_cancion,
-            "artist": nombre_artista,
-            "duration": duracion,
-        }
+def parse_lrc_lyrics(lrc_text):
+    """
+    Parsea texto LRC y lo convierte en un LyricsTimeline para el karaoke.
+    Las líneas con tiempos por palabra (LRC mejorado) los conservan.
+    """
+    with medir_etapa("lrc_parseo"):
+        return LyricsTimeline.desde_lineas(parse_lrc(lrc_text).lineas)
 
-        print(f"🔍 Buscando en la base de datos de LRCLIB...")
-        print(f"   📝 Canción: '{nombre_cancion}'")
-        print(f"   👤 Artista: {nombre_artista}")
 
-        # Buscar letras sincronizadas
-        if duracion:
-            cancion = lrclib.get(
-                track=nombre_cancion, artist=nombre_artista, duration=duracion
+def _elegir_resultado_lrclib(resultados, duracion=None, consulta=None):
+    """
+    Elige entre los resultados de búsqueda de LRCLIB el que tiene letra
+    sincronizada y mejor puntuación: parecido del título y del artista con
+    la consulta normalizada y cercanía a la duración, si se conoce. Los
+    resultados cuyo título no se parece al buscado se descartan.
+    """
+    if consulta is not None:
+        puntuados = []
+        for resultado in resultados:
+            puntuacion = puntuar_resultado(
+                consulta, resultado.trackName, resultado.artistName, resultado.duration, duracion
             )
-        else:
+            if puntuacion is not None:
+                puntuados.append((puntuacion, resultado))
+        # sorted es estable: a igual puntuación se respeta el orden de LRCLIB
+        resultados = [r for _, r in sorted(puntuados, key=lambda p: -p[0])]
+    sincronizados = [r for r in resultados if r.syncedLyrics]
+    if not sincronizados:
+        return resultados[0] if resultados else None
+    if not duracion or consulta is not None:
+        return sincronizados[0]
+    return min(sincronizados, key=lambda r: abs((r.duration or 0) - duracion))
+
+
+def _lrclib_exacta(lrclib, nombre_cancion, nombre_artista, duracion):
+    """
+    Coincidencia exacta en LRCLIB (/get) con la sesión del cliente.
+    Devuelve el Track o None si LRCLIB responde 404; los errores de red y
+    los demás códigos HTTP (429, 5xx...) se propagan. lrcup.get no sirve
+    aquí: no reconoce el 404 y falla al validar, igual que ante un error.
+    """
+    from lrcup.controller import Track
+
+    response = lrclib.session.get(
+        lrclib.api_url + "get",
+        params={
+            "track_name": nombre_cancion,
+            "artist_name": nombre_artista,
+            "duration": int(round(duracion)),
+        },
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return Track(**response.json())
+
+
+def _consultar_lrclib(lrclib, consulta, duracion):
+    """
+    Petición a LRCLIB con la consulta normalizada: coincidencia exacta por
+    duración y, si no la hay, búsqueda. Cada petición HTTP espera su propio
+    turno (y gasta su cuota). Devuelve el resultado elegido o None.
+    """
+    nombre_cancion, nombre_artista = consulta.titulo, consulta.artista
+    cancion = None
+    if duracion:
+        # Coincidencia exacta por duración: una sola fila, sin
+        # riesgo de elegir otra versión (en vivo, remix...)
+        with _turno("lrclib"), medir_etapa("lrclib_exacta"):
+            cancion = _lrclib_exacta(lrclib, nombre_cancion, nombre_artista, duracion)
+    if not (cancion and cancion.syncedLyrics):
+        with _turno("lrclib"), medir_etapa("lrclib_busqueda"):
             resultados = lrclib.search(track=nombre_cancion, artist=nombre_artista)
-            cancion = resultados[0] if resultados else None
-
-        if cancion and hasattr(cancion, "syncedLyrics") and cancion.syncedLyrics:
-            # Log de la respuesta exitosa
-            log_api_response(
-                endpoint="lrclib_search",
-                request_data=request_data,
-                response_data={"syncedLyrics": cancion.syncedLyrics, "found": True},
-                status="success",
-            )
+        cancion = _elegir_resultado_lrclib(resultados, duracion, consulta)
+    return cancion
 
-            print("🎉 ¡ENCONTRADO! Letras sincronizadas reales disponibles")
-            print("✅ Timestamps reales de la música")
-            print("✅ Sincronización perfecta garantizada")
-            print(f"📝 Respuesta guardada en el archivo de log: {LOG_FILE}")
 
-            # Parsear las letras LRC
-            return parse_lrc_lyrics(cancion.syncedLyrics), "LRCLIB"
-        else:
-            # Log de no resultados
-            log_api_response(
-                endpoint="lrclib_search",
-                request_data=request_data,
-                response_data={"found": False},
-                status="no_results",
-            )
+def _letra_lrclib(nombre_cancion, nombre_artista, duracion=None):
+    """
+    Consulta LRCLIB. Devuelve (letras, "LRCLIB") o (None, None) si no tiene
+    la canción; los errores se registran en el log y se propagan.
+    """
+    # Sin "(Remastered)", "feat. X"... y con los alias de artistas aplicados
+    consulta = normalizar_consulta(nombre_artista, nombre_cancion)
+
+    # Log de la consulta
+    request_data = {
+        "track": consulta.titulo,
+        "artist": consulta.artista,
+        "duration": duracion,
+    }
 
-            print("❌ No se encontraron letras sincronizadas en LRCLIB")
-            print("   💡 Esta canción no está en la base de datos de LRCLIB")
-            return None, None
+    print(f"🔍 Buscando en la base de datos de LRCLIB...")
+    print(f"   📝 Canción: '{consulta.titulo}'")
+    print(f"   👤 Artista: {consulta.artista}")
 
+    try:
+        from http_clients import obtener_cliente_lrclib
+
+        lrclib = obtener_cliente_lrclib()
+
+        # Buscar letras sincronizadas; las consultas idénticas simultáneas
+        # comparten una sola petición
+        cancion, compartida = _vuelos.hacer(
+            _clave_vuelo("lrclib", clave_metadatos(nombre_artista, nombre_cancion, duracion)),
+            _consultar_lrclib,
+            lrclib,
+            consulta,
+            duracion,
+        )
     except Exception as e:
         # Log del error
         log_api_response(
@@ -119,66 +288,114 @@ def obtener_letra_sincronizada_lrclib(nombre_cancion, nombre_artista, duracion=N
             response_data={"error": str(e)},
             status="error",
         )
+        raise
 
-        print(f"❌ Error al consultar LRCLIB: {e}")
-        return None, None
+    if compartida:
+        request_data["compartida"] = True
+        _compartidas.inc(proveedor="lrclib")
+        print("🔗 Respuesta compartida con una consulta idéntica en curso")
 
+    if cancion and hasattr(cancion, "syncedLyrics") and cancion.syncedLyrics:
+        # Log de la respuesta exitosa
+        log_api_response(
+            endpoint="lrclib_search",
+            request_data=request_data,
+            response_data={"syncedLyrics": cancion.syncedLyrics, "found": True},
+            status="success",
+        )
 
-def log_api_response(endpoint, request_data, response_data, status="success"):
+        print("🎉 ¡ENCONTRADO! Letras sincronizadas reales disponibles")
+        print("✅ Timestamps reales de la música")
+        print("✅ Sincronización perfecta garantizada")
+        print(f"📝 Respuesta guardada en el archivo de log: {obtener_registro().ruta}")
+
+        # Parsear las letras LRC
+        return parse_lrc_lyrics(cancion.syncedLyrics), "LRCLIB"
+
+    # Log de no resultados
+    log_api_response(
+        endpoint="lrclib_search",
+        request_data=request_data,
+        response_data={"found": False},
+        status="no_results",
+    )
+
+    print("❌ No se encontraron letras sincronizadas en LRCLIB")
+    print("   💡 Esta canción no está en la base de datos de LRCLIB")
+    return None, None
+
+
+def obtener_letra_sincronizada_lrclib(nombre_cancion, nombre_artista, duracion=None):
     """
-    Guarda la respuesta de la API en un archivo de log con timestamp.
+    Obtiene letras sincronizadas usando LRCLIB API.
     """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    log_entry = {
-        "timestamp": timestamp,
-        "endpoint": endpoint,
-        "request": request_data,
-        "response": response_data,
-        "status": status,
-    }
+    if not lrclib_disponible():
+        print("❌ LRCLIB no está disponible. Usando método alternativo.")
+        return None
 
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"\n{'='*80}\n")
-            f.write(f"TIMESTAMP: {timestamp}\n")
-            f.write(f"ENDPOINT: {endpoint}\n")
-            f.write(f"STATUS: {status}\n")
-            f.write(
-                f"REQUEST: {json.dumps(request_data, indent=2, ensure_ascii=False)}\n"
-            )
-            f.write(
-                f"RESPONSE: {json.dumps(response_data, indent=2, ensure_ascii=False)}\n"
-            )
-            f.write(f"{'='*80}\n")
+        return _letra_lrclib(nombre_cancion, nombre_artista, duracion)
     except Exception as e:
-        print(f"Error al escribir en el log: {e}")
+        print(f"❌ Error al consultar LRCLIB: {e}")
+        return None, None
+
+
+def log_api_response(endpoint, request_data, response_data, status="success"):
+    """
+    Encola la respuesta de la API en el log JSONL (una línea por registro).
+    La escritura ocurre en segundo plano; los secretos como el api_token
+    se ocultan y las letras completas se recortan antes de escribir.
+    """
+    obtener_registro().registrar(
+        {
+            "timestamp": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "endpoint": endpoint,
+            "status": status,
+            "request": request_data,
+            "response": response_data,
+        }
+    )
 
 
 def crear_timestamps_inteligentes(lines):
     """
     Crea timestamps inteligentes basados en el contenido de las líneas.
     Ajusta los tiempos según la longitud, tipo de línea y patrones musicales.
+    Devuelve un LyricsTimeline.
     """
-    timestamps = []
-    tiempo_actual = 0
+    inicios = array("d")
+    tiempo_actual = 0.0
 
-    for i, line in enumerate(lines):
-        # Calcular tiempo basado en el contenido de la línea
-        tiempo_linea = calcular_tiempo_linea(line, i, lines)
+    with medir_etapa("timestamps_simulados"):
+        for i, line in enumerate(lines):
+            inicios.append(tiempo_actual)
 
-        # Crear timestamp en formato HH:MM:SS.fff
-        minutos = int(tiempo_actual // 60)
-        segundos = int(tiempo_actual % 60)
-        milisegundos = int((tiempo_actual % 1) * 1000)
+            # Avanzar el tiempo según el contenido de la línea
+            tiempo_actual += calcular_tiempo_linea(line, i, lines)
 
-        timestamp = f"00:{minutos:02d}:{segundos:02d}.{milisegundos:03d}"
-        timestamps.append({"text": line, "timestamp": timestamp})
+    return LyricsTimeline(inicios, lines)
 
-        # Avanzar el tiempo para la siguiente línea
-        tiempo_actual += tiempo_linea
 
-    return timestamps
+def crear_timestamps_alineados(lines, ruta_archivo_audio):
+    """
+    Timestamps para letras en texto plano alineados con las frases vocales
+    detectadas en el archivo de audio local (ver lyrics_alignment). Si no
+    se puede alinear (sin NumPy, formato sin decodificador o audio sin
+    frases claras) se usan los timestamps simulados.
+    """
+    try:
+        # NumPy solo se importa cuando hay algo que alinear
+        from lyrics_alignment import alinear_lineas
+
+        with medir_etapa("alineacion"):
+            letras = alinear_lineas(ruta_archivo_audio, lines)
+    except Exception as e:
+        print(f"⚠️ No se pudo alinear la letra con el audio: {e}")
+        letras = None
+    if letras is None:
+        return crear_timestamps_inteligentes(lines)
+    print("🎯 Letra alineada con las frases vocales del audio")
+    return letras
 
 
 def calcular_tiempo_linea(line, index, all_lines):
@@ -219,28 +436,57 @@ def calcular_tiempo_linea(line, index, all_lines):
         return tiempo_base + tiempo_extra
 
 
+def _buscar_letra_audd(params):
+    from http_clients import obtener_sesion
+
+    with _turno("audd"), medir_etapa("audd_busqueda"):
+        response = obtener_sesion().get(urljoin(_audd_api_url(), "findLyrics/"), params=params)
+    return _respuesta_audd(response)
+
+
+def _respuesta_audd(response):
+    """
+    Comprueba la respuesta de Audd.io y devuelve su JSON. Si avisa de que
+    se alcanzó el límite del api_token, el día queda marcado como agotado
+    para no seguir gastando peticiones.
+    """
+    response.raise_for_status()
+    datos = response.json()
+    error = datos.get("error") if isinstance(datos, dict) else None
+    if isinstance(error, dict) and error.get("error_code") in _ERRORES_LIMITE_AUDD:
+        _planificador("audd").marcar_cuota_agotada()
+        raise CuotaAgotada(f"audd: {error.get('error_message') or 'límite alcanzado'}")
+    return datos
+
+
 def obtener_letra(nombre_cancion: str, nombre_artista: str):
     """
     Busca una canción y obtiene su letra usando la API de Audd.io.
     """
-    if not API_TOKEN:
+    if not _api_token():
         print("Error: No se encontró el API_TOKEN. Revisa tu archivo .env.")
         return
 
+    from requests.exceptions import RequestException
+
     print(f"Buscando '{nombre_cancion}' de {nombre_artista}...")
 
+    consulta = normalizar_consulta(nombre_artista, nombre_cancion)
     params = {
-        "q": f"{nombre_artista} {nombre_cancion}",
+        "q": f"{consulta.artista} {consulta.titulo}",
         # 'return': 'lyrics' ya no es necesario con este endpoint,
         # pero no hace daño dejarlo.
-        "api_token": API_TOKEN,
+        "api_token": _api_token(),
     }
 
     try:
-        response = requests.get("https://api.audd.io/findLyrics/", params=params)
-
-        response.raise_for_status()
-        datos = response.json()
+        datos, compartida = _vuelos.hacer(
+            _clave_vuelo("findLyrics", clave_metadatos(nombre_artista, nombre_cancion)),
+            _buscar_letra_audd,
+            params,
+        )
+        if compartida:
+            _compartidas.inc(proveedor="findLyrics")
 
         # Log de la respuesta de la API
         log_api_response(
@@ -249,7 +495,7 @@ def obtener_letra(nombre_cancion: str, nombre_artista: str):
             response_data=datos,
             status="success" if datos.get("status") == "success" else "no_results",
         )
-        print(f"📝 Respuesta guardada en el archivo de log: {LOG_FILE}")
+        print(f"📝 Respuesta guardada en el archivo de log: {obtener_registro().ruta}")
 
         # El formato de respuesta de findLyrics es un poco diferente
         if datos.get("status") == "success" and datos.get("result"):
@@ -262,11 +508,14 @@ def obtener_letra(nombre_cancion: str, nombre_artista: str):
             print("-" * 25)
             print(resultado["lyrics"])  # La letra viene directamente en 'lyrics'
 
+            # Queda disponible para búsquedas sin conexión
+            _indexar_letra(resultado["artist"], resultado["title"], resultado["lyrics"], "AUDD")
+
         else:
             print("No se encontró ninguna canción que coincida en los resultados.")
             print("Respuesta completa de la API:", datos)
 
-    except requests.exceptions.RequestException as e:
+    except RequestException as e:
         print(f"Error de conexión: {e}")
         # Log del error
         log_api_response(
@@ -286,86 +535,323 @@ def obtener_letra(nombre_cancion: str, nombre_artista: str):
         )
 
 
+def buscar_letra_local(texto: str, nombre_artista: str = None, limite: int = 5):
+    """
+    Busca en las letras ya descargadas (sin conexión) por título, artista o
+    fragmento de la letra. Muestra los resultados y la letra del mejor.
+    Devuelve True si hubo algún resultado.
+    """
+    try:
+        indice = obtener_indice_letras()
+        resultados = indice.buscar(texto, artista=nombre_artista, limite=limite)
+    except Exception as e:
+        print(f"⚠️ No se pudo consultar el índice de búsqueda local: {e}")
+        return False
+    if not resultados:
+        return False
+
+    print(f"\n--- {len(resultados)} resultado(s) en las letras descargadas ---")
+    for n, resultado in enumerate(resultados, start=1):
+        print(f"{n}. {resultado.titulo} - {resultado.artista} ({resultado.fuente})")
+        print(f"   {resultado.fragmento}")
+
+    artista, titulo, letra = indice.letra(resultados[0].clave)
+    print(f"\nCanción: {titulo}")
+    print(f"Artista: {artista}")
+    print("-" * 25)
+    print(letra)
+    return True
+
+
+def _guardar_en_cache(pista, claves, letras, fuente):
+    """
+    Guarda el resultado en la caché local (y las letras encontradas en el
+    índice de búsqueda sin conexión) y lo devuelve tal cual.
+    """
+    try:
+        if letras:
+            obtener_cache().guardar(claves, letras, fuente)
+        else:
+            obtener_cache().guardar_negativo(claves)
+    except Exception as e:
+        print(f"⚠️ No se pudo escribir en la caché local: {e}")
+    if letras:
+        _indexar_letra(pista.artista, pista.titulo, letras, fuente)
+        if pista.ruta and escribir_al_resolver():
+            try:
+                escribir_sidecar(pista.ruta, letras, fuente, pista.artista, pista.titulo, pista.duracion)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar el .lrc junto al audio: {e}")
+    return letras, fuente
+
+
+def _indexar_letra(artista, titulo, letras, fuente):
+    try:
+        obtener_indice_letras().indexar(artista, titulo, letras, fuente)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el índice de búsqueda local: {e}")
+
+
+def _letra_audd_texto(nombre_cancion, nombre_artista):
+    """
+    Busca la letra por artista y título en Audd.io (findLyrics). Devuelve
+    (letras con timestamps simulados, "AUDD") o (None, None); los errores
+    se registran y se propagan.
+    """
+    print("🎤 OPCIÓN 2: Audd.io (Búsqueda por texto)")
+    print("   ⚠️ Timestamps simulados inteligentes")
+    print("-" * 40)
+    consulta = normalizar_consulta(nombre_artista, nombre_cancion)
+    params = {"q": f"{consulta.artista} {consulta.titulo}", "api_token": _api_token()}
+    try:
+        datos, compartida = _vuelos.hacer(
+            _clave_vuelo("findLyrics", clave_metadatos(nombre_artista, nombre_cancion)),
+            _buscar_letra_audd,
+            params,
+        )
+    except Exception as e:
+        log_api_response(
+            endpoint="findLyrics",
+            request_data=params,
+            response_data={"error": str(e)},
+            status="error",
+        )
+        raise
+    if compartida:
+        _compartidas.inc(proveedor="findLyrics")
+
+    log_api_response(
+        endpoint="findLyrics",
+        request_data=params,
+        response_data=datos,
+        status="success" if datos.get("status") == "success" else "no_results",
+    )
+    if datos.get("status") == "success" and datos.get("result"):
+        lyrics_text = datos["result"][0].get("lyrics") or ""
+        lines = [line.strip() for line in lyrics_text.split("\n") if line.strip()]
+        if lines:
+            return crear_timestamps_inteligentes(lines), "AUDD"
+    return None, None
+
+
+def _reconocer_audd(data, fragmento):
+    """
+    Envía el fragmento de audio a Audd.io y devuelve la respuesta JSON.
+    """
+    from http_clients import obtener_sesion
+
+    cuerpo = CuerpoMultipart(data, "file", fragmento)
+    with _turno("audd"), medir_etapa("audd_reconocimiento"):
+        response = obtener_sesion().post(
+            _audd_api_url(), data=cuerpo, headers={"Content-Type": cuerpo.content_type}
+        )
+    _bytes_audd.inc(fragmento.tamano)
+    return _respuesta_audd(response)
+
+
 # --- Función para obtener letra sincronizada (reconocimiento de audio) ---
-def obtener_letra_sincronizada(ruta_archivo_audio: str):
+def obtener_letra_sincronizada(ruta_archivo_audio: str, pista=None, estricto=False):
     """
     Obtiene letras sincronizadas usando LRCLIB como primera opción,
     y Audd.io como respaldo.
+
+    `pista` (PistaBiblioteca) evita volver a leer etiquetas y duración
+    cuando el archivo ya está en el índice de la biblioteca. Con
+    `estricto`, si ningún proveedor pudo responder se lanza
+    ProveedoresNoDisponibles en lugar de devolver (None, None).
     """
-    # Extraer nombre del archivo sin extensión para usar como nombre de canción
-    nombre_archivo = os.path.basename(ruta_archivo_audio)
-    nombre_sin_extension = os.path.splitext(nombre_archivo)[0]
-
-    # Intentar extraer artista y canción del nombre del archivo
-    # Formato esperado: "Artista - Canción.mp3" o "Canción - Artista.mp3"
-    if " - " in nombre_sin_extension:
-        partes = nombre_sin_extension.split(" - ")
-        if len(partes) >= 2:
-            # Tomar la última parte como artista (más común)
-            artista = partes[-1].strip()
-            cancion = " - ".join(partes[:-1]).strip()
-        else:
-            artista = partes[0].strip()
-            cancion = partes[1].strip()
-    else:
-        # Si no hay separador, usar el nombre completo como canción
-        artista = "Unknown"
-        cancion = nombre_sin_extension
+    with medir_etapa("total"):
+        letras, fuente = _resolver_letra_sincronizada(ruta_archivo_audio, pista, estricto)
+    _resoluciones.inc(fuente=fuente or "sin_letra")
+    return letras, fuente
+
+
+def _resolver_letra_sincronizada(ruta_archivo_audio, pista, estricto):
+    # Un .lrc junto al audio evita las etiquetas, la caché y la red
+    if sidecar_activo():
+        entrada = leer_sidecar(ruta_archivo_audio)
+        if entrada is not None:
+            print(f"📄 Letra leída de '{ruta_sidecar(ruta_archivo_audio)}' (fuente: {entrada.fuente})")
+            print("=" * 60)
+            return entrada.letras, entrada.fuente
+
+    # Artista, título y duración desde las etiquetas del archivo (o su nombre)
+    if pista is None:
+        with medir_etapa("lectura_pista"):
+            pista = leer_pista(ruta_archivo_audio)
+    artista, cancion, duracion = pista.artista, pista.titulo, pista.duracion
 
     print(f"🎵 Buscando letras para: '{cancion}' de {artista}")
+    if duracion:
+        minutos, segundos = divmod(int(round(duracion)), 60)
+        print(f"⏱️ Duración: {minutos}:{segundos:02d}")
     print("=" * 60)
 
-    # Primera opción: Intentar con LRCLIB
-    if LRCLIB_AVAILABLE:
-        print("🌐 OPCIÓN 1: LRCLIB (Letras sincronizadas reales)")
-        print("   ✅ Timestamps reales de la música")
-        print("   ✅ Sincronización perfecta")
-        print("   ✅ Formato LRC estándar")
-        print("-" * 40)
-        letras_lrclib, fuente = obtener_letra_sincronizada_lrclib(cancion, artista)
-        if letras_lrclib:
-            print("🎉 ¡ÉXITO! Usando letras sincronizadas reales de LRCLIB")
+    # Consultar primero la caché local (por huella del archivo y por metadatos)
+    claves_cache = [clave_metadatos(artista, cancion, duracion)]
+    try:
+        claves_cache.insert(0, huella_archivo(ruta_archivo_audio))
+    except OSError:
+        pass
+
+    # Proveedores en orden de preferencia; la estrategia (secuencial,
+    # cobertura o carrera) decide cuándo se lanza cada uno
+    tareas = []
+    if lrclib_disponible():
+        tareas.append((_proveedor("lrclib"), _opcion_lrclib, (cancion, artista, duracion)))
+    if _api_token():
+        tareas.append((_proveedor("audd"), _opcion_audd, (ruta_archivo_audio, claves_cache[0])))
+    return _resolver_con_proveedores(pista, claves_cache, tareas, estricto)
+
+
+def obtener_letra_sincronizada_metadatos(nombre_artista, nombre_cancion, duracion=None, estricto=False):
+    """
+    Obtiene la letra de una canción sin archivo de audio, solo por artista
+    y título (y la duración, si se conoce, para la coincidencia exacta).
+    Usa LRCLIB y, como respaldo, la búsqueda de texto de Audd.io con
+    timestamps simulados. Devuelve (letras, fuente) como
+    obtener_letra_sincronizada (y `estricto` funciona igual).
+    """
+    pista = PistaBiblioteca(None, nombre_artista, nombre_cancion, None, duracion)
+    with medir_etapa("total"):
+        print(f"🎵 Buscando letras para: '{nombre_cancion}' de {nombre_artista}")
+        print("=" * 60)
+        tareas = []
+        if lrclib_disponible():
+            tareas.append(
+                (_proveedor("lrclib"), _opcion_lrclib, (nombre_cancion, nombre_artista, duracion))
+            )
+        if _api_token():
+            tareas.append((_proveedor("audd"), _letra_audd_texto, (nombre_cancion, nombre_artista)))
+        letras, fuente = _resolver_con_proveedores(
+            pista, [clave_metadatos(nombre_artista, nombre_cancion, duracion)], tareas, estricto
+        )
+    _resoluciones.inc(fuente=fuente or "sin_letra")
+    return letras, fuente
+
+
+def _resolver_con_proveedores(pista, claves_cache, tareas, estricto=False):
+    """
+    Consulta el paquete de letras (si hay uno configurado), la caché local
+    y, si no está la canción, los proveedores de `tareas`; guarda el
+    resultado en la caché. Con `estricto`, lanza ProveedoresNoDisponibles
+    si ningún proveedor pudo responder.
+    """
+    try:
+        entrada = buscar_en_paquete(pista.artista, pista.titulo, pista.duracion)
+    except Exception as e:
+        print(f"⚠️ No se pudo consultar el paquete de letras: {e}")
+        entrada = None
+    if entrada is not None:
+        print(f"📦 Letras recuperadas del paquete de letras (fuente: {entrada.fuente})")
+        print("=" * 60)
+        return entrada.letras, entrada.fuente
+
+    try:
+        entrada = obtener_cache().buscar(claves_cache)
+    except Exception as e:
+        print(f"⚠️ No se pudo consultar la caché local: {e}")
+        entrada = None
+
+    if entrada is not None:
+        if entrada.letras:
+            print(f"⚡ Letras recuperadas de la caché local (fuente: {entrada.fuente})")
             print("=" * 60)
-            return letras_lrclib, fuente
-        print("❌ LRCLIB no encontró letras para esta canción")
-        print("-" * 40)
-    else:
+            return entrada.letras, entrada.fuente
+        print("⚡ La caché local indica que no hay letras para esta canción")
+        print("=" * 60)
+        return None, None
+
+    if not lrclib_disponible():
         print("⚠️ LRCLIB no disponible - Saltando a Audd.io")
         print("-" * 40)
+    if not tareas:
+        print("❌ Error: No se encontró el API_TOKEN. Revisa tu archivo .env.")
+        return None, None
 
-    # Segunda opción: Audd.io (reconocimiento de audio)
-    if not API_TOKEN:
+    resultado = obtener_estrategia().resolver(tareas)
+    if resultado.letras:
+        print(f"🎉 ¡ÉXITO! Usando letras de {resultado.fuente}")
+        print("=" * 60)
+        return _guardar_en_cache(pista, claves_cache, resultado.letras, resultado.fuente)
+
+    if estricto and not resultado.definitivo:
+        print("❌ Ningún proveedor pudo responder")
+        print("=" * 60)
+        raise ProveedoresNoDisponibles("ningún proveedor pudo responder (red, timeout o circuito abierto)")
+    if not _api_token():
         print("❌ Error: No se encontró el API_TOKEN. Revisa tu archivo .env.")
-        return None
+        return None, None
+    print("❌ No se encontró letra sincronizada para esta canción.")
+    print("=" * 60)
+    if resultado.definitivo:
+        # Ningún proveedor tiene la canción: se guarda con TTL corto
+        return _guardar_en_cache(pista, claves_cache, None, None)
+    return None, None
 
+
+def _opcion_lrclib(cancion, artista, duracion):
+    print("🌐 OPCIÓN 1: LRCLIB (Letras sincronizadas reales)")
+    print("   ✅ Timestamps reales de la música")
+    print("   ✅ Sincronización perfecta")
+    print("   ✅ Formato LRC estándar")
+    print("-" * 40)
+    return _letra_lrclib(cancion, artista, duracion)
+
+
+def _opcion_audd(ruta_archivo_audio, clave_vuelo):
     print("🎤 OPCIÓN 2: Audd.io (Reconocimiento de audio)")
     print("   ⚠️ Timestamps simulados inteligentes")
     print("   ⚠️ Sincronización aproximada")
     print("   ⚠️ Basado en análisis del contenido")
     print("-" * 40)
+    return _letra_audd(ruta_archivo_audio, clave_vuelo)
+
+
+def _letra_audd(ruta_archivo_audio, clave_vuelo):
+    """
+    Reconoce el audio con Audd.io. Devuelve (letras, "AUDD") o (None, None)
+    si no se reconoce la canción; los errores se registran y se propagan.
+    """
     print(f"🎤 Enviando '{ruta_archivo_audio}' para reconocimiento...")
 
     data = {
         "return": "lyrics",
-        "api_token": API_TOKEN,
+        "api_token": _api_token(),
     }
 
     try:
-        with open(ruta_archivo_audio, "rb") as f:  # Abrimos el archivo en modo binario
-            files = {"file": f}
-            response = requests.post("https://api.audd.io/", data=data, files=files)
-
-        response.raise_for_status()
-        datos = response.json()
+        # Enviar solo un fragmento corto cuando el formato lo permite;
+        # en cualquier caso el cuerpo se transmite en bloques
+        with medir_etapa("audd_fragmento"):
+            fragmento = extraer_fragmento(ruta_archivo_audio) if _audd_fragmento() else None
+        if fragmento is not None:
+            print(
+                f"✂️ Enviando fragmento de {fragmento.duracion:.0f}s desde el segundo "
+                f"{fragmento.inicio:.0f} ({fragmento.tamano / 1024:.0f} KB)"
+            )
+        else:
+            fragmento = Fragmento.archivo_completo(ruta_archivo_audio)
+        # Un mismo archivo pedido a la vez desde varios hilos se envía una vez
+        datos, compartida = _vuelos.hacer(
+            _clave_vuelo("audd", clave_vuelo), _reconocer_audd, data, fragmento
+        )
+        if compartida:
+            _compartidas.inc(proveedor="audd")
+            print("🔗 Respuesta compartida con un reconocimiento idéntico en curso")
 
         # Log de la respuesta de la API
         log_api_response(
             endpoint="recognize_audio",
-            request_data={"file": ruta_archivo_audio, "return": "lyrics"},
+            request_data={
+                "file": ruta_archivo_audio,
+                "return": "lyrics",
+                "bytes_enviados": fragmento.tamano,
+            },
             response_data=datos,
             status="success" if datos.get("status") == "success" else "no_results",
         )
-        print(f"📝 Respuesta guardada en el archivo de log: {LOG_FILE}")
+        print(f"📝 Respuesta guardada en el archivo de log: {obtener_registro().ruta}")
 
         print("Respuesta completa de la API:")
         print(datos)
@@ -388,11 +874,11 @@ def obtener_letra_sincronizada(ruta_archivo_audio: str):
                     lines = [
                         line.strip() for line in lyrics_data.split("\n") if line.strip()
                     ]
-                    # Crear timestamps inteligentes basados en el contenido
-                    return crear_timestamps_inteligentes(lines), "AUDD"
+                    # Alinear con el audio local (o simular los timestamps)
+                    return crear_timestamps_alineados(lines, ruta_archivo_audio), "AUDD"
                 elif isinstance(lyrics_data, list):
                     print("Formato: lista de diccionarios")
-                    return lyrics_data, "AUDD"
+                    return LyricsTimeline.desde_dicts(lyrics_data), "AUDD"
                 elif isinstance(lyrics_data, dict) and "lyrics" in lyrics_data:
                     print("Formato: diccionario con clave 'lyrics'")
                     lyrics_text = lyrics_data["lyrics"]
@@ -408,14 +894,14 @@ def obtener_letra_sincronizada(ruta_archivo_audio: str):
                             for line in lyrics_text.split("\n")
                             if line.strip()
                         ]
-                        # Crear timestamps inteligentes basados en el contenido
-                        return crear_timestamps_inteligentes(lines), "AUDD"
+                        # Alinear con el audio local (o simular los timestamps)
+                        return crear_timestamps_alineados(lines, ruta_archivo_audio), "AUDD"
                     else:
-                        return lyrics_text, "AUDD"
+                        return LyricsTimeline.desde_dicts(lyrics_text), "AUDD"
                 else:
                     print("Formato de letra no reconocido:", type(lyrics_data))
                     print("Contenido:", lyrics_data)
-                    return None, None
+                    raise ValueError(f"Formato de letra no reconocido: {type(lyrics_data)}")
 
         print("❌ No se encontró letra sincronizada para esta canción.")
         print("Respuesta de la API:", datos)
@@ -432,7 +918,7 @@ def obtener_letra_sincronizada(ruta_archivo_audio: str):
             response_data={"error": f"File not found: {ruta_archivo_audio}"},
             status="file_not_found",
         )
-        return None, None
+        raise
     except Exception as e:
         print(f"❌ Ocurrió un error al procesar el audio: {e}")
         # Log del error
@@ -442,4 +928,4 @@ def obtener_letra_sincronizada(ruta_archivo_audio: str):
             response_data={"error": str(e)},
             status="processing_error",
         )
-        return None, None
+        raise
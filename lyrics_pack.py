@@ -0,0 +1,561 @@
+"""
+Paquete de letras: un solo archivo binario con miles de letras
+sincronizadas, pensado para kioscos sin conexión.
+
+    python lyrics_pack.py construir letras.slpk                  # desde la caché local
+    python lyrics_pack.py construir letras.slpk --biblioteca sounds --lrc carpeta_lrc
+    python lyrics_pack.py fusionar todo.slpk a.slpk b.slpk       # el último gana
+    python lyrics_pack.py info letras.slpk
+    python lyrics_pack.py buscar letras.slpk --artista X --titulo Y [--duracion S]
+
+Formato (little-endian):
+
+    cabecera   32 bytes: "SLPK", versión u16, reservado u16, canciones u32,
+               desplazamiento del índice u64
+    bloques    uno por canción (alineados a 8 bytes):
+               líneas u32, palabras u32, bytes del texto comprimido u32,
+               inicios de línea en ms como diferencias u32[líneas],
+               [palabras por línea u32[líneas],
+                inicio de cada palabra respecto a su línea en ms i32[palabras]],
+               texto comprimido con zlib: "fuente␟artista␟título", las líneas
+               separadas por saltos de línea y, si hay, "␞" y las palabras
+               de cada línea separadas por ␟
+    índice     claves u64[canciones] ordenadas (blake2b de la clave canónica
+               artista|título) y, en el mismo orden, entradas de 24 bytes:
+               duración en ms u32 (0 = desconocida), líneas u32,
+               desplazamiento u64, tamaño u32, reservado u32
+
+El paquete se lee con mmap: abrirlo solo lee la cabecera, buscar es una
+búsqueda binaria sobre las claves del propio archivo y cada letra se
+descomprime al pedirla, así que el arranque no depende del número de
+canciones y apenas ocupa memoria residente.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from lyrics_cache import EntradaCache
+from metrics import medir_etapa
+from query_normalizer import clave_consulta
+from timeline import LyricsTimeline
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+PACK_FILE = ""  # Paquete que se consulta antes que la caché ("" = ninguno)
+TOLERANCIA_DURACION = 2.0  # Segundos de diferencia admitidos al elegir la versión por duración
+NIVEL_COMPRESION = 9
+
+EXTENSION = ".slpk"
+MAGIA = b"SLPK"
+VERSION = 1
+_CABECERA = struct.Struct("<4sHHIQ12x")
+_ENTRADA = struct.Struct("<IIQII")
+_BLOQUE = struct.Struct("<III")
+_CAMPO = "\x1f"  # Separador de campos (unidad)
+_SECCION = "\x1e"  # Separador entre las líneas y las palabras (registro)
+_PROHIBIDOS = str.maketrans({"\n": " ", "\r": " ", _CAMPO: " ", _SECCION: " "})
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def clave_paquete(artista, titulo):
+    """
+    Clave de 64 bits de una canción: blake2b de su clave canónica (como las
+    claves de la caché, sin la duración).
+    """
+    clave = clave_consulta(artista, titulo).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(clave, digest_size=8).digest(), "little")
+
+
+def _milisegundos(segundos):
+    return max(int(round(segundos * 1000)), 0) if segundos else 0
+
+
+def _a_bytes(valores):
+    if not _LITTLE_ENDIAN:
+        valores = array(valores.typecode, valores)
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def _enteros(vista, codigo):
+    """
+    Enteros little-endian del paquete: en máquinas little-endian es una
+    vista sobre el propio mmap, sin copiar.
+    """
+    if _LITTLE_ENDIAN:
+        return vista.cast(codigo)
+    valores = array(codigo, vista.tobytes())
+    valores.byteswap()
+    return valores
+
+
+def codificar_bloque(letras, fuente, artista=None, titulo=None):
+    """
+    Serializa una letra (LyricsTimeline) como bloque del paquete.
+    """
+    inicios = [_milisegundos(inicio) for inicio in letras.inicios]
+    deltas = array("I", (b - a for a, b in zip([0] + inicios, inicios)))
+    cuentas = array("I")
+    deltas_palabras = array("i")
+    textos_palabras = []
+    if letras.palabras is not None:
+        for inicio, palabras in zip(inicios, letras.palabras):
+            cuentas.append(len(palabras))
+            deltas_palabras.extend(_milisegundos(t) - inicio for t, _ in palabras)
+            textos_palabras.append(_CAMPO.join(p.translate(_PROHIBIDOS) for _, p in palabras))
+
+    partes = [_CAMPO.join(str(c or "").translate(_PROHIBIDOS) for c in (fuente, artista, titulo))]
+    partes.extend(texto.translate(_PROHIBIDOS) for texto in letras.textos)
+    texto = "\n".join(partes)
+    if deltas_palabras:
+        texto += _SECCION + "\n".join(textos_palabras)
+    comprimido = zlib.compress(texto.encode("utf-8"), NIVEL_COMPRESION)
+    cabecera = _BLOQUE.pack(len(deltas), len(deltas_palabras), len(comprimido))
+    if not deltas_palabras:
+        return b"".join((cabecera, _a_bytes(deltas), comprimido))
+    return b"".join((cabecera, _a_bytes(deltas), _a_bytes(cuentas), _a_bytes(deltas_palabras), comprimido))
+
+
+def decodificar_bloque(vista):
+    """
+    Reconstruye (letras, fuente, artista, titulo) desde un bloque. Los
+    tiempos se leen directamente del mmap; solo se copia el texto al
+    descomprimirlo.
+    """
+    lineas, n_palabras, comprimidos = _BLOQUE.unpack_from(vista, 0)
+    pos = _BLOQUE.size
+    with _enteros(vista[pos:pos + 4 * lineas], "I") as deltas:
+        inicios_ms = list(accumulate(deltas))
+    pos += 4 * lineas
+    cuentas = deltas_palabras = ()
+    if n_palabras:
+        with _enteros(vista[pos:pos + 4 * lineas], "I") as valores:
+            cuentas = valores.tolist()
+        pos += 4 * lineas
+        with _enteros(vista[pos:pos + 4 * n_palabras], "i") as valores:
+            deltas_palabras = valores.tolist()
+        pos += 4 * n_palabras
+    texto = zlib.decompress(vista[pos:pos + comprimidos]).decode("utf-8")
+
+    texto, _, texto_palabras = texto.partition(_SECCION)
+    partes = texto.split("\n")
+    fuente, artista, titulo = (partes[0].split(_CAMPO) + ["", ""])[:3]
+    palabras = None
+    if n_palabras:
+        palabras = []
+        n = 0
+        for inicio, cuenta, textos in zip(inicios_ms, cuentas, texto_palabras.split("\n")):
+            textos = textos.split(_CAMPO) if cuenta else ()
+            palabras.append([
+                ((inicio + delta) / 1000.0, palabra)
+                for delta, palabra in zip(deltas_palabras[n:n + cuenta], textos)
+            ])
+            n += cuenta
+    letras = LyricsTimeline(array("d", (ms / 1000.0 for ms in inicios_ms)), partes[1:lineas + 1], palabras)
+    return letras, fuente or None, artista or None, titulo or None
+
+
+class PaqueteLetras:
+    """
+    Paquete de letras abierto con mmap (solo lectura). Abrirlo no carga
+    ninguna canción: las claves se buscan sobre el propio archivo y cada
+    letra se decodifica al pedirla.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magia, version, _, canciones, indice = _CABECERA.unpack_from(self._mmap, 0)
+        except struct.error:
+            magia = version = None
+        if magia != MAGIA:
+            self._mmap.close()
+            raise ValueError(f"'{ruta}' no es un paquete de letras")
+        if version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"'{ruta}' tiene la versión {version} del formato (se admite la {VERSION})")
+        self.canciones = canciones
+        self._vista = memoryview(self._mmap)
+        self._claves = _enteros(self._vista[indice:indice + 8 * canciones], "Q")
+        self._entradas = indice + 8 * canciones
+
+    def __len__(self):
+        return self.canciones
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        if isinstance(self._claves, memoryview):
+            self._claves.release()
+        self._vista.release()
+        self._mmap.close()
+
+    def entrada(self, indice):
+        """
+        (clave, duración en ms, líneas, desplazamiento, tamaño) de la
+        canción en la posición `indice` del índice.
+        """
+        duracion, lineas, desplazamiento, tamano, _ = _ENTRADA.unpack_from(
+            self._mmap, self._entradas + indice * _ENTRADA.size
+        )
+        return self._claves[indice], duracion, lineas, desplazamiento, tamano
+
+    def bloque(self, desplazamiento, tamano):
+        return self._vista[desplazamiento:desplazamiento + tamano]
+
+    def leer(self, indice):
+        """
+        Decodifica la canción en la posición `indice`: (letras, fuente,
+        artista, titulo).
+        """
+        _, _, _, desplazamiento, tamano = self.entrada(indice)
+        with self.bloque(desplazamiento, tamano) as vista:
+            return decodificar_bloque(vista)
+
+    def _candidatos(self, clave):
+        indice = bisect_left(self._claves, clave)
+        while indice < self.canciones and self._claves[indice] == clave:
+            yield indice
+            indice += 1
+
+    def buscar(self, artista, titulo, duracion=None):
+        """
+        Letra de la canción como EntradaCache (letras, fuente), o None si
+        no está. Con duración se elige la versión más cercana (hasta
+        TOLERANCIA_DURACION segundos de diferencia) o, si no la hay, una
+        sin duración conocida.
+        """
+        with medir_etapa("paquete"):
+            candidatos = [self.entrada(i) for i in self._candidatos(clave_paquete(artista, titulo))]
+            elegida = _elegir_version(candidatos, duracion)
+            if elegida is None:
+                return None
+            with self.bloque(elegida[3], elegida[4]) as vista:
+                letras, fuente, artista_bloque, titulo_bloque = decodificar_bloque(vista)
+        # Dos canciones con la misma clave de 64 bits son improbables, pero posibles
+        if clave_consulta(artista_bloque, titulo_bloque) != clave_consulta(artista, titulo):
+            return None
+        return EntradaCache(letras, fuente)
+
+
+def _elegir_version(candidatos, duracion):
+    sin_duracion = [c for c in candidatos if not c[1]]
+    if duracion:
+        objetivo = duracion * 1000
+        cercana = min((c for c in candidatos if c[1]), key=lambda c: abs(c[1] - objetivo), default=None)
+        if cercana is not None and abs(cercana[1] - objetivo) <= TOLERANCIA_DURACION * 1000:
+            return cercana
+        return sin_duracion[0] if sin_duracion else None
+    if sin_duracion:
+        return sin_duracion[0]
+    return candidatos[0] if candidatos else None
+
+
+class ConstructorPaquete:
+    """
+    Escribe un paquete nuevo. Los bloques se añaden en orden de llegada y
+    el índice, ya ordenado, se escribe al cerrar. Se escribe en un archivo
+    temporal que reemplaza al destino de forma atómica, así un kiosco nunca
+    abre un paquete a medias. Si una canción (con la misma duración) ya
+    está en el paquete, se conserva la primera.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._temporal = f"{ruta}.{os.getpid()}.tmp"
+        self._archivo = open(self._temporal, "wb")
+        self._archivo.write(bytes(_CABECERA.size))
+        self._entradas = {}  # (clave, duración en ms) -> (líneas, desplazamiento, tamaño)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave_duracion):
+        return clave_duracion in self._entradas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+
+    def agregar(self, artista, titulo, duracion, letras, fuente):
+        """
+        Añade una letra. Devuelve False si no tiene líneas o ya estaba.
+        """
+        if not letras:
+            return False
+        clave = (clave_paquete(artista, titulo), _milisegundos(duracion))
+        if clave in self._entradas:
+            return False
+        self._escribir(clave, len(letras), codificar_bloque(letras, fuente, artista, titulo))
+        return True
+
+    def agregar_bloque(self, clave, duracion_ms, lineas, bloque):
+        """
+        Copia un bloque ya codificado (de otro paquete) sin decodificarlo.
+        """
+        if (clave, duracion_ms) in self._entradas:
+            return False
+        self._escribir((clave, duracion_ms), lineas, bloque)
+        return True
+
+    def _escribir(self, clave, lineas, bloque):
+        desplazamiento = self._archivo.tell()
+        self._archivo.write(bloque)
+        self._archivo.write(bytes(-len(bloque) % 8))
+        self._entradas[clave] = (lineas, desplazamiento, len(bloque))
+
+    def cerrar(self):
+        claves = sorted(self._entradas)
+        indice = self._archivo.tell()
+        self._archivo.write(_a_bytes(array("Q", (clave for clave, _ in claves))))
+        self._archivo.write(b"".join(
+            _ENTRADA.pack(duracion, *self._entradas[(clave, duracion)], 0) for clave, duracion in claves
+        ))
+        self._archivo.seek(0)
+        self._archivo.write(_CABECERA.pack(MAGIA, VERSION, 0, len(claves), indice))
+        self._archivo.close()
+        os.replace(self._temporal, self.ruta)
+
+    def descartar(self):
+        self._archivo.close()
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+
+# --- Construcción desde lo ya resuelto ---
+
+def letras_de_cache():
+    """
+    Letras de la caché local (artista y título normalizados, como en la
+    clave): (artista, titulo, duracion, letras, fuente).
+    """
+    from lyrics_cache import obtener_cache
+
+    for clave, fuente, letras in obtener_cache().entradas_metadatos():
+        artista, titulo, duracion = (clave[len("meta:"):].split("|") + ["", ""])[:3]
+        yield artista, titulo, float(duracion) if duracion else None, letras, fuente
+
+
+def letras_de_biblioteca(carpeta):
+    """
+    Letras en la caché de las canciones de una carpeta, con el artista y el
+    título originales de sus etiquetas.
+    """
+    from library_index import obtener_indice
+    from lyrics_cache import clave_metadatos, huella_archivo, obtener_cache
+
+    cache = obtener_cache()
+    indice = obtener_indice()
+    indice.escanear(carpeta)
+    for pista in indice.pistas(carpeta):
+        claves = [clave_metadatos(pista.artista, pista.titulo, pista.duracion)]
+        try:
+            claves.insert(0, huella_archivo(pista.ruta))
+        except OSError:
+            pass
+        entrada = cache.buscar(claves)
+        if entrada is not None and entrada.letras:
+            yield pista.artista, pista.titulo, pista.duracion, entrada.letras, entrada.fuente
+
+
+def letras_de_lrc(carpeta):
+    """
+    Letras de los .lrc de una carpeta (incluidas las subcarpetas). Artista,
+    título y duración salen de las etiquetas [ar:], [ti:] y [length:] o,
+    si faltan, del nombre "Artista - Título.lrc".
+    """
+    from lrc_parser import parse_lrc
+    from lrc_sidecar import FUENTE_DESCONOCIDA
+
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in sorted(archivos):
+            if not nombre.lower().endswith(".lrc"):
+                continue
+            try:
+                with open(os.path.join(raiz, nombre), encoding="utf-8-sig", errors="replace") as f:
+                    parseado = parse_lrc(f.read())
+            except OSError:
+                continue
+            if not parseado.lineas:
+                continue
+            base = os.path.splitext(nombre)[0]
+            artista_nombre, _, titulo_nombre = base.partition(" - ")
+            artista = parseado.metadatos.get("ar") or (artista_nombre if titulo_nombre else "")
+            titulo = parseado.metadatos.get("ti") or titulo_nombre or base
+            yield (
+                artista, titulo, _duracion_lrc(parseado.metadatos.get("length")),
+                LyricsTimeline.desde_lineas(parseado.lineas), parseado.metadatos.get("fuente") or FUENTE_DESCONOCIDA,
+            )
+
+
+def _duracion_lrc(valor):
+    if not valor:
+        return None
+    try:
+        minutos, _, segundos = valor.partition(":")
+        return int(minutos) * 60 + float(segundos) if segundos else float(minutos)
+    except ValueError:
+        return None
+
+
+def construir_paquete(ruta, canciones):
+    """
+    Escribe un paquete con las canciones (artista, titulo, duracion,
+    letras, fuente) indicadas. Devuelve cuántas se guardaron.
+    """
+    with ConstructorPaquete(ruta) as constructor:
+        for artista, titulo, duracion, letras, fuente in canciones:
+            constructor.agregar(artista, titulo, duracion, letras, fuente)
+        return len(constructor)
+
+
+def fusionar_paquetes(ruta, rutas_entrada):
+    """
+    Une varios paquetes en uno. Si una canción está en varios, gana la del
+    último. Los bloques se copian tal cual, sin descomprimirlos. Devuelve
+    cuántas canciones tiene el resultado.
+    """
+    with ConstructorPaquete(ruta) as constructor:
+        for ruta_entrada in reversed(rutas_entrada):
+            with PaqueteLetras(ruta_entrada) as paquete:
+                for indice in range(len(paquete)):
+                    clave, duracion, lineas, desplazamiento, tamano = paquete.entrada(indice)
+                    with paquete.bloque(desplazamiento, tamano) as bloque:
+                        constructor.agregar_bloque(clave, duracion, lineas, bloque)
+        return len(constructor)
+
+
+# --- Paquete configurado en el .env ---
+
+_paquete = None
+_paquete_cargado = False
+_paquete_lock = threading.Lock()
+
+
+def obtener_paquete():
+    """
+    Devuelve el paquete de LYRICS_PACK_FILE (se abre al primer uso), o None
+    si no hay ninguno configurado o no se puede abrir.
+    """
+    global _paquete, _paquete_cargado
+    if not _paquete_cargado:
+        with _paquete_lock:
+            if not _paquete_cargado:
+                ruta = os.getenv("LYRICS_PACK_FILE", PACK_FILE)
+                if ruta:
+                    try:
+                        _paquete = PaqueteLetras(ruta)
+                    except (OSError, ValueError) as e:
+                        print(f"⚠️ No se pudo abrir el paquete de letras: {e}")
+                _paquete_cargado = True
+    return _paquete
+
+
+def buscar_en_paquete(artista, titulo, duracion=None):
+    """
+    Busca la canción en el paquete configurado. Devuelve una EntradaCache
+    o None.
+    """
+    paquete = obtener_paquete()
+    if paquete is None or not titulo:
+        return None
+    return paquete.buscar(artista, titulo, duracion)
+
+
+def main():
+    from env_config import cargar_entorno
+
+    parser = argparse.ArgumentParser(description="Paquetes de letras para usar sin conexión.")
+    comandos = parser.add_subparsers(dest="comando", metavar="comando")
+    comandos.required = True
+
+    construir = comandos.add_parser("construir", help="Crear un paquete con las letras ya resueltas")
+    construir.add_argument("paquete", help=f"Archivo de salida (por ejemplo, letras{EXTENSION})")
+    construir.add_argument("--biblioteca", help="Solo las canciones de esta carpeta, con sus nombres originales")
+    construir.add_argument("--lrc", help="Añadir los .lrc de esta carpeta")
+
+    fusionar = comandos.add_parser("fusionar", help="Unir varios paquetes (el último gana)")
+    fusionar.add_argument("paquete", help="Archivo de salida")
+    fusionar.add_argument("entradas", nargs="+", help="Paquetes que se unen")
+
+    info = comandos.add_parser("info", help="Mostrar el contenido de un paquete")
+    info.add_argument("paquete")
+
+    buscar = comandos.add_parser("buscar", help="Buscar una canción en un paquete")
+    buscar.add_argument("paquete")
+    buscar.add_argument("--artista", default="")
+    buscar.add_argument("--titulo", required=True)
+    buscar.add_argument("--duracion", type=float)
+    args = parser.parse_args()
+    cargar_entorno()
+
+    inicio = time.perf_counter()
+    if args.comando == "construir":
+        def canciones():
+            if args.biblioteca:
+                yield from letras_de_biblioteca(args.biblioteca)
+            else:
+                yield from letras_de_cache()
+            if args.lrc:
+                yield from letras_de_lrc(args.lrc)
+
+        total = construir_paquete(args.paquete, canciones())
+        tamano = os.path.getsize(args.paquete)
+        print(f"📦 {total} canciones en '{args.paquete}' ({tamano / 1024:.0f} KB, "
+              f"{time.perf_counter() - inicio:.1f}s)")
+        return 0 if total else 1
+
+    if args.comando == "fusionar":
+        total = fusionar_paquetes(args.paquete, args.entradas)
+        print(f"📦 {total} canciones en '{args.paquete}' ({time.perf_counter() - inicio:.1f}s)")
+        return 0
+
+    try:
+        paquete = PaqueteLetras(args.paquete)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    with paquete:
+        apertura = (time.perf_counter() - inicio) * 1000
+        if args.comando == "info":
+            print(f"📦 {len(paquete)} canciones ({os.path.getsize(args.paquete) / 1024:.0f} KB), "
+                  f"abierto en {apertura:.2f} ms")
+            for indice in range(min(len(paquete), 20)):
+                letras, fuente, artista, titulo = paquete.leer(indice)
+                print(f"   🎶 {titulo} - {artista} [{fuente}] ({len(letras)} líneas)")
+            if len(paquete) > 20:
+                print(f"   ... y {len(paquete) - 20} más")
+            return 0
+
+        entrada = paquete.buscar(args.artista, args.titulo, args.duracion)
+        if entrada is None:
+            print(f"❌ '{args.titulo}' no está en el paquete")
+            return 1
+        print(f"🎶 {len(entrada.letras)} líneas (fuente: {entrada.fuente}) en "
+              f"{(time.perf_counter() - inicio) * 1000:.2f} ms")
+        for linea in entrada.letras:
+            print(f"   [{linea.inicio:7.2f}] {linea.texto}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from env_config import cargar_entorno
+from query_normalizer import clave_consulta
+from timeline import LyricsTimeline
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+INDICE_FILE = "lyrics_search.sqlite3"
+
+# Peso de cada columna en el ranking BM25 (artista, título, letra):
+# una coincidencia en el título o el artista pesa más que en la letra
+PESOS_BM25 = (8.0, 10.0, 1.0)
+
+# Palabras de contexto alrededor de la coincidencia en el fragmento
+PALABRAS_FRAGMENTO = 10
+
+ResultadoBusqueda = namedtuple(
+    "ResultadoBusqueda", ["clave", "artista", "titulo", "fuente", "fragmento", "puntuacion"]
+)
+
+_RE_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+
+def _consulta_fts(texto, columnas=None):
+    """
+    Convierte el texto del usuario en una consulta FTS5 con todas las
+    palabras obligatorias; la última se trata como prefijo ("palabra"*),
+    por si quedó a medio escribir. Devuelve None si no hay palabras.
+    `columnas` limita la búsqueda a esas columnas.
+    """
+    palabras = _RE_PALABRA.findall(texto or "")
+    if not palabras:
+        return None
+    terminos = [f'"{palabra}"' for palabra in palabras]
+    terminos[-1] += "*"
+    expresion = " AND ".join(terminos)
+    if columnas:
+        return "{%s} : (%s)" % (" ".join(columnas), expresion)
+    return expresion
+
+
+def _texto_letra(letras):
+    """
+    Texto plano de una letra (LyricsTimeline o cadena), una línea por renglón.
+    """
+    if isinstance(letras, LyricsTimeline):
+        return "\n".join(letras.textos)
+    return str(letras or "")
+
+
+class IndiceLetras:
+    """
+    Índice de texto completo (SQLite FTS5) de las letras descargadas.
+
+    Cada canción es un documento con artista, título y letra; se puede
+    buscar por un fragmento recordado de la letra, por artista o por
+    título sin acceso a la red. Las búsquedas ignoran mayúsculas y acentos,
+    aceptan palabras incompletas y se ordenan por BM25.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.getenv("LYRICS_SEARCH_FILE", INDICE_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS canciones (
+                id INTEGER PRIMARY KEY,
+                clave TEXT UNIQUE NOT NULL,
+                fuente TEXT,
+                actualizado REAL NOT NULL
+            )
+            """
+        )
+        # El rowid de cada documento es el id de su fila en `canciones`
+        self._conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS documentos USING fts5(
+                artista, titulo, letra,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+            """
+        )
+        self._conn.commit()
+
+    def indexar(self, artista, titulo, letras, fuente=None, clave=None):
+        """
+        Añade o reemplaza la letra de una canción. `clave` identifica la
+        canción (por defecto, la clave canónica de artista y título, la
+        misma que usa importar_cache).
+        """
+        clave = clave or clave_consulta(artista, titulo)
+        with self._lock:
+            self._indexar(clave, artista or "", titulo or "", _texto_letra(letras), fuente)
+            self._conn.commit()
+
+    def _indexar(self, clave, artista, titulo, letra, fuente):
+        fila = self._conn.execute("SELECT id FROM canciones WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            id_cancion = self._conn.execute(
+                "INSERT INTO canciones (clave, fuente, actualizado) VALUES (?, ?, ?)",
+                (clave, fuente, time.time()),
+            ).lastrowid
+        else:
+            id_cancion = fila[0]
+            self._conn.execute(
+                "UPDATE canciones SET fuente = ?, actualizado = ? WHERE id = ?",
+                (fuente, time.time(), id_cancion),
+            )
+            self._conn.execute("DELETE FROM documentos WHERE rowid = ?", (id_cancion,))
+        self._conn.execute(
+            "INSERT INTO documentos (rowid, artista, titulo, letra) VALUES (?, ?, ?, ?)",
+            (id_cancion, artista, titulo, letra),
+        )
+
+    def buscar(self, texto, artista=None, limite=10):
+        """
+        Busca canciones por título, artista o fragmento de la letra.
+
+        Sin `artista`, el texto se busca en todas las columnas. Con
+        `artista`, se buscan primero canciones de ese artista cuyo título
+        coincida con el texto y, si no hay ninguna, cuya letra lo contenga.
+        Devuelve una lista de ResultadoBusqueda ordenada por relevancia.
+        """
+        if artista:
+            filtro = _consulta_fts(artista, ["artista"])
+            if filtro is None:
+                return []
+            consultas = [
+                f"{filtro} AND {consulta}"
+                for consulta in (_consulta_fts(texto, ["titulo"]), _consulta_fts(texto, ["letra"]))
+                if consulta
+            ] or [filtro]
+        else:
+            consultas = [_consulta_fts(texto)]
+
+        for consulta in consultas:
+            if consulta is None:
+                continue
+            resultados = self._consultar(consulta, limite)
+            if resultados:
+                return resultados
+        return []
+
+    def _consultar(self, consulta, limite):
+        with self._lock:
+            filas = self._conn.execute(
+                """
+                SELECT c.clave, d.artista, d.titulo, c.fuente,
+                       snippet(documentos, 2, '«', '»', '…', ?),
+                       bm25(documentos, ?, ?, ?) AS puntuacion
+                FROM documentos AS d JOIN canciones AS c ON c.id = d.rowid
+                WHERE documentos MATCH ?
+                ORDER BY puntuacion
+                LIMIT ?
+                """,
+                (PALABRAS_FRAGMENTO, *PESOS_BM25, consulta, limite),
+            ).fetchall()
+        return [
+            ResultadoBusqueda(clave, artista, titulo, fuente, fragmento.replace("\n", " / "), -puntuacion)
+            for clave, artista, titulo, fuente, fragmento, puntuacion in filas
+        ]
+
+    def letra(self, clave):
+        """
+        Devuelve (artista, título, letra) de una canción indexada, o None.
+        """
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT d.artista, d.titulo, d.letra
+                FROM documentos AS d JOIN canciones AS c ON c.id = d.rowid
+                WHERE c.clave = ?
+                """,
+                (clave,),
+            ).fetchone()
+
+    def importar_cache(self, cache):
+        """
+        Indexa las letras que ya están en la caché local (claves de
+        metadatos) y que aún no estaban en el índice. Los nombres quedan
+        normalizados, tal como están en la clave. Devuelve cuántas
+        canciones se indexaron.
+        """
+        total = 0
+        with self._lock:
+            for clave, fuente, letras in cache.entradas_metadatos():
+                artista, _, resto = clave[len("meta:"):].partition("|")
+                titulo = resto.partition("|")[0]
+                existe = self._conn.execute(
+                    "SELECT 1 FROM canciones WHERE clave = ?", (f"{artista}|{titulo}",)
+                ).fetchone()
+                if existe:
+                    continue
+                self._indexar(f"{artista}|{titulo}", artista, titulo, _texto_letra(letras), fuente)
+                total += 1
+            self._conn.commit()
+        return total
+
+    def optimizar(self):
+        """
+        Fusiona los segmentos del índice FTS5 (útil tras importaciones grandes).
+        """
+        with self._lock:
+            self._conn.execute("INSERT INTO documentos (documentos) VALUES ('optimize')")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM canciones").fetchone()[0]
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice_letras():
+    """
+    Devuelve la instancia compartida del índice de letras (se crea al primer uso).
+    """
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceLetras()
+    return _indice
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca en las letras descargadas sin conexión.")
+    parser.add_argument("consulta", nargs="?", help="Fragmento de la letra, título o artista")
+    parser.add_argument("--artista", help="Limitar la búsqueda a un artista")
+    parser.add_argument("--limite", type=int, default=10, help="Resultados máximos")
+    parser.add_argument(
+        "--importar-cache", action="store_true", help="Indexar las letras de la caché local"
+    )
+    args = parser.parse_args()
+    cargar_entorno()
+
+    indice = obtener_indice_letras()
+    if args.importar_cache:
+        from lyrics_cache import obtener_cache
+
+        total = indice.importar_cache(obtener_cache())
+        indice.optimizar()
+        print(f"📚 {total} canciones indexadas desde la caché local")
+    if not args.consulta:
+        return 0
+
+    inicio = time.perf_counter()
+    resultados = indice.buscar(args.consulta, artista=args.artista, limite=args.limite)
+    transcurrido = (time.perf_counter() - inicio) * 1000
+    if not resultados:
+        print(f"❌ Sin resultados para '{args.consulta}' ({transcurrido:.1f} ms)")
+        return 1
+    print(f"🔍 {len(resultados)} resultados en {transcurrido:.1f} ms")
+    for n, resultado in enumerate(resultados, start=1):
+        print(f"{n:2d}. 🎶 {resultado.titulo} - {resultado.artista} [{resultado.fuente}]")
+        print(f"    {resultado.fragmento}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
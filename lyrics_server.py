@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from env_config import cargar_entorno
+from library_index import EXTENSIONES_AUDIO, leer_pista
+from lyrics_finder import obtener_letra_sincronizada, obtener_letra_sincronizada_metadatos
+from lyrics_search import obtener_indice_letras
+from metrics import TIPO_CONTENIDO, activar_exportacion, obtener_metricas
+from timeline import timeline_a_json
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+HOST = "127.0.0.1"
+PUERTO = 8080
+MAX_RESOLUCIONES = 8  # Búsquedas de letras simultáneas (el resto espera turno)
+MAX_SUBIDA_MB = 50  # Tamaño máximo del audio subido a /reconocer
+
+TAM_BLOQUE = 64 * 1024
+
+_metricas = obtener_metricas()
+_peticiones = _metricas.contador(
+    "sound_lyrics_servidor_peticiones_total", "Peticiones HTTP atendidas por ruta y código", ["ruta", "codigo"]
+)
+_latencias = _metricas.histograma(
+    "sound_lyrics_servidor_segundos", "Tiempo de respuesta del servicio HTTP por ruta", ["ruta"]
+)
+
+
+class ErrorPeticion(Exception):
+    def __init__(self, codigo, mensaje):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+class ManejadorLetras(BaseHTTPRequestHandler):
+    """
+    Rutas del servicio:
+
+    GET  /letras?artista=X&titulo=Y[&duracion=S]  letra por metadatos
+    POST /reconocer?nombre=archivo.mp3            letra del audio del cuerpo
+    GET  /buscar?q=texto[&artista=X][&limite=N]   búsqueda sin conexión
+    GET  /salud                                   comprobación de vida
+    GET  /metrics                                 métricas de Prometheus
+    """
+
+    protocol_version = "HTTP/1.1"  # Conexiones keep-alive
+    server_version = "sound-lyrics"
+
+    def do_GET(self):
+        rutas = {
+            "/letras": self._letras,
+            "/buscar": self._buscar,
+            "/salud": self._salud,
+            "/metrics": self._metricas,
+        }
+        self._atender(rutas)
+
+    def do_POST(self):
+        self._atender({"/reconocer": self._reconocer})
+
+    def _atender(self, rutas):
+        url = urlparse(self.path)
+        manejador = rutas.get(url.path)
+        ruta = url.path if manejador else "otra"
+        with _latencias.medir(ruta=ruta):
+            try:
+                if manejador is None:
+                    raise ErrorPeticion(404, f"Ruta desconocida: {url.path}")
+                codigo, cuerpo = manejador(parse_qs(url.query))
+            except ErrorPeticion as e:
+                codigo, cuerpo = e.codigo, {"error": str(e)}
+                # Puede quedar cuerpo sin leer: no se reutiliza la conexión
+                self.close_connection = True
+            except Exception as e:
+                codigo, cuerpo = 500, {"error": f"Error interno: {e}"}
+            if isinstance(cuerpo, dict):
+                self._responder(codigo, json.dumps(cuerpo, ensure_ascii=False).encode("utf-8"))
+            else:
+                self._responder(codigo, cuerpo, TIPO_CONTENIDO)
+        _peticiones.inc(ruta=ruta, codigo=codigo)
+
+    def _responder(self, codigo, datos, tipo="application/json; charset=utf-8"):
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _resolver(self, funcion, *args):
+        # Limita las búsquedas simultáneas; las idénticas ya se agrupan en
+        # lyrics_finder y las repetidas salen de la caché compartida
+        with self.server.resoluciones:
+            return funcion(*args)
+
+    def _letras(self, parametros):
+        artista = _parametro(parametros, "artista")
+        titulo = _parametro(parametros, "titulo")
+        if not (artista and titulo):
+            raise ErrorPeticion(400, "Faltan los parámetros 'artista' y 'titulo'")
+        duracion = _parametro(parametros, "duracion")
+        try:
+            duracion = float(duracion) if duracion else None
+        except ValueError:
+            raise ErrorPeticion(400, "'duracion' debe ser un número de segundos")
+
+        letras, fuente = self._resolver(obtener_letra_sincronizada_metadatos, artista, titulo, duracion)
+        return (200 if letras else 404), timeline_a_json(letras, fuente, artista, titulo, duracion)
+
+    def _reconocer(self, parametros):
+        nombre = os.path.basename(_parametro(parametros, "nombre") or "audio.mp3")
+        if not nombre.lower().endswith(EXTENSIONES_AUDIO):
+            raise ErrorPeticion(415, f"Formato no soportado; se aceptan {', '.join(EXTENSIONES_AUDIO)}")
+        longitud = self.headers.get("Content-Length")
+        if longitud is None:
+            raise ErrorPeticion(411, "Falta la cabecera Content-Length")
+        try:
+            longitud = int(longitud)
+        except ValueError:
+            longitud = -1
+        if longitud < 0:
+            raise ErrorPeticion(400, "Content-Length debe ser un número de bytes")
+        if longitud > self.server.max_subida:
+            raise ErrorPeticion(413, f"El audio supera {self.server.max_subida // (1024 * 1024)} MB")
+
+        # El nombre se conserva: sin etiquetas, artista y título salen de él
+        carpeta = tempfile.mkdtemp(prefix="sound-lyrics-")
+        try:
+            ruta = os.path.join(carpeta, nombre)
+            with open(ruta, "wb") as destino:
+                restante = longitud
+                while restante:
+                    bloque = self.rfile.read(min(TAM_BLOQUE, restante))
+                    if not bloque:
+                        raise ErrorPeticion(400, "Cuerpo incompleto")
+                    destino.write(bloque)
+                    restante -= len(bloque)
+            pista = leer_pista(ruta)
+            letras, fuente = self._resolver(obtener_letra_sincronizada, ruta, pista)
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+        cuerpo = timeline_a_json(letras, fuente, pista.artista, pista.titulo, pista.duracion)
+        return (200 if letras else 404), cuerpo
+
+    def _buscar(self, parametros):
+        texto = _parametro(parametros, "q")
+        if not texto:
+            raise ErrorPeticion(400, "Falta el parámetro 'q'")
+        try:
+            limite = int(_parametro(parametros, "limite") or 10)
+        except ValueError:
+            raise ErrorPeticion(400, "'limite' debe ser un número entero")
+        resultados = obtener_indice_letras().buscar(
+            texto, artista=_parametro(parametros, "artista"), limite=limite
+        )
+        return 200, {"resultados": [resultado._asdict() for resultado in resultados]}
+
+    def _salud(self, parametros):
+        return 200, {"estado": "ok"}
+
+    def _metricas(self, parametros):
+        return 200, obtener_metricas().exportar().encode("utf-8")
+
+    def log_message(self, formato, *args):
+        if self.server.registrar_accesos:
+            sys.stderr.write(f"🌐 {self.address_string()} {formato % args}\n")
+
+
+def _parametro(parametros, nombre):
+    valores = parametros.get(nombre)
+    return valores[0].strip() if valores else None
+
+
+class ServidorLetras(ThreadingHTTPServer):
+    """
+    Servidor HTTP con un hilo por conexión que comparte la caché, el pool
+    de conexiones y los límites por proveedor del proceso.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, direccion, max_resoluciones=None, max_subida_mb=None, registrar_accesos=True):
+        super().__init__(direccion, ManejadorLetras)
+        self.resoluciones = threading.BoundedSemaphore(
+            max_resoluciones or int(os.getenv("SERVIDOR_MAX_RESOLUCIONES", MAX_RESOLUCIONES))
+        )
+        self.max_subida = int(
+            float(max_subida_mb or os.getenv("SERVIDOR_MAX_SUBIDA_MB", MAX_SUBIDA_MB)) * 1024 * 1024
+        )
+        self.registrar_accesos = registrar_accesos
+
+
+def main():
+    # Antes de crear el parser: los valores por defecto salen del .env
+    cargar_entorno()
+    parser = argparse.ArgumentParser(description="Servicio HTTP de búsqueda de letras sincronizadas.")
+    parser.add_argument("--host", default=os.getenv("SERVIDOR_HOST", HOST), help="Dirección de escucha")
+    parser.add_argument(
+        "--puerto", type=int, default=int(os.getenv("SERVIDOR_PUERTO", PUERTO)), help="Puerto de escucha"
+    )
+    parser.add_argument("--max-resoluciones", type=int, default=None, help="Búsquedas simultáneas máximas")
+    parser.add_argument("--detallado", action="store_true", help="Mostrar la salida de cada búsqueda")
+    parser.add_argument("--silencioso", action="store_true", help="No registrar cada petición")
+    args = parser.parse_args()
+
+    activar_exportacion()
+    servidor = ServidorLetras(
+        (args.host, args.puerto), args.max_resoluciones, registrar_accesos=not args.silencioso
+    )
+    print(f"🎶 Servicio de letras escuchando en http://{args.host}:{args.puerto}")
+    sys.stdout.flush()
+    if not args.detallado:
+        # Las búsquedas imprimen mucho pensando en la terminal interactiva
+        sys.stdout = open(os.devnull, "w")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,14 @@
 import os
 import time
-from lyrics_finder import obtener_letra, obtener_letra_sincronizada
+from env_config import cargar_entorno
+from lyrics_finder import buscar_letra_local, lrclib_disponible, obtener_letra, obtener_letra_sincronizada
+from karaoke_renderer import RenderizadorTerminal
+from karaoke_scheduler import ProgramadorKaraoke, RelojReproduccion
+from timeline import LyricsTimeline
+from library_index import obtener_indice
+from prefetch import imprimir_resumen, precargar_biblioteca
+from playlist_queue import EN_ESPERA, ERROR, LISTA, PREPARANDO, SIN_LETRA, ColaReproduccion
+from metrics import activar_exportacion
 
 # Colores para la terminal
 class Colors:
@@ -19,145 +27,109 @@ class Colors:
 SONGS_FOLDER = "sounds"
 
 
-def listar_canciones() -> list[str]:
+def listar_canciones(completo: bool = False) -> list:
     """
-    Lista los archivos MP3 en la carpeta 'songs'.
-    Devuelve una lista de nombres de archivo.
+    Lista los archivos de audio de la carpeta 'sounds' y sus subcarpetas.
+    Usa el índice de la biblioteca: solo se leen los archivos nuevos o
+    modificados. Devuelve una lista de PistaBiblioteca.
     """
-    canciones_disponibles = []
     if not os.path.exists(SONGS_FOLDER):
         os.makedirs(SONGS_FOLDER)  # Crea la carpeta si no existe
         print(f"Carpeta '{SONGS_FOLDER}' creada. Coloca tus archivos de audio aquí.")
         return []
 
-    for archivo in os.listdir(SONGS_FOLDER):
-        if archivo.endswith((".mp3", ".wav", ".flac", ".ogg")):  # Acepta varios formatos
-            canciones_disponibles.append(archivo)
+    indice = obtener_indice()
+    indice.escanear(SONGS_FOLDER, completo=completo)
+    return indice.pistas(SONGS_FOLDER)
 
-    return canciones_disponibles
 
-
-def simular_karaoke(letra_sincronizada: list, nombre_cancion: str = "Canción", fuente_api: str = "Desconocida"):
+def simular_karaoke(letra_sincronizada, nombre_cancion: str = "Canción", fuente_api: str = "Desconocida",
+                    desfase: float = None):
     """
-    Recibe la lista de letras con timestamps y las muestra en tiempo real.
+    Recibe la letra sincronizada (LyricsTimeline) y la muestra en tiempo real.
+    Cada línea aparece en un plazo absoluto medido desde el inicio de la
+    canción; Ctrl+C pausa y permite ajustar el desfase o saltar.
     """
+    if desfase is None:
+        desfase = float(os.getenv("KARAOKE_DESFASE", 0) or 0)
+
     if not letra_sincronizada:
         print("No hay letra sincronizada para mostrar.")
         return
 
-    # Verificar el formato de los datos
-    if not isinstance(letra_sincronizada, list):
-        print(f"Error: Se esperaba una lista, pero se recibió {type(letra_sincronizada)}")
-        return
-
-    if len(letra_sincronizada) > 0:
-        primera_linea = letra_sincronizada[0]
-        if not isinstance(primera_linea, dict):
-            print(f"Error: Se esperaba una lista de diccionarios, pero el primer elemento es {type(primera_linea)}")
-            print(f"Contenido del primer elemento: {primera_linea}")
+    # Aceptar también el formato antiguo (lista de diccionarios)
+    if isinstance(letra_sincronizada, list):
+        try:
+            letra_sincronizada = LyricsTimeline.desde_dicts(letra_sincronizada)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error: La letra no tiene el formato esperado ('text' y 'timestamp'): {e}")
             return
 
-        if 'text' not in primera_linea or 'timestamp' not in primera_linea:
-            print(f"Error: Los diccionarios deben contener 'text' y 'timestamp'. Claves encontradas: {list(primera_linea.keys())}")
-            return
+    if not isinstance(letra_sincronizada, LyricsTimeline):
+        print(f"Error: Se esperaba un LyricsTimeline, pero se recibió {type(letra_sincronizada)}")
+        return
 
     print("\n🎤 ¡Empezando karaoke en 3 segundos! 🎤\n")
     time.sleep(3)
 
-    # Limpia la consola una sola vez al inicio
-    os.system('cls' if os.name == 'nt' else 'clear')
-    print(f"{Colors.CYAN}{'='*70}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.YELLOW}🎤 KARAOKE - {nombre_cancion} 🎤{Colors.END}")
-    print(f"{Colors.CYAN}{'='*70}{Colors.END}")
-
-    # Mostrar información de la fuente de datos
-    if fuente_api == "LRCLIB":
-        print(f"{Colors.GREEN}🌐 Fuente: LRCLIB - Letras sincronizadas reales{Colors.END}")
-        print(f"{Colors.GREEN}✅ Timestamps reales de la música{Colors.END}")
-        print(f"{Colors.CYAN}✨ Efecto de escritura activado{Colors.END}")
-    elif fuente_api == "AUDD":
-        print(f"{Colors.YELLOW}🎤 Fuente: Audd.io - Reconocimiento de audio{Colors.END}")
-        print(f"{Colors.YELLOW}⚠️ Timestamps simulados inteligentes{Colors.END}")
-        print(f"{Colors.WHITE}📝 Visualización directa{Colors.END}")
-    else:
-        print(f"{Colors.WHITE}📝 Fuente: {fuente_api}{Colors.END}")
-
-    print(f"{Colors.CYAN}{'─'*70}{Colors.END}")
-    print(f"{Colors.GREEN}🎵 ¡Canta junto con la música! 🎵{Colors.END}")
-    print(f"{Colors.CYAN}{'─'*70}{Colors.END}")
-
-    for i, linea in enumerate(letra_sincronizada):
-        # Efecto de escritura progresiva para la línea actual
-        texto_linea = linea['text']
-        
-        # Verificar si es un título de sección (entre corchetes) y omitirlo
-        if texto_linea.startswith('[') and texto_linea.endswith(']'):
-            # Saltar títulos de sección sin mostrarlos
-            continue
-        
-        # Mostrar la línea con o sin efecto de escritura según la fuente
-        if fuente_api == "LRCLIB":
-            # Efecto de escritura para letras sincronizadas reales
-            print("\n", end="", flush=True)
-            
-            # Efecto de escritura carácter por carácter con velocidad rápida
-            for char in texto_linea:
-                print(char, end="", flush=True)
-                if char == ' ':
-                    time.sleep(0.02)  # Pausa muy corta en espacios
-                elif char in '.,!?':
-                    time.sleep(0.05)  # Pausa corta en puntuación
-                else:
-                    time.sleep(0.01)  # Pausa mínima entre caracteres
-            
-            print()  # Nueva línea al final
-        else:
-            # Mostrar directamente para timestamps simulados
-            print(f"\n{Colors.WHITE}{Colors.BOLD}{texto_linea}{Colors.END}")
-
-        # Calcula cuánto tiempo esperar hasta la siguiente línea usando timestamps reales
-        if i + 1 < len(letra_sincronizada):
-            try:
-                # Usar los timestamps reales de la API
-                ts_actual_str = linea['timestamp']
-                ts_siguiente_str = letra_sincronizada[i + 1]['timestamp']
-
-                # Convertir timestamps a segundos
-                def parse_timestamp_to_seconds(ts_str):
-                    # Formato: HH:MM:SS.fff o MM:SS.fff
-                    parts = ts_str.split(':')
-                    if len(parts) == 3:  # HH:MM:SS.fff
-                        h, m, s_f = parts
-                        h, m = int(h), int(m)
-                    elif len(parts) == 2:  # MM:SS.fff
-                        h = 0
-                        m, s_f = parts
-                        m = int(m)
-                    else:
-                        raise ValueError(f"Formato de timestamp inesperado: {ts_str}")
+    reloj = RelojReproduccion(desfase=desfase)
+    programador = ProgramadorKaraoke(letra_sincronizada, reloj)
+    # Cada fotograma se compone en memoria y se escribe de una vez; el
+    # efecto de escritura se calcula a partir del reloj y no retrasa nada
+    renderizador = RenderizadorTerminal(letra_sincronizada, nombre_cancion, fuente_api)
 
-                    s, f = s_f.split('.')
-                    s, f = int(s), float(f) / 1000.0
-                    return h * 3600 + m * 60 + s + f
+    while True:
+        try:
+            # Al salir del bloque (también con Ctrl+C) la terminal vuelve a la normalidad
+            with renderizador:
+                terminada = programador.ejecutar_fotogramas(renderizador.dibujar, renderizador.fps)
+            break
+        except KeyboardInterrupt:
+            # Ctrl+C pausa la letra y abre el menú de control
+            reloj.pausar()
+            if not _menu_pausa(reloj):
+                terminada = False
+                break
+            reloj.reanudar()
+
+    if terminada:
+        # Final de la canción
+        print(f"\n{Colors.CYAN}{'='*70}{Colors.END}")
+        print(f"{Colors.BOLD}{Colors.GREEN}🎉 ¡CANCIÓN TERMINADA! 🎉{Colors.END}")
+        print(f"{Colors.YELLOW}¡Gracias por cantar con nosotros!{Colors.END}")
+        print(f"{Colors.CYAN}{'='*70}{Colors.END}")
+    else:
+        print(f"\n{Colors.YELLOW}⏹️ Karaoke detenido.{Colors.END}")
 
-                segundos_actual = parse_timestamp_to_seconds(ts_actual_str)
-                segundos_siguiente = parse_timestamp_to_seconds(ts_siguiente_str)
 
-                pausa = max(3.0, segundos_siguiente - segundos_actual)  # Mínimo 3 segundos, máximo 15 segundos
-                pausa = min(15.0, pausa)  # Evitar pausas demasiado largas
-                time.sleep(pausa)
+def _menu_pausa(reloj: RelojReproduccion) -> bool:
+    """
+    Menú de control mientras el karaoke está en pausa.
+    Devuelve True para continuar y False para salir.
+    """
+    while True:
+        posicion = reloj.posicion()
+        print(f"\n{Colors.CYAN}⏸️ Pausa en {int(posicion // 60):02d}:{posicion % 60:04.1f} "
+              f"(desfase {reloj.desfase:+.2f}s){Colors.END}")
+        print(f"{Colors.WHITE}[Enter] continuar · +N/-N ajustar desfase · sN ir al segundo N · q salir{Colors.END}")
+        try:
+            orden = input(f"{Colors.YELLOW}👉 {Colors.END}").strip().lower()
+        except (KeyboardInterrupt, EOFError):
+            return False
 
-            except Exception as e:
-                # Si hay error con timestamps, usar tiempo fijo como respaldo
-                print(f"Error con timestamp, usando tiempo fijo: {e}")
-                time.sleep(6)  # 6 segundos como respaldo
-        else:
-            # Final de la canción
-            print(f"\n{Colors.CYAN}{'='*70}{Colors.END}")
-            print(f"{Colors.BOLD}{Colors.GREEN}🎉 ¡CANCIÓN TERMINADA! 🎉{Colors.END}")
-            print(f"{Colors.YELLOW}¡Gracias por cantar con nosotros!{Colors.END}")
-            print(f"{Colors.CYAN}{'='*70}{Colors.END}")
-            time.sleep(3)  # Pausa al final de la canción
+        try:
+            if orden == '':
+                return True
+            elif orden == 'q':
+                return False
+            elif orden[0] in '+-':
+                reloj.ajustar_desfase(float(orden))
+            elif orden[0] == 's':
+                reloj.seek(float(orden[1:]))
+            else:
+                print(f"{Colors.RED}❌ Orden no reconocida.{Colors.END}")
+        except ValueError:
+            print(f"{Colors.RED}❌ Número inválido.{Colors.END}")
 
 
 def mostrar_menu():
@@ -167,29 +139,31 @@ def mostrar_menu():
     print(f"\n{Colors.WHITE}{Colors.BOLD}📋 OPCIONES DISPONIBLES:{Colors.END}")
     print(f"{Colors.GREEN}1.{Colors.END} 🔍 Buscar letra de canción (texto)")
     print(f"{Colors.BLUE}2.{Colors.END} 🎤 Iniciar Karaoke (con archivo de audio)")
-    print(f"{Colors.RED}3.{Colors.END} ❌ Salir del programa")
+    print(f"{Colors.PURPLE}3.{Colors.END} ⚡ Precargar letras de toda la biblioteca")
+    print(f"{Colors.RED}4.{Colors.END} ❌ Salir del programa")
     print(f"\n{Colors.CYAN}{'─'*60}{Colors.END}")
-    return input(f"{Colors.YELLOW}👉 Elige una opción (1-3): {Colors.END}")
+    return input(f"{Colors.YELLOW}👉 Elige una opción (1-4): {Colors.END}")
 
 
-def mostrar_submenu_karaoke():
+def mostrar_submenu_karaoke(canciones):
     """Submenú para la opción de karaoke"""
     while True:
         print(f"\n{Colors.BLUE}{'='*50}{Colors.END}")
         print(f"{Colors.BOLD}{Colors.CYAN}🎤 MODO KARAOKE 🎤{Colors.END}")
         print(f"{Colors.BLUE}{'='*50}{Colors.END}")
 
-        canciones = listar_canciones()
         if not canciones:
             print(f"{Colors.RED}❌ No hay archivos de audio en la carpeta 'sounds'.{Colors.END}")
             print(f"{Colors.YELLOW}💡 Coloca archivos MP3, WAV, FLAC o OGG en la carpeta 'sounds' y vuelve a intentar.{Colors.END}")
             return None
 
         print(f"\n{Colors.WHITE}{Colors.BOLD}🎵 CANCIONES DISPONIBLES:{Colors.END}")
-        for i, cancion_file in enumerate(canciones):
-            print(f"{Colors.GREEN}{i + 1:2d}.{Colors.END} 🎶 {cancion_file}")
+        for i, pista in enumerate(canciones):
+            print(f"{Colors.GREEN}{i + 1:2d}.{Colors.END} 🎶 {pista.titulo} - {pista.artista}")
 
         print(f"\n{Colors.CYAN}0.{Colors.END} ⬅️ Volver al menú principal")
+        print(f"{Colors.YELLOW}c.{Colors.END} 📜 Modo cola (varias canciones seguidas)")
+        print(f"{Colors.PURPLE}r.{Colors.END} 🔄 Reescanear la carpeta")
         print(f"{Colors.RED}9.{Colors.END} ❌ Salir del programa")
         print(f"\n{Colors.BLUE}{'─'*50}{Colors.END}")
 
@@ -198,6 +172,10 @@ def mostrar_submenu_karaoke():
 
             if seleccion == '0':
                 return 'back'
+            elif seleccion.lower() == 'r':
+                return 'rescan'
+            elif seleccion.lower() == 'c':
+                return 'queue'
             elif seleccion == '9':
                 return 'exit'
             else:
@@ -209,8 +187,109 @@ def mostrar_submenu_karaoke():
         except ValueError:
             print(f"{Colors.RED}❌ Entrada inválida. Por favor, ingresa un número.{Colors.END}")
 
+_ESTADOS_COLA = {
+    LISTA: f"{Colors.GREEN}✅ lista{Colors.END}",
+    PREPARANDO: f"{Colors.YELLOW}⏳ preparando{Colors.END}",
+    EN_ESPERA: f"{Colors.WHITE}⌛ en espera{Colors.END}",
+    SIN_LETRA: f"{Colors.RED}❌ sin letra{Colors.END}",
+    ERROR: f"{Colors.RED}💥 error{Colors.END}",
+}
+
+
+def _cantar_cola(cola):
+    """
+    Reproduce la cola en orden. Mientras suena una canción se preparan las
+    siguientes; entre canción y canción se puede volver a editar la cola.
+    Devuelve True si se terminó la cola y False si se volvió a editarla.
+    """
+    while True:
+        preparada = cola.siguiente()
+        if preparada is None:
+            print(f"\n{Colors.GREEN}🎉 ¡Cola terminada!{Colors.END}")
+            return True
+        nombre = os.path.basename(preparada.pista.ruta)
+        if preparada.letras:
+            if preparada.esperada:
+                print(f"{Colors.YELLOW}⏳ La letra de '{nombre}' no estaba preparada todavía.{Colors.END}")
+            print(f"\n{Colors.YELLOW}🎵 ¡IMPORTANTE! Reproduce manualmente '{nombre}' en tu reproductor ahora.{Colors.END}")
+            simular_karaoke(preparada.letras, nombre, preparada.fuente)
+        else:
+            print(f"{Colors.RED}❌ No se pudo obtener la letra sincronizada de '{nombre}'. Se salta.{Colors.END}")
+        if not len(cola):
+            continue
+        siguiente, estado = cola.pistas()[0]
+        print(f"\n{Colors.CYAN}⏭️ Siguiente: {siguiente.titulo} - {siguiente.artista} ({_ESTADOS_COLA[estado]}{Colors.CYAN}){Colors.END}")
+        orden = input(f"{Colors.YELLOW}👉 [Enter] siguiente canción · e editar la cola: {Colors.END}").strip().lower()
+        if orden == 'e':
+            return False
+
+
+def mostrar_cola(canciones):
+    """
+    Modo cola: se eligen varias canciones y se cantan seguidas. Las letras
+    de las próximas se preparan en segundo plano mientras suena la actual.
+    Devuelve 'exit' si el usuario quiere salir del programa.
+    """
+    with ColaReproduccion() as cola:
+        while True:
+            print(f"\n{Colors.YELLOW}{'='*50}{Colors.END}")
+            print(f"{Colors.BOLD}{Colors.CYAN}📜 COLA DE REPRODUCCIÓN 📜{Colors.END}")
+            print(f"{Colors.YELLOW}{'='*50}{Colors.END}")
+            print(f"\n{Colors.WHITE}{Colors.BOLD}🎵 CANCIONES DISPONIBLES:{Colors.END}")
+            for i, pista in enumerate(canciones):
+                print(f"{Colors.GREEN}{i + 1:2d}.{Colors.END} 🎶 {pista.titulo} - {pista.artista}")
+
+            print(f"\n{Colors.WHITE}{Colors.BOLD}📜 EN COLA ({cola.adelanto} se preparan por adelantado):{Colors.END}")
+            en_cola = cola.pistas()
+            if not en_cola:
+                print(f"{Colors.WHITE}   (vacía){Colors.END}")
+            for i, (pista, estado) in enumerate(en_cola):
+                print(f"{Colors.PURPLE}{i + 1:2d}.{Colors.END} {pista.titulo} - {pista.artista} · {_ESTADOS_COLA[estado]}")
+
+            print(f"\n{Colors.WHITE}Números para añadir (p. ej. 3 o 1 4 7) · -N quitar de la cola · "
+                  f"s empezar · v vaciar · 0 volver · 9 salir{Colors.END}")
+            print(f"{Colors.BLUE}{'─'*50}{Colors.END}")
+            # Enter vuelve a mostrar la cola con el estado de la precarga actualizado
+            orden = input(f"{Colors.YELLOW}👉 Elige una opción: {Colors.END}").strip().lower()
+
+            if orden == '0':
+                return None
+            elif orden == '9':
+                return 'exit'
+            elif orden == 'v':
+                cola.vaciar()
+            elif orden == 's':
+                if not len(cola):
+                    print(f"{Colors.RED}❌ La cola está vacía.{Colors.END}")
+                elif _cantar_cola(cola):
+                    return None
+            elif orden.startswith('-'):
+                try:
+                    pista = cola.quitar(int(orden[1:]) - 1)
+                    print(f"{Colors.YELLOW}🗑️ Quitada: {pista.titulo}{Colors.END}")
+                except (ValueError, IndexError):
+                    print(f"{Colors.RED}❌ Posición de la cola inválida.{Colors.END}")
+            elif orden:
+                try:
+                    numeros = [int(n) for n in orden.replace(',', ' ').split()]
+                except ValueError:
+                    print(f"{Colors.RED}❌ Entrada inválida. Por favor, ingresa números.{Colors.END}")
+                    continue
+                for numero in numeros:
+                    if 1 <= numero <= len(canciones):
+                        cola.agregar(canciones[numero - 1])
+                    else:
+                        print(f"{Colors.RED}❌ No existe la canción {numero}.{Colors.END}")
+
+
 def main():
+    cargar_entorno()
+    if lrclib_disponible():
+        print("✅ LRCLIB disponible - Letras sincronizadas reales habilitadas")
+    else:
+        print("⚠️ LRCLIB no está disponible. Instala con: pip install lrcup")
     print(f"{Colors.BOLD}{Colors.PURPLE}🎶 ¡Bienvenido al Buscador de Letras y Karaoke! 🎶{Colors.END}")
+    activar_exportacion()
 
     while True:
         opcion = mostrar_menu()
@@ -220,20 +299,32 @@ def main():
             print(f"{Colors.BOLD}{Colors.CYAN}🔍 BÚSQUEDA DE LETRAS{Colors.END}")
             print(f"{Colors.GREEN}{'='*50}{Colors.END}")
 
-            cancion = input(f"{Colors.YELLOW}🎵 Ingresa el nombre de la canción: {Colors.END}")
-            artista = input(f"{Colors.YELLOW}👤 Ingresa el nombre del artista: {Colors.END}")
+            cancion = input(f"{Colors.YELLOW}🎵 Ingresa el nombre de la canción o un fragmento de la letra: {Colors.END}")
+            artista = input(f"{Colors.YELLOW}👤 Ingresa el nombre del artista (opcional): {Colors.END}")
 
-            if cancion and artista:
-                obtener_letra(nombre_cancion=cancion, nombre_artista=artista)
-            else:
-                print(f"{Colors.RED}❌ Debes ingresar tanto el nombre de la canción como el del artista.{Colors.END}")
+            if not (cancion or artista):
+                print(f"{Colors.RED}❌ Debes ingresar la canción, un fragmento de la letra o el artista.{Colors.END}")
+            # Primero en las letras ya descargadas (sin conexión)
+            elif not buscar_letra_local(cancion, artista):
+                if cancion and artista:
+                    obtener_letra(nombre_cancion=cancion, nombre_artista=artista)
+                else:
+                    print(f"{Colors.RED}❌ Sin resultados locales. Para buscar en Audd.io ingresa tanto la canción como el artista.{Colors.END}")
 
         elif opcion == '2':
+            canciones = listar_canciones()
             while True:
-                resultado = mostrar_submenu_karaoke()
+                resultado = mostrar_submenu_karaoke(canciones)
 
                 if resultado == 'back':
                     break
+                elif resultado == 'rescan':
+                    # Escaneo completo: detecta también archivos editados in situ
+                    canciones = listar_canciones(completo=True)
+                elif resultado == 'queue':
+                    if mostrar_cola(canciones) == 'exit':
+                        print(f"\n{Colors.YELLOW}👋 ¡Hasta luego! ¡Gracias por usar el karaoke!{Colors.END}")
+                        return
                 elif resultado == 'exit':
                     print(f"\n{Colors.YELLOW}👋 ¡Hasta luego! ¡Gracias por usar el karaoke!{Colors.END}")
                     return
@@ -241,11 +332,11 @@ def main():
                     break
                 else:
                     # Procesar la canción seleccionada
-                    nombre_archivo_seleccionado = resultado
-                    ruta_completa_audio = os.path.join(SONGS_FOLDER, nombre_archivo_seleccionado)
+                    pista = resultado
+                    nombre_archivo_seleccionado = os.path.basename(pista.ruta)
 
                     print(f"\n{Colors.CYAN}🔄 Procesando '{nombre_archivo_seleccionado}'...{Colors.END}")
-                    letra_sincronizada, fuente_api = obtener_letra_sincronizada(ruta_completa_audio)
+                    letra_sincronizada, fuente_api = obtener_letra_sincronizada(pista.ruta, pista)
 
                     if letra_sincronizada:
                         print(f"\n{Colors.GREEN}✅ ¡Letra sincronizada encontrada!{Colors.END}")
@@ -263,6 +354,19 @@ def main():
                         input(f"{Colors.YELLOW}Presiona Enter para continuar...{Colors.END}")
 
         elif opcion == '3':
+            print(f"\n{Colors.PURPLE}{'='*50}{Colors.END}")
+            print(f"{Colors.BOLD}{Colors.CYAN}⚡ PRECARGA DE LA BIBLIOTECA{Colors.END}")
+            print(f"{Colors.PURPLE}{'='*50}{Colors.END}")
+
+            canciones = listar_canciones()
+            if canciones:
+                rutas = [pista.ruta for pista in canciones]
+                print(f"{Colors.CYAN}🔄 Resolviendo {len(rutas)} canciones en paralelo...{Colors.END}")
+                imprimir_resumen(precargar_biblioteca(rutas))
+            else:
+                print(f"{Colors.RED}❌ No hay archivos de audio en la carpeta 'sounds'.{Colors.END}")
+
+        elif opcion == '4':
             print(f"\n{Colors.YELLOW}👋 ¡Hasta luego! ¡Gracias por usar el karaoke!{Colors.END}")
             break
 
@@ -0,0 +1,384 @@
+import atexit
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+PUERTO = 0  # Puerto del endpoint /metrics (0 = desactivado)
+HOST = "127.0.0.1"
+ARCHIVO = ""  # Volcado en formato texto de Prometheus ("" = desactivado)
+INTERVALO_VOLCADO = 15.0  # Segundos entre volcados al archivo
+
+# Límites de los histogramas de tiempo, en segundos (de 1 ms a 1 min)
+LIMITES_SEGUNDOS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Histograma compartido con el tiempo de cada etapa de la búsqueda de letras
+METRICA_ETAPAS = "sound_lyrics_etapa_segundos"
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return "{%s}" % ",".join(pares) if pares else ""
+
+
+def _formatear_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer() and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _clave(self, etiquetas):
+        if set(etiquetas) != set(self.etiquetas):
+            raise ValueError(f"{self.nombre}: se esperaban las etiquetas {self.etiquetas}")
+        return tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        lineas.extend(self._muestras())
+        return "\n".join(lineas)
+
+    def _muestras(self):
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    """
+    Valor que solo crece (peticiones, aciertos, errores...).
+    """
+
+    tipo = "counter"
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas):
+        with self._lock:
+            return self._series.get(self._clave(etiquetas), 0)
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        if not series and not self.etiquetas:
+            series = [((), 0)]
+        for valores, total in series:
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, valores)} {_formatear_numero(total)}"
+
+
+class _Serie:
+    __slots__ = ("cubos", "suma", "cuenta")
+
+    def __init__(self, limites):
+        self.cubos = [0] * (len(limites) + 1)  # El último es +Inf
+        self.suma = 0.0
+        self.cuenta = 0
+
+
+class _Cronometro:
+    __slots__ = ("_histograma", "_etiquetas", "_inicio")
+
+    def __init__(self, histograma, etiquetas):
+        self._histograma = histograma
+        self._etiquetas = etiquetas
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histograma.observar(time.perf_counter() - self._inicio, **self._etiquetas)
+        return False
+
+
+class Histograma(_Metrica):
+    """
+    Distribución de valores (normalmente duraciones en segundos) en cubos
+    acumulativos, como los histogramas de Prometheus.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        cubo = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = _Serie(self.limites)
+            serie.cubos[cubo] += 1
+            serie.suma += valor
+            serie.cuenta += 1
+
+    def medir(self, **etiquetas):
+        """
+        Context manager que observa el tiempo transcurrido dentro del bloque
+        (también si el bloque lanza una excepción).
+        """
+        return _Cronometro(self, etiquetas)
+
+    def resumen(self, **etiquetas):
+        """
+        Devuelve {"cuenta", "suma", "media", "p50", "p95", "p99"} de una
+        serie; los percentiles se estiman interpolando dentro de los cubos.
+        """
+        with self._lock:
+            serie = self._series.get(self._clave(etiquetas))
+            if serie is None or not serie.cuenta:
+                return None
+            cubos, suma, cuenta = list(serie.cubos), serie.suma, serie.cuenta
+        return {
+            "cuenta": cuenta,
+            "suma": suma,
+            "media": suma / cuenta,
+            "p50": self._percentil(cubos, cuenta, 0.50),
+            "p95": self._percentil(cubos, cuenta, 0.95),
+            "p99": self._percentil(cubos, cuenta, 0.99),
+        }
+
+    def series(self):
+        """
+        Valores de etiquetas de todas las series observadas.
+        """
+        with self._lock:
+            return sorted(self._series)
+
+    def _percentil(self, cubos, cuenta, p):
+        objetivo = p * cuenta
+        acumulado = 0
+        for i, n in enumerate(cubos):
+            if acumulado + n >= objetivo and n:
+                if i == len(self.limites):
+                    return self.limites[-1]  # Por encima del último límite
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / n
+            acumulado += n
+        return self.limites[-1]
+
+    def _muestras(self):
+        with self._lock:
+            series = sorted(
+                (clave, list(serie.cubos), serie.suma, serie.cuenta)
+                for clave, serie in self._series.items()
+            )
+        for valores, cubos, suma, cuenta in series:
+            acumulado = 0
+            for limite, n in zip(self.limites + (float("inf"),), cubos):
+                acumulado += n
+                etiquetas = _formatear_etiquetas(
+                    self.etiquetas, valores, ("le", _formatear_numero(float(limite)))
+                )
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            etiquetas = _formatear_etiquetas(self.etiquetas, valores)
+            yield f"{self.nombre}_sum{etiquetas} {_formatear_numero(suma)}"
+            yield f"{self.nombre}_count{etiquetas} {cuenta}"
+
+
+class Indicador(_Metrica):
+    """
+    Valor instantáneo que se calcula al exportar (profundidad de una cola,
+    estado de un circuito...). `funcion` devuelve un número o, si hay
+    etiquetas, un diccionario {tupla de valores de etiquetas: número}.
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def _muestras(self):
+        try:
+            valores = self.funcion()
+        except Exception:
+            return
+        if not self.etiquetas:
+            valores = {(): valores}
+        for clave, valor in sorted(valores.items()):
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}"
+
+
+class RegistroMetricas:
+    """
+    Conjunto de métricas del proceso. Declarar dos veces una métrica con el
+    mismo nombre devuelve la misma instancia, así cada módulo declara las
+    que usa sin depender del orden de importación.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def _obtener(self, clase, nombre, *args, **kwargs):
+        with self._lock:
+            metrica = self._metricas.get(nombre)
+            if metrica is None:
+                metrica = self._metricas[nombre] = clase(nombre, *args, **kwargs)
+            elif not isinstance(metrica, clase):
+                raise ValueError(f"La métrica {nombre} ya existe con otro tipo")
+            return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._obtener(Contador, nombre, ayuda, etiquetas)
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        return self._obtener(Histograma, nombre, ayuda, etiquetas, limites)
+
+    def indicador(self, nombre, ayuda, funcion, etiquetas=()):
+        return self._obtener(Indicador, nombre, ayuda, funcion, etiquetas)
+
+    def exportar(self):
+        """
+        Devuelve todas las métricas en el formato de texto de Prometheus.
+        """
+        with self._lock:
+            metricas = sorted(self._metricas.items())
+        return "".join(metrica.exportar() + "\n" for _, metrica in metricas)
+
+    def volcar(self, ruta):
+        """
+        Escribe las métricas en un archivo de forma atómica (apto para el
+        textfile collector de node_exporter).
+        """
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(self.exportar())
+        os.replace(temporal, ruta)
+
+
+_metricas = None
+_metricas_lock = threading.Lock()
+
+
+def obtener_metricas():
+    """
+    Devuelve el registro de métricas compartido del proceso.
+    """
+    global _metricas
+    if _metricas is None:
+        with _metricas_lock:
+            if _metricas is None:
+                _metricas = RegistroMetricas()
+    return _metricas
+
+
+def medir_etapa(etapa):
+    """
+    Mide el tiempo de una etapa de la búsqueda de letras:
+    `with medir_etapa("lrclib"): ...`
+    """
+    return obtener_metricas().histograma(
+        METRICA_ETAPAS, "Duración de cada etapa de la búsqueda de letras", ["etapa"]
+    ).medir(etapa=etapa)
+
+
+def resumen_etapas():
+    """
+    Devuelve {etapa: resumen} con el tiempo observado en cada etapa.
+    """
+    histograma = obtener_metricas().histograma(
+        METRICA_ETAPAS, "Duración de cada etapa de la búsqueda de letras", ["etapa"]
+    )
+    return {etapa: histograma.resumen(etapa=etapa) for (etapa,) in histograma.series()}
+
+
+def _crear_manejador():
+    # http.server solo se importa si se activa el endpoint
+    from http.server import BaseHTTPRequestHandler
+
+    class ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = obtener_metricas().exportar().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", TIPO_CONTENIDO)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass  # Sin una línea por petición en la terminal
+
+    return ManejadorMetricas
+
+
+def iniciar_servidor(puerto, host=HOST):
+    """
+    Sirve /metrics en un hilo en segundo plano. Devuelve el servidor.
+    """
+    from http.server import ThreadingHTTPServer
+
+    servidor = ThreadingHTTPServer((host, puerto), _crear_manejador())
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return servidor
+
+
+def _volcar_periodicamente(ruta, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            obtener_metricas().volcar(ruta)
+        except OSError as e:
+            print(f"⚠️ No se pudieron volcar las métricas: {e}")
+
+
+_exportacion_activa = False
+
+
+def activar_exportacion():
+    """
+    Activa la exportación configurada en el .env: el endpoint /metrics
+    (METRICAS_PUERTO) y/o el volcado periódico y al salir a un archivo
+    (METRICAS_ARCHIVO). Sin configuración no hace nada; las métricas se
+    siguen registrando en memoria.
+    """
+    global _exportacion_activa
+    if _exportacion_activa:
+        return
+    _exportacion_activa = True
+
+    puerto = int(os.getenv("METRICAS_PUERTO", PUERTO))
+    if puerto:
+        try:
+            iniciar_servidor(puerto, os.getenv("METRICAS_HOST", HOST))
+            print(f"📈 Métricas disponibles en http://{os.getenv('METRICAS_HOST', HOST)}:{puerto}/metrics")
+        except OSError as e:
+            print(f"⚠️ No se pudo iniciar el endpoint de métricas: {e}")
+
+    ruta = os.getenv("METRICAS_ARCHIVO", ARCHIVO)
+    if ruta:
+        intervalo = float(os.getenv("METRICAS_INTERVALO_VOLCADO", INTERVALO_VOLCADO))
+        threading.Thread(
+            target=_volcar_periodicamente, args=(ruta, intervalo), name="metricas-volcado", daemon=True
+        ).start()
+        atexit.register(obtener_metricas().volcar, ruta)
@@ -0,0 +1,220 @@
+"""
+Cola de reproducción del karaoke con precarga de las siguientes canciones.
+
+Mientras suena una canción, un pool de hilos resuelve en segundo plano la
+letra (etiquetas, duración, proveedores y alineación con el audio) de las
+próximas COLA_ADELANTO entradas, así la siguiente empieza al instante. Las
+peticiones de la precarga son de fondo: una búsqueda interactiva pasa
+antes. Si la cola cambia, lo que ya no está entre las próximas se cancela.
+"""
+import contextvars
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from lyrics_finder import obtener_letra_sincronizada
+from metrics import obtener_metricas
+from request_scheduler import FONDO, prioridad
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+ADELANTO = 2  # Canciones que se preparan por adelantado
+
+# Estados de una entrada de la cola
+EN_ESPERA = "en_espera"
+PREPARANDO = "preparando"
+LISTA = "lista"
+SIN_LETRA = "sin_letra"
+ERROR = "error"
+
+CancionPreparada = namedtuple("CancionPreparada", ["pista", "letras", "fuente", "esperada"])
+
+_inicios = obtener_metricas().contador(
+    "sound_lyrics_cola_inicios_total",
+    "Canciones de la cola según cómo estaba su letra al empezar (lista, preparando, en_espera...)",
+    ["estado"],
+)
+_canceladas = obtener_metricas().contador(
+    "sound_lyrics_cola_precargas_canceladas_total",
+    "Precargas de la cola canceladas porque la cola cambió",
+)
+
+# La precarga no escribe en la terminal (el karaoke la ocupa). Es una
+# variable de contexto para que la hereden los hilos de los proveedores
+_silencio = contextvars.ContextVar("silencio_cola", default=False)
+
+
+class _SalidaSilenciable:
+    """
+    Envoltorio de sys.stdout que descarta lo que se escribe desde la
+    precarga y deja pasar lo demás.
+    """
+
+    def __init__(self, destino):
+        self.destino = destino
+
+    def write(self, texto):
+        if _silencio.get():
+            return len(texto)
+        return self.destino.write(texto)
+
+    def flush(self):
+        if not _silencio.get():
+            self.destino.flush()
+
+    def __getattr__(self, nombre):
+        return getattr(self.destino, nombre)
+
+
+class _Entrada:
+    __slots__ = ("pista", "futuro")
+
+    def __init__(self, pista):
+        self.pista = pista
+        self.futuro = None
+
+
+def _resolver(pista):
+    _silencio.set(True)
+    with prioridad(FONDO):
+        return obtener_letra_sincronizada(pista.ruta, pista)
+
+
+class ColaReproduccion:
+    """
+    Cola de pistas (PistaBiblioteca) que prepara por adelantado la letra de
+    las próximas `adelanto` entradas. Cada cambio (añadir, quitar, mover o
+    vaciar) vuelve a planificar: se lanzan las que han entrado entre las
+    próximas y se cancelan las que han salido. Una precarga que ya está en
+    marcha no se interrumpe; su resultado queda en la caché.
+    """
+
+    def __init__(self, adelanto=None):
+        self.adelanto = adelanto if adelanto is not None else int(os.getenv("COLA_ADELANTO", ADELANTO))
+        self._entradas = []
+        self._lock = threading.Lock()
+        self._pool = None
+        if self.adelanto > 0:
+            self._pool = ThreadPoolExecutor(max_workers=self.adelanto, thread_name_prefix="cola")
+            # Se queda instalada: una precarga en marcha puede acabar
+            # después de cerrar la cola
+            if not isinstance(sys.stdout, _SalidaSilenciable):
+                sys.stdout = _SalidaSilenciable(sys.stdout)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # --- Cambios en la cola ---
+
+    def agregar(self, pista):
+        with self._lock:
+            self._entradas.append(_Entrada(pista))
+            self._planificar()
+
+    def quitar(self, indice):
+        """
+        Quita la entrada en la posición `indice` (desde 0) y la devuelve.
+        """
+        with self._lock:
+            entrada = self._entradas.pop(indice)
+            self._cancelar(entrada)
+            self._planificar()
+        return entrada.pista
+
+    def mover(self, origen, destino):
+        with self._lock:
+            self._entradas.insert(destino, self._entradas.pop(origen))
+            self._planificar()
+
+    def vaciar(self):
+        with self._lock:
+            for entrada in self._entradas:
+                self._cancelar(entrada)
+            self._entradas.clear()
+
+    def pistas(self):
+        """
+        Devuelve [(pista, estado)] en el orden de la cola.
+        """
+        with self._lock:
+            return [(entrada.pista, _estado(entrada)) for entrada in self._entradas]
+
+    # --- Reproducción ---
+
+    def siguiente(self):
+        """
+        Saca la primera entrada y devuelve su CancionPreparada (o None si la
+        cola está vacía). Si su letra aún se está preparando se espera a
+        que termine; si no se había empezado o la precarga no la consiguió
+        (la prioridad de fondo puede quedarse sin cuota, sin turno o con el
+        circuito abierto), se resuelve ahora con prioridad interactiva: un
+        "no hay letra" definitivo sale al instante de la caché. Al sacarla
+        se empieza a preparar la que entra entre las próximas.
+        """
+        with self._lock:
+            if not self._entradas:
+                return None
+            entrada = self._entradas.pop(0)
+            estado = _estado(entrada)
+            self._planificar()
+        _inicios.inc(estado=estado)
+
+        letras = fuente = None
+        if entrada.futuro is not None:
+            try:
+                letras, fuente = entrada.futuro.result()
+            except CancelledError:
+                pass
+            except Exception as e:
+                print(f"⚠️ Falló la preparación de '{os.path.basename(entrada.pista.ruta)}': {e}")
+        if not letras:
+            letras, fuente = obtener_letra_sincronizada(entrada.pista.ruta, entrada.pista)
+        return CancionPreparada(entrada.pista, letras, fuente, estado in (EN_ESPERA, PREPARANDO))
+
+    def cerrar(self):
+        """
+        Cancela las precargas pendientes; las que están en marcha terminan
+        en segundo plano y dejan su resultado en la caché.
+        """
+        self.vaciar()
+        if self._pool is not None:
+            # vaciar() ya canceló las pendientes de la cola (cancel_futures
+            # de shutdown no existe hasta Python 3.9)
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # --- Planificación (con el lock tomado) ---
+
+    def _planificar(self):
+        if self._pool is None:
+            return
+        for posicion, entrada in enumerate(self._entradas):
+            if posicion < self.adelanto:
+                if entrada.futuro is None:
+                    entrada.futuro = self._pool.submit(_resolver, entrada.pista)
+            else:
+                self._cancelar(entrada)
+
+    def _cancelar(self, entrada):
+        if entrada.futuro is not None and entrada.futuro.cancel():
+            entrada.futuro = None
+            _canceladas.inc()
+
+
+def _estado(entrada):
+    futuro = entrada.futuro
+    if futuro is None or futuro.cancelled():
+        return EN_ESPERA
+    if not futuro.done():
+        return PREPARANDO
+    if futuro.exception() is not None:
+        return ERROR
+    letras, _ = futuro.result()
+    return LISTA if letras else SIN_LETRA
@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from env_config import cargar_entorno
+from library_index import obtener_indice
+from lyrics_finder import configurar_concurrencia_proveedores, obtener_letra_sincronizada
+from metrics import activar_exportacion, obtener_metricas, resumen_etapas
+from request_scheduler import FONDO, PLANIFICADORES, prioridad
+
+# Hilos de trabajo por defecto para la precarga
+MAX_WORKERS = 8
+
+
+def listar_archivos_audio(carpeta):
+    """
+    Devuelve las rutas de los archivos de audio de la carpeta indicada
+    (incluidas las subcarpetas), actualizando el índice de la biblioteca.
+    """
+    if not os.path.isdir(carpeta):
+        return []
+    indice = obtener_indice()
+    indice.escanear(carpeta)
+    return [pista.ruta for pista in indice.pistas(carpeta)]
+
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100.0 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def _resolver(ruta):
+    """
+    Resuelve la letra de un archivo y mide cuánto tarda. Sus peticiones
+    son de fondo: cualquier búsqueda interactiva pasa antes. Si ningún
+    proveedor responde cuenta como error, no como canción sin letra.
+    """
+    inicio = time.perf_counter()
+    try:
+        with prioridad(FONDO):
+            letras, fuente = obtener_letra_sincronizada(ruta, obtener_indice().buscar(ruta), estricto=True)
+        error = None
+    except Exception as e:
+        letras, fuente, error = None, None, str(e)
+    return ruta, bool(letras), fuente, error, time.perf_counter() - inicio
+
+
+def precargar_biblioteca(
+    rutas, max_workers=MAX_WORKERS, lrclib_concurrencia=None, audd_concurrencia=None, salida=None
+):
+    """
+    Resuelve en paralelo las letras de todos los archivos indicados para
+    dejarlas en la caché local. Devuelve un diccionario con el resumen.
+
+    La salida detallada de cada búsqueda se descarta; el progreso se muestra
+    en `salida` (por defecto, la salida estándar original).
+    """
+    salida = salida or sys.stdout
+    configurar_concurrencia_proveedores(lrclib=lrclib_concurrencia, audd=audd_concurrencia)
+
+    resumen = {
+        "total": len(rutas),
+        "encontradas": 0,
+        "sin_letra": 0,
+        "errores": 0,
+        "por_fuente": {},
+        "latencias": [],
+        "fallidas": [],
+    }
+    lock = threading.Lock()
+    inicio = time.perf_counter()
+
+    # Las búsquedas imprimen mucho; en modo lote se descarta su salida (sin
+    # acumularla en memoria)
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futuros = [pool.submit(_resolver, ruta) for ruta in rutas]
+            for n, futuro in enumerate(as_completed(futuros), start=1):
+                ruta, encontrada, fuente, error, latencia = futuro.result()
+                with lock:
+                    resumen["latencias"].append(latencia)
+                    if error:
+                        resumen["errores"] += 1
+                        resumen["fallidas"].append((ruta, error))
+                    elif encontrada:
+                        resumen["encontradas"] += 1
+                        resumen["por_fuente"][fuente] = resumen["por_fuente"].get(fuente, 0) + 1
+                    else:
+                        resumen["sin_letra"] += 1
+                        resumen["fallidas"].append((ruta, "sin letra"))
+                marca = "✅" if encontrada else ("💥" if error else "❌")
+                salida.write(f"[{n}/{len(rutas)}] {marca} {os.path.basename(ruta)} ({latencia:.2f}s)\n")
+                salida.flush()
+
+    resumen["duracion_total"] = time.perf_counter() - inicio
+    resumen["proveedores"] = {nombre: p.estado() for nombre, p in sorted(PLANIFICADORES.items())}
+    return resumen
+
+
+def imprimir_resumen(resumen):
+    """
+    Muestra el resumen de una precarga: aciertos, fallos y latencias.
+    """
+    latencias = sorted(resumen["latencias"])
+    print("=" * 60)
+    print("📊 RESUMEN DE PRECARGA")
+    print("=" * 60)
+    print(f"🎵 Archivos procesados: {resumen['total']}")
+    print(f"✅ Con letra: {resumen['encontradas']}")
+    for fuente, cantidad in sorted(resumen["por_fuente"].items()):
+        print(f"   • {fuente}: {cantidad}")
+    print(f"❌ Sin letra: {resumen['sin_letra']}")
+    print(f"💥 Errores: {resumen['errores']}")
+    if latencias:
+        print(
+            "⏱️ Latencia por canción: "
+            f"p50={_percentil(latencias, 50):.2f}s "
+            f"p95={_percentil(latencias, 95):.2f}s "
+            f"máx={latencias[-1]:.2f}s"
+        )
+    print(f"⏱️ Tiempo total: {resumen.get('duracion_total', 0.0):.1f}s")
+    for nombre, estado in resumen.get("proveedores", {}).items():
+        limite = f" de {estado['cuota_diaria']}" if estado["cuota_diaria"] else ""
+        agotada = " (agotada)" if estado["cuota_agotada"] else ""
+        print(f"🚦 {nombre}: {estado['cuota_usada']}{limite} peticiones hoy{agotada}")
+    etapas = resumen_etapas()
+    if etapas:
+        print("-" * 60)
+        print("⏱️ Tiempo por etapa (estimado desde los histogramas):")
+        print(f"   {'etapa':<22}{'n':>7}{'media':>10}{'p95':>10}{'total':>10}")
+        for etapa, datos in sorted(etapas.items(), key=lambda e: -e[1]["suma"]):
+            print(
+                f"   {etapa:<22}{datos['cuenta']:>7}{datos['media'] * 1000:>8.1f}ms"
+                f"{datos['p95'] * 1000:>8.1f}ms{datos['suma']:>9.1f}s"
+            )
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precarga en paralelo las letras de una carpeta de audio.")
+    parser.add_argument("carpeta", nargs="?", default="sounds", help="Carpeta con los archivos de audio")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Hilos de trabajo")
+    parser.add_argument("--lrclib", type=int, default=None, help="Peticiones simultáneas máximas a LRCLIB")
+    parser.add_argument("--audd", type=int, default=None, help="Peticiones simultáneas máximas a Audd.io")
+    parser.add_argument("--metricas", help="Guardar las métricas al terminar (formato texto de Prometheus)")
+    args = parser.parse_args()
+    cargar_entorno()
+    activar_exportacion()
+
+    rutas = listar_archivos_audio(args.carpeta)
+    if not rutas:
+        print(f"❌ No hay archivos de audio en '{args.carpeta}'.")
+        return 1
+
+    print(f"⚡ Precargando {len(rutas)} canciones con {args.workers} hilos...")
+    resumen = precargar_biblioteca(rutas, args.workers, args.lrclib, args.audd)
+    imprimir_resumen(resumen)
+    if args.metricas:
+        obtener_metricas().volcar(args.metricas)
+        print(f"📈 Métricas guardadas en {args.metricas}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import obtener_metricas
+
+# Estrategias para combinar proveedores
+SECUENCIAL = "secuencial"  # Uno tras otro, el siguiente solo si el anterior falla
+COBERTURA = "cobertura"  # El siguiente arranca también si el anterior tarda más del umbral
+CARRERA = "carrera"  # Todos a la vez; gana el preferido entre los que aciertan
+ESTRATEGIAS = (SECUENCIAL, COBERTURA, CARRERA)
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+ESTRATEGIA = SECUENCIAL
+UMBRAL_COBERTURA = 2.0  # Segundos antes de lanzar el siguiente proveedor
+GRACIA_PREFERIDO = 0.5  # Espera extra a un proveedor preferido aún en curso
+TIMEOUT = 20.0  # Tiempo máximo por proveedor, reintentos incluidos
+REINTENTOS = 1
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 5.0
+FALLOS_APERTURA = 5  # Fallos seguidos que abren el circuito
+ENFRIAMIENTO = 30.0  # Segundos con el circuito abierto antes de volver a probar
+HILOS = 16
+
+# `definitivo` es True si hay letras o si todos los proveedores respondieron
+# que no las tienen (sin errores, timeouts ni circuitos abiertos): solo
+# entonces se puede guardar el resultado negativo en la caché
+ResultadoEstrategia = namedtuple("ResultadoEstrategia", ["letras", "fuente", "definitivo"])
+
+_llamadas = obtener_metricas().contador(
+    "sound_lyrics_proveedor_llamadas_total",
+    "Llamadas a cada proveedor según el resultado "
+    "(exito, reintento, error, timeout, sin_turno o circuito_abierto)",
+    ["proveedor", "resultado"],
+)
+
+
+class Llamada:
+    """
+    Llamada lanzada por la estrategia: hasta cuándo puede esperar turno en
+    la cola local (`plazo`, en time.monotonic) y cuándo salió su primera
+    petición al proveedor. El timeout del proveedor cuenta desde el envío:
+    la espera en la cola local no es culpa del proveedor.
+    """
+
+    __slots__ = ("plazo", "enviada_en", "_cerrada", "_lock")
+
+    def __init__(self, plazo):
+        self.plazo = plazo
+        self.enviada_en = None
+        self._cerrada = False
+        self._lock = threading.Lock()
+
+    @property
+    def cerrada(self):
+        return self._cerrada
+
+    def cerrar(self):
+        """
+        Marca la llamada como terminada y devuelve True solo la primera vez.
+        Quien la cierra (el hilo que la ejecuta al acabar o la estrategia al
+        abandonarla) es quien la cuenta en el circuit breaker: cada llamada
+        cuenta una sola vez.
+        """
+        with self._lock:
+            if self._cerrada:
+                return False
+            self._cerrada = True
+            return True
+
+
+# Llamada en curso en este contexto (la estrategia la fija en sus hilos)
+_llamada = contextvars.ContextVar("llamada_proveedor", default=None)
+
+
+def plazo_llamada():
+    """
+    Instante (time.monotonic) hasta el que la llamada en curso puede
+    esperar turno antes de enviar su petición, o None si no tiene plazo.
+    """
+    llamada = _llamada.get()
+    return llamada.plazo if llamada is not None else None
+
+
+def marcar_envio():
+    """
+    Indica que la petición de la llamada en curso sale ya hacia el
+    proveedor: desde aquí corre su timeout.
+    """
+    llamada = _llamada.get()
+    if llamada is not None and llamada.enviada_en is None:
+        llamada.enviada_en = time.monotonic()
+
+
+def _cerrar(llamada):
+    # Sin estrategia (llamada None) no hay nadie más que la cuente
+    return llamada is None or llamada.cerrar()
+
+
+class CircuitoAbierto(Exception):
+    """
+    El proveedor tiene el circuito abierto y no se le envían peticiones.
+    """
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un proveedor tras varios fallos seguidos. Pasado el
+    enfriamiento deja pasar una sola llamada de prueba (semiabierto): si
+    funciona se cierra y si falla se vuelve a abrir.
+    """
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, fallos_apertura=FALLOS_APERTURA, enfriamiento=ENFRIAMIENTO, reloj=time.monotonic):
+        self.fallos_apertura = fallos_apertura
+        self.enfriamiento = enfriamiento
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_en = None
+        self._prueba_en_curso = False
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado()
+
+    def _estado(self):
+        if self._abierto_en is None:
+            return self.CERRADO
+        if self._reloj() - self._abierto_en >= self.enfriamiento:
+            return self.SEMIABIERTO
+        return self.ABIERTO
+
+    def permitir(self):
+        """
+        Indica si se puede llamar al proveedor (y reserva la llamada de
+        prueba cuando el circuito está semiabierto).
+        """
+        with self._lock:
+            estado = self._estado()
+            if estado == self.CERRADO:
+                return True
+            if estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._abierto_en = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._prueba_en_curso or self._fallos >= self.fallos_apertura:
+                self._abierto_en = self._reloj()
+            self._prueba_en_curso = False
+
+    def liberar_prueba(self):
+        """
+        La llamada de prueba terminó sin decir nada del proveedor (un error
+        de la consulta): la siguiente llamada puede volver a probar.
+        """
+        with self._lock:
+            self._prueba_en_curso = False
+
+
+class Proveedor:
+    """
+    Configuración de un proveedor de letras: timeout total, reintentos con
+    backoff exponencial y jitter, y su circuit breaker (compartido entre
+    todas las consultas del proceso).
+    """
+
+    def __init__(
+        self,
+        nombre,
+        timeout=TIMEOUT,
+        reintentos=REINTENTOS,
+        backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX,
+        breaker=None,
+        errores_definitivos=(),
+        errores_locales=(),
+    ):
+        self.nombre = nombre
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        # Errores de la consulta y no del proveedor: ni se reintentan ni
+        # cuentan para el circuit breaker
+        self.errores_definitivos = tuple(errores_definitivos)
+        # Errores de este proceso (p. ej. sin turno a tiempo en la cola
+        # local): no se ha llamado al proveedor, así que tampoco cuentan
+        self.errores_locales = tuple(errores_locales)
+
+    @classmethod
+    def desde_entorno(cls, nombre, timeout=TIMEOUT, reintentos=REINTENTOS, errores_definitivos=(),
+                      errores_locales=()):
+        """
+        Crea el proveedor leyendo <NOMBRE>_TIMEOUT y <NOMBRE>_REINTENTOS,
+        y CIRCUITO_FALLOS / CIRCUITO_ENFRIAMIENTO para el breaker.
+        """
+        prefijo = nombre.upper()
+        breaker = CircuitBreaker(
+            int(os.getenv("CIRCUITO_FALLOS", FALLOS_APERTURA)),
+            float(os.getenv("CIRCUITO_ENFRIAMIENTO", ENFRIAMIENTO)),
+        )
+        return cls(
+            nombre,
+            timeout=float(os.getenv(f"{prefijo}_TIMEOUT", timeout)),
+            reintentos=int(os.getenv(f"{prefijo}_REINTENTOS", reintentos)),
+            breaker=breaker,
+            errores_definitivos=errores_definitivos,
+            errores_locales=errores_locales,
+        )
+
+    def ejecutar(self, funcion, *args):
+        """
+        Llama a funcion(*args) reintentando si lanza una excepción. Un
+        resultado sin letras no es un fallo y no se reintenta.
+
+        El timeout (reintentos incluidos) cuenta desde que sale la primera
+        petición, no durante la espera de turno. Si la estrategia ya
+        abandonó la llamada, ni se reintenta ni cuenta otra vez en el
+        circuit breaker.
+        """
+        llamada = _llamada.get()
+        inicio = time.monotonic()
+        for intento in range(self.reintentos + 1):
+            try:
+                resultado = funcion(*args)
+            except self.errores_definitivos:
+                if _cerrar(llamada):
+                    self.breaker.liberar_prueba()
+                raise
+            except self.errores_locales:
+                if _cerrar(llamada):
+                    self.breaker.liberar_prueba()
+                    _llamadas.inc(proveedor=self.nombre, resultado="sin_turno")
+                raise
+            except Exception as e:
+                error = e
+            else:
+                if _cerrar(llamada):
+                    self.breaker.registrar_exito()
+                    _llamadas.inc(proveedor=self.nombre, resultado="exito")
+                return resultado
+            # Backoff exponencial con jitter completo
+            espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+            enviada_en = llamada.enviada_en if llamada is not None else None
+            limite = (enviada_en or inicio) + self.timeout
+            if intento == self.reintentos or time.monotonic() + espera >= limite:
+                break
+            if llamada is not None and llamada.cerrada:
+                break
+            _llamadas.inc(proveedor=self.nombre, resultado="reintento")
+            time.sleep(espera)
+        if _cerrar(llamada):
+            self.breaker.registrar_fallo()
+            _llamadas.inc(proveedor=self.nombre, resultado="error")
+        raise error
+
+
+class EstrategiaProveedores:
+    """
+    Resuelve una canción con varios proveedores en orden de preferencia,
+    según la estrategia: secuencial, cobertura (hedging) o carrera.
+    """
+
+    def __init__(self, estrategia=None, umbral_cobertura=None, gracia=None, hilos=None):
+        self.estrategia = (estrategia or os.getenv("PROVEEDORES_ESTRATEGIA", ESTRATEGIA)).lower()
+        if self.estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia desconocida: {self.estrategia}")
+        self.umbral_cobertura = umbral_cobertura if umbral_cobertura is not None else float(
+            os.getenv("PROVEEDORES_UMBRAL_COBERTURA", UMBRAL_COBERTURA)
+        )
+        self.gracia = gracia if gracia is not None else float(
+            os.getenv("PROVEEDORES_GRACIA", GRACIA_PREFERIDO)
+        )
+        self._pool = ThreadPoolExecutor(
+            max_workers=hilos or int(os.getenv("PROVEEDORES_HILOS", HILOS)),
+            thread_name_prefix="proveedor",
+        )
+
+    def resolver(self, tareas):
+        """
+        `tareas` es una lista de (proveedor, funcion, args) en orden de
+        preferencia; cada funcion devuelve (letras, fuente) o (None, None)
+        si el proveedor no tiene la canción. Devuelve un ResultadoEstrategia.
+        """
+        pendientes = {}  # futuro -> (índice, Llamada)
+        resultados = {}  # índice -> (letras, fuente) o excepción
+        siguiente = 0
+        ultimo_lanzamiento = time.monotonic()
+        primer_acierto = None
+
+        def lanzar():
+            nonlocal siguiente, ultimo_lanzamiento
+            while siguiente < len(tareas):
+                indice = siguiente
+                proveedor, funcion, args = tareas[indice]
+                siguiente += 1
+                if not proveedor.breaker.permitir():
+                    _llamadas.inc(proveedor=proveedor.nombre, resultado="circuito_abierto")
+                    resultados[indice] = CircuitoAbierto(proveedor.nombre)
+                    continue
+                # Con el contexto de quien resuelve (p. ej. la prioridad de sus
+                # peticiones) y el plazo para conseguir turno en la cola local
+                ultimo_lanzamiento = time.monotonic()
+                llamada = Llamada(ultimo_lanzamiento + proveedor.timeout)
+                contexto = contextvars.copy_context()
+                contexto.run(_llamada.set, llamada)
+                futuro = self._pool.submit(contexto.run, proveedor.ejecutar, funcion, *args)
+                pendientes[futuro] = (indice, llamada)
+                return
+
+        lanzar()
+        if self.estrategia == CARRERA:
+            while siguiente < len(tareas):
+                lanzar()
+
+        while True:
+            ahora = time.monotonic()
+            aciertos = [i for i, r in resultados.items() if isinstance(r, tuple) and r[0]]
+            if aciertos:
+                mejor = min(aciertos)
+                if primer_acierto is None:
+                    primer_acierto = ahora
+                # Esperar un poco a un proveedor preferido que siga en curso
+                preferido_en_curso = any(i < mejor for i, _ in pendientes.values())
+                if not preferido_en_curso or ahora - primer_acierto >= self.gracia:
+                    letras, fuente = resultados[mejor]
+                    return ResultadoEstrategia(letras, fuente, True)
+
+            if not pendientes:
+                if siguiente >= len(tareas):
+                    definitivo = all(isinstance(r, tuple) for r in resultados.values())
+                    return ResultadoEstrategia(None, None, definitivo)
+                lanzar()
+                continue
+
+            # Próximo instante en el que hay que decidir algo
+            plazos = [self._plazo(tareas[i][0], llamada) for i, llamada in pendientes.values()]
+            if self.estrategia == COBERTURA and siguiente < len(tareas):
+                plazos.append(ultimo_lanzamiento + self.umbral_cobertura)
+            if primer_acierto is not None:
+                plazos.append(primer_acierto + self.gracia)
+            espera = max(min(plazos) - ahora, 0)
+
+            terminados, _ = wait(list(pendientes), timeout=espera, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                indice, _ = pendientes.pop(futuro)
+                try:
+                    resultados[indice] = futuro.result()
+                except Exception as e:
+                    resultados[indice] = e
+
+            ahora = time.monotonic()
+            for futuro, (indice, llamada) in list(pendientes.items()):
+                proveedor = tareas[indice][0]
+                if ahora < self._plazo(proveedor, llamada):
+                    continue
+                if not llamada.cerrar():
+                    # Acaba de terminar: su resultado llega por el futuro
+                    continue
+                # Se abandona (el hilo termina por su cuenta y ya no cuenta
+                # en el circuit breaker)
+                del pendientes[futuro]
+                if llamada.enviada_en is None:
+                    # Sigue en la cola local, que lo dejará sin turno al
+                    # llegar el plazo: no se envía nada ni cuenta como fallo
+                    proveedor.breaker.liberar_prueba()
+                    _llamadas.inc(proveedor=proveedor.nombre, resultado="sin_turno")
+                    resultados[indice] = TimeoutError(f"{proveedor.nombre}: sin turno a tiempo")
+                else:
+                    proveedor.breaker.registrar_fallo()
+                    _llamadas.inc(proveedor=proveedor.nombre, resultado="timeout")
+                    resultados[indice] = TimeoutError(f"{proveedor.nombre}: timeout")
+
+            if (
+                self.estrategia == COBERTURA
+                and siguiente < len(tareas)
+                and ahora >= ultimo_lanzamiento + self.umbral_cobertura
+            ):
+                lanzar()
+
+    @staticmethod
+    def _plazo(proveedor, llamada):
+        if llamada.enviada_en is None:
+            return llamada.plazo
+        return llamada.enviada_en + proveedor.timeout
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False)
+
+
+_estrategia = None
+_estrategia_lock = threading.Lock()
+
+
+def obtener_estrategia():
+    """
+    Devuelve la estrategia compartida configurada en el .env (se crea al primer uso).
+    """
+    global _estrategia
+    if _estrategia is None:
+        with _estrategia_lock:
+            if _estrategia is None:
+                _estrategia = EstrategiaProveedores()
+    return _estrategia
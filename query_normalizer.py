@@ -0,0 +1,225 @@
+"""
+Normalización de consultas: artista y título tal como llegan de las
+etiquetas o del nombre del archivo ("Song (Remastered 2011) [Official
+Video]", "Artist feat. X") se limpian antes de preguntar a los proveedores
+y se reducen a una clave canónica, así las variantes de una misma canción
+comparten caché, paquete y peticiones en curso.
+
+Los alias de artistas se leen de ARTIST_ALIASES_FILE (JSON con
+{"alias": "nombre canónico"}), si existe.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+from difflib import SequenceMatcher
+
+from metrics import obtener_metricas
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+ALIAS_FILE = "artist_aliases.json"
+MEMO_MAX = 4096  # Consultas normalizadas que se recuerdan (LRU)
+SIMILITUD_MINIMA = 0.5  # Parecido mínimo del título para aceptar un resultado de búsqueda
+TOLERANCIA_DURACION = 10.0  # Segundos de diferencia a partir de los que la duración no puntúa
+
+# Pesos de la puntuación de un resultado de búsqueda
+_PESO_TITULO = 0.6
+_PESO_ARTISTA = 0.2
+_PESO_DURACION = 0.2
+
+ConsultaNormalizada = namedtuple("ConsultaNormalizada", ["artista", "titulo", "clave"])
+
+# Lo que acompaña al título sin cambiar la canción: reediciones, directos,
+# vídeos, artistas invitados...
+_RUIDO = (
+    r"re-?master(?:ed)?|remasterizad[oa]|live|en vivo|en directo|directo|official|oficial|"
+    r"video|vídeo|videoclip|audio|lyrics?|letra|visuali[sz]er|hd|hq|4k|explicit|clean|"
+    r"radio edit|single version|album version|mono|stereo|bonus track|feat\.?|ft\.|featuring"
+)
+_GRUPO_RUIDO = re.compile(rf"\s*[\(\[][^\(\)\[\]]*\b(?:{_RUIDO})(?![\w])[^\(\)\[\]]*[\)\]]", re.IGNORECASE)
+_SUFIJO_RUIDO = re.compile(
+    r"\s+[-–—]\s+[^-–—]*\b(?:re-?master(?:ed)?|remasterizad[oa]|live|en vivo|en directo|"
+    r"radio edit|single version|album version|mono|stereo)\b[^-–—]*$",
+    re.IGNORECASE,
+)
+_INVITADOS = re.compile(r"\s+(?:feat\.?|ft\.|featuring)\s+.*$", re.IGNORECASE)
+_NO_ALFANUMERICO = re.compile(r"[\W_]+")
+_APOSTROFOS = str.maketrans("", "", "'’`´")
+
+_memo_consultas = obtener_metricas().contador(
+    "sound_lyrics_normalizacion_memo_total",
+    "Consultas normalizadas servidas desde la memoria (acierto) o calculadas (fallo)",
+    ["resultado"],
+)
+
+
+class MemoLRU:
+    """
+    Diccionario acotado con desalojo del menos usado, seguro entre hilos.
+    El tamaño se lee de QUERY_MEMO_MAX al primer uso.
+    """
+
+    def __init__(self, maximo=None):
+        self._maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def obtener(self, clave, calcular):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                _memo_consultas.inc(resultado="acierto")
+                return self._datos[clave]
+        valor = calcular()
+        _memo_consultas.inc(resultado="fallo")
+        with self._lock:
+            if self._maximo is None:
+                self._maximo = max(int(os.getenv("QUERY_MEMO_MAX", MEMO_MAX)), 1)
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self._maximo:
+                self._datos.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+_plegados = MemoLRU()
+_consultas = MemoLRU()
+
+_alias = None
+_alias_lock = threading.Lock()
+
+
+def plegar(texto):
+    """
+    Minúsculas, sin acentos y con los espacios colapsados.
+    """
+    if not texto:
+        return ""
+    texto = str(texto)
+    return _plegados.obtener(texto, lambda: _plegar(texto))
+
+
+def _plegar(texto):
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto.casefold()).strip()
+
+
+def _canonico(texto):
+    """
+    Forma para comparar: plegado y sin signos de puntuación.
+    """
+    return _NO_ALFANUMERICO.sub(" ", plegar(texto).translate(_APOSTROFOS)).strip()
+
+
+def alias_artistas():
+    """
+    Tabla de alias (clave canónica del alias -> nombre canónico), cargada
+    una vez desde ARTIST_ALIASES_FILE.
+    """
+    global _alias
+    if _alias is None:
+        with _alias_lock:
+            if _alias is None:
+                ruta = os.getenv("ARTIST_ALIASES_FILE", ALIAS_FILE)
+                alias = {}
+                if ruta and os.path.exists(ruta):
+                    try:
+                        with open(ruta, encoding="utf-8") as f:
+                            datos = json.load(f)
+                        alias = {_canonico(k): str(v) for k, v in datos.items() if _canonico(k) and v}
+                    except (OSError, ValueError, AttributeError) as e:
+                        print(f"⚠️ No se pudieron leer los alias de artistas de '{ruta}': {e}")
+                _alias = alias
+    return _alias
+
+
+def limpiar_titulo(titulo):
+    """
+    Quita del título lo que no cambia la canción: "(Remastered 2011)",
+    "[Official Video]", "- Live at Wembley", "feat. X"...
+    """
+    titulo = (titulo or "").strip()
+    limpio = _GRUPO_RUIDO.sub("", titulo)
+    limpio = _SUFIJO_RUIDO.sub("", limpio)
+    limpio = _INVITADOS.sub("", limpio).strip(" -–—")
+    return limpio or titulo
+
+
+def limpiar_artista(artista):
+    """
+    Quita los artistas invitados y aplica la tabla de alias.
+    """
+    artista = (artista or "").strip()
+    limpio = _INVITADOS.sub("", _GRUPO_RUIDO.sub("", artista)).strip() or artista
+    return alias_artistas().get(_canonico(limpio), limpio)
+
+
+def normalizar_consulta(artista, titulo):
+    """
+    Devuelve la ConsultaNormalizada (artista y título limpios para enviar a
+    los proveedores y clave canónica "artista|titulo"). Se memoriza.
+    """
+    clave = (artista or "", titulo or "")
+    return _consultas.obtener(clave, lambda: _normalizar_consulta(*clave))
+
+
+def _normalizar_consulta(artista, titulo):
+    artista = limpiar_artista(artista)
+    titulo = limpiar_titulo(titulo)
+    return ConsultaNormalizada(artista, titulo, f"{_canonico(artista)}|{_canonico(titulo)}")
+
+
+def clave_consulta(artista, titulo):
+    """
+    Clave canónica de una canción: la misma para todas sus variantes.
+    """
+    return normalizar_consulta(artista, titulo).clave
+
+
+def similitud(a, b):
+    """
+    Parecido entre 0 y 1 de dos textos ya limpios, sin tener en cuenta
+    mayúsculas, acentos ni puntuación.
+    """
+    a, b = _canonico(a), _canonico(b)
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def puntuar_resultado(consulta, titulo, artista=None, duracion_resultado=None, duracion=None):
+    """
+    Puntúa un resultado de búsqueda frente a la consulta: sobre todo por el
+    parecido del título y, en menor medida, del artista (el de cualquiera
+    de los que firman) y la cercanía de la duración. Devuelve None si el
+    título no se parece lo bastante.
+    """
+    parecido_titulo = similitud(consulta.titulo, limpiar_titulo(titulo))
+    if parecido_titulo < float(os.getenv("QUERY_SIMILITUD_MINIMA", SIMILITUD_MINIMA)):
+        return None
+    if consulta.artista and artista:
+        parecido_artista = max(
+            similitud(consulta.artista, limpiar_artista(parte))
+            for parte in re.split(r"\s*[;,/&]\s*|\s+(?:feat\.?|ft\.|featuring|x|y|and)\s+", artista)
+            + [artista]
+            if parte
+        )
+    else:
+        parecido_artista = 0.5
+    if duracion and duracion_resultado:
+        cercania = max(0.0, 1.0 - abs(duracion_resultado - duracion) / TOLERANCIA_DURACION)
+    else:
+        cercania = 0.5
+    return _PESO_TITULO * parecido_titulo + _PESO_ARTISTA * parecido_artista + _PESO_DURACION * cercania
@@ -0,0 +1,451 @@
+import contextlib
+import contextvars
+import datetime
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import obtener_metricas
+
+# Clases de prioridad: la de número menor pasa antes
+INTERACTIVA = 0  # Alguien espera la respuesta (menú, CLI, servicio, pantallas)
+FONDO = 1  # Precargas y lotes
+NOMBRES_PRIORIDAD = {INTERACTIVA: "interactiva", FONDO: "fondo"}
+
+# Configuración por defecto (se puede sobreescribir desde el archivo .env)
+QUOTA_FILE = "provider_quota.sqlite3"
+RESERVA_INTERACTIVA = 0.2  # Parte de la cuota diaria que el trabajo de fondo no puede gastar
+ESPERA_LIMITE = 30.0  # Pausa tras un 429 sin cabecera Retry-After
+
+# Prioridad de las peticiones del contexto actual; la estrategia de
+# proveedores copia el contexto a sus hilos, así que basta con fijarla
+# alrededor de la búsqueda
+_prioridad = contextvars.ContextVar("prioridad", default=INTERACTIVA)
+
+_metricas = obtener_metricas()
+_esperas = _metricas.histograma(
+    "sound_lyrics_planificador_espera_segundos",
+    "Tiempo de espera de cada petición hasta tener turno por proveedor y prioridad",
+    ["proveedor", "prioridad"],
+)
+_rechazos = _metricas.contador(
+    "sound_lyrics_planificador_rechazos_total",
+    "Peticiones frenadas por el proveedor (limite_429) o no enviadas por falta de cuota (cuota) "
+    "o de turno a tiempo (plazo)",
+    ["proveedor", "motivo"],
+)
+
+
+class CuotaAgotada(Exception):
+    """
+    La cuota diaria del proveedor está agotada (para esa prioridad).
+    """
+
+
+class SinTurno(Exception):
+    """
+    La petición no consiguió turno en la cola local antes de su plazo; no
+    se ha enviado nada al proveedor.
+    """
+
+
+@contextlib.contextmanager
+def prioridad(clase):
+    """
+    Fija la prioridad de las peticiones hechas dentro del bloque:
+    `with prioridad(FONDO): obtener_letra_sincronizada(...)`.
+    """
+    marca = _prioridad.set(clase)
+    try:
+        yield
+    finally:
+        _prioridad.reset(marca)
+
+
+def prioridad_actual():
+    return _prioridad.get()
+
+
+def segundos_retry_after(valor, defecto=ESPERA_LIMITE):
+    """
+    Interpreta la cabecera Retry-After: segundos o una fecha HTTP.
+    """
+    if not valor:
+        return defecto
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return defecto
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=datetime.timezone.utc)
+    return max((fecha - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+class CuboFichas:
+    """
+    Cubo de fichas (token bucket): se rellena a `tasa` fichas por segundo
+    hasta `capacidad`, la ráfaga permitida. Con tasa <= 0 no limita. No
+    tiene lock propio: lo protege el planificador.
+    """
+
+    def __init__(self, tasa, capacidad=1, reloj=time.monotonic):
+        self.tasa = tasa
+        self.capacidad = max(capacidad, 1)
+        self._reloj = reloj
+        self._fichas = float(self.capacidad)
+        self._ultimo = reloj()
+
+    def _rellenar(self):
+        ahora = self._reloj()
+        self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def espera(self):
+        """
+        Segundos hasta que haya una ficha (0 si ya la hay).
+        """
+        if self.tasa <= 0:
+            return 0.0
+        self._rellenar()
+        return 0.0 if self._fichas >= 1 else (1 - self._fichas) / self.tasa
+
+    def tomar(self):
+        if self.tasa > 0:
+            self._fichas -= 1
+
+    def devolver(self):
+        """
+        Devuelve una ficha tomada para una petición que al final no se envió.
+        """
+        if self.tasa > 0:
+            self._fichas = min(self.capacidad, self._fichas + 1)
+
+    def vaciar(self):
+        if self.tasa > 0:
+            self._rellenar()
+            self._fichas = min(self._fichas, 0.0)
+
+
+class RegistroCuota:
+    """
+    Peticiones enviadas a cada proveedor por día, en SQLite: el menú, el
+    servicio y la precarga cuentan sobre el mismo archivo, y los contadores
+    sobreviven a los reinicios.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.getenv("PROVIDER_QUOTA_FILE", QUOTA_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cuota (
+                proveedor TEXT NOT NULL,
+                dia TEXT NOT NULL,
+                usadas INTEGER NOT NULL DEFAULT 0,
+                agotada INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (proveedor, dia)
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _hoy():
+        return datetime.date.today().isoformat()
+
+    def consultar(self, proveedor, dia=None):
+        """
+        Devuelve (usadas, agotada) del proveedor en el día indicado (hoy).
+        """
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT usadas, agotada FROM cuota WHERE proveedor = ? AND dia = ?",
+                (proveedor, dia or self._hoy()),
+            ).fetchone()
+        return (fila[0], bool(fila[1])) if fila else (0, False)
+
+    def reservar(self, proveedor, limite=None):
+        """
+        Cuenta una petición si el día no está agotado y, con `limite`, si
+        quedan por debajo de él. Es una sola sentencia, así que es atómico
+        también entre procesos. Devuelve True si se pudo.
+        """
+        if limite is not None and limite <= 0:
+            return False
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO cuota (proveedor, dia, usadas) VALUES (:proveedor, :dia, 1)
+                ON CONFLICT (proveedor, dia) DO UPDATE SET usadas = usadas + 1
+                WHERE agotada = 0 AND (:limite IS NULL OR usadas < :limite)
+                """,
+                {"proveedor": proveedor, "dia": self._hoy(), "limite": limite},
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def marcar_agotada(self, proveedor):
+        """
+        Marca el día como agotado (el proveedor avisó de que se alcanzó el límite).
+        """
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO cuota (proveedor, dia, agotada) VALUES (?, ?, 1)
+                ON CONFLICT (proveedor, dia) DO UPDATE SET agotada = 1
+                """,
+                (proveedor, self._hoy()),
+            )
+            self._conn.commit()
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Planificador:
+    """
+    Da turno a las peticiones a un proveedor: limita cuántas hay en curso,
+    su ritmo (cubo de fichas) y la cuota diaria. Las peticiones esperan en
+    una cola ordenada por prioridad y llegada, y solo avanza la primera: una
+    de fondo nunca pasa mientras espera una interactiva. Tras un 429 el
+    proveedor queda en pausa lo que indique Retry-After.
+
+    Con cuota diaria, el trabajo de fondo deja libre `reserva_interactiva`
+    (una fracción) para las búsquedas interactivas.
+    """
+
+    def __init__(self, nombre, concurrencia=4, tasa=0.0, rafaga=1, cuota_diaria=0,
+                 reserva_interactiva=RESERVA_INTERACTIVA, registro=None, reloj=time.monotonic):
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self.cuota_diaria = cuota_diaria
+        self.reserva_interactiva = reserva_interactiva
+        self._registro = registro
+        self._reloj = reloj
+        self._cubo = CuboFichas(tasa, rafaga, reloj)
+        self._condicion = threading.Condition()
+        self._cola = []  # (prioridad, llegada)
+        self._llegadas = itertools.count()
+        self._en_curso = 0
+        self._pausa_hasta = 0.0
+
+    @classmethod
+    def desde_entorno(cls, nombre, concurrencia=4, tasa=0.0, rafaga=1, cuota_diaria=0):
+        """
+        Crea el planificador leyendo <NOMBRE>_MAX_CONCURRENCIA,
+        <NOMBRE>_PETICIONES_POR_SEGUNDO, <NOMBRE>_RAFAGA,
+        <NOMBRE>_CUOTA_DIARIA y CUOTA_RESERVA_INTERACTIVA.
+        """
+        prefijo = nombre.upper()
+        return cls(
+            nombre,
+            concurrencia=int(os.getenv(f"{prefijo}_MAX_CONCURRENCIA", concurrencia)),
+            tasa=float(os.getenv(f"{prefijo}_PETICIONES_POR_SEGUNDO", tasa)),
+            rafaga=int(os.getenv(f"{prefijo}_RAFAGA", rafaga)),
+            cuota_diaria=int(os.getenv(f"{prefijo}_CUOTA_DIARIA", cuota_diaria)),
+            reserva_interactiva=float(os.getenv("CUOTA_RESERVA_INTERACTIVA", RESERVA_INTERACTIVA)),
+        )
+
+    @property
+    def registro(self):
+        if self._registro is None:
+            self._registro = obtener_registro_cuota()
+        return self._registro
+
+    def configurar_concurrencia(self, concurrencia):
+        with self._condicion:
+            self.concurrencia = concurrencia
+            self._condicion.notify_all()
+
+    def _limite_cuota(self, clase):
+        if not self.cuota_diaria:
+            return None
+        if clase == INTERACTIVA:
+            return self.cuota_diaria
+        return int(self.cuota_diaria * (1 - self.reserva_interactiva))
+
+    def _espera(self, entrada):
+        """
+        Segundos que le faltan a `entrada` para tener turno: 0 si ya lo
+        tiene y None si depende de otra petición (no es la primera o no
+        quedan huecos).
+        """
+        if self._cola[0] != entrada or self._en_curso >= self.concurrencia:
+            return None
+        pausa = self._pausa_hasta - self._reloj()
+        if pausa > 0:
+            return pausa
+        return self._cubo.espera()
+
+    def adquirir(self, clase=None, plazo=None):
+        """
+        Espera turno para una petición de la prioridad indicada (por
+        defecto, la del contexto). Lanza CuotaAgotada si no queda cuota y
+        SinTurno si `plazo` (instante del reloj del planificador) llega
+        antes que el turno, o si ya se sabe que no llegará a tiempo (p. ej.
+        una pausa por 429 más larga que el tiempo que queda).
+        """
+        clase = _prioridad.get() if clase is None else clase
+        inicio = self._reloj()
+        with self._condicion:
+            entrada = (clase, next(self._llegadas))
+            heapq.heappush(self._cola, entrada)
+            try:
+                while True:
+                    espera = self._espera(entrada)
+                    if espera == 0:
+                        break
+                    if plazo is not None:
+                        restante = plazo - self._reloj()
+                        if restante <= 0 or (espera is not None and espera > restante):
+                            _rechazos.inc(proveedor=self.nombre, motivo="plazo")
+                            raise SinTurno(f"{self.nombre}: sin turno antes del plazo")
+                        espera = restante if espera is None else espera
+                    self._condicion.wait(espera)
+                heapq.heappop(self._cola)
+                self._cubo.tomar()
+                self._en_curso += 1
+            finally:
+                if entrada in self._cola:
+                    self._cola.remove(entrada)
+                    heapq.heapify(self._cola)
+                # La siguiente de la cola puede tener turno ahora
+                self._condicion.notify_all()
+
+        # La cuota se reserva con el turno ya asignado (una petición que
+        # sigue esperando no gasta cuota) y fuera del lock: la escritura en
+        # SQLite no detiene al resto de la cola. Si no se puede, el turno se
+        # devuelve
+        try:
+            reservada = self.registro.reservar(self.nombre, self._limite_cuota(clase))
+        except BaseException:
+            self._devolver_turno()
+            raise
+        if not reservada:
+            self._devolver_turno()
+            _rechazos.inc(proveedor=self.nombre, motivo="cuota")
+            raise CuotaAgotada(
+                f"{self.nombre}: cuota diaria agotada para peticiones {NOMBRES_PRIORIDAD[clase]}s"
+            )
+        _esperas.observar(self._reloj() - inicio, proveedor=self.nombre, prioridad=NOMBRES_PRIORIDAD[clase])
+
+    def _devolver_turno(self):
+        with self._condicion:
+            self._en_curso -= 1
+            self._cubo.devolver()
+            self._condicion.notify_all()
+
+    def liberar(self):
+        with self._condicion:
+            self._en_curso -= 1
+            self._condicion.notify_all()
+
+    @contextlib.contextmanager
+    def turno(self, clase=None, plazo=None):
+        """
+        `with planificador.turno(): peticion()`
+        """
+        self.adquirir(clase, plazo)
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    def registrar_limite(self, retry_after=None):
+        """
+        El proveedor respondió 429: no se le envía nada hasta que pase
+        Retry-After (segundos o fecha HTTP) y el cubo se vacía.
+        """
+        segundos = segundos_retry_after(retry_after)
+        with self._condicion:
+            self._pausa_hasta = max(self._pausa_hasta, self._reloj() + segundos)
+            self._cubo.vaciar()
+        _rechazos.inc(proveedor=self.nombre, motivo="limite_429")
+
+    def marcar_cuota_agotada(self):
+        self.registro.marcar_agotada(self.nombre)
+
+    def estado(self):
+        """
+        Resumen para mostrar o exportar: peticiones en cola por prioridad,
+        en curso, pausa restante y cuota del día.
+        """
+        usadas, agotada = self.registro.consultar(self.nombre)
+        with self._condicion:
+            en_cola = {nombre: 0 for nombre in NOMBRES_PRIORIDAD.values()}
+            for clase, _ in self._cola:
+                en_cola[NOMBRES_PRIORIDAD[clase]] += 1
+            return {
+                "en_cola": en_cola,
+                "en_curso": self._en_curso,
+                "pausa": max(self._pausa_hasta - self._reloj(), 0.0),
+                "cuota_usada": usadas,
+                "cuota_diaria": self.cuota_diaria or None,
+                "cuota_agotada": agotada,
+            }
+
+
+PLANIFICADORES = {}
+_planificadores_lock = threading.Lock()
+_registro = None
+
+
+def obtener_planificador(nombre, **valores_por_defecto):
+    """
+    Devuelve el planificador compartido del proveedor (se crea al primer
+    uso con la configuración del .env y estos valores por defecto).
+    """
+    planificador = PLANIFICADORES.get(nombre)
+    if planificador is None:
+        with _planificadores_lock:
+            if nombre not in PLANIFICADORES:
+                PLANIFICADORES[nombre] = Planificador.desde_entorno(nombre, **valores_por_defecto)
+            planificador = PLANIFICADORES[nombre]
+    return planificador
+
+
+def obtener_registro_cuota():
+    """
+    Devuelve el registro de cuota compartido (se crea al primer uso).
+    """
+    global _registro
+    if _registro is None:
+        with _planificadores_lock:
+            if _registro is None:
+                _registro = RegistroCuota()
+    return _registro
+
+
+def _muestras_cola():
+    muestras = {}
+    for nombre, planificador in list(PLANIFICADORES.items()):
+        with planificador._condicion:
+            for clase, etiqueta in NOMBRES_PRIORIDAD.items():
+                muestras[(nombre, etiqueta)] = sum(1 for c, _ in planificador._cola if c == clase)
+    return muestras
+
+
+_metricas.indicador(
+    "sound_lyrics_planificador_cola",
+    "Peticiones esperando turno por proveedor y prioridad",
+    _muestras_cola,
+    ["proveedor", "prioridad"],
+)
+_metricas.indicador(
+    "sound_lyrics_cuota_usada",
+    "Peticiones enviadas hoy a cada proveedor",
+    lambda: {(nombre,): p.registro.consultar(nombre)[0] for nombre, p in list(PLANIFICADORES.items())},
+    ["proveedor"],
+)
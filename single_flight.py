@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class _Vuelo:
+    __slots__ = ("listo", "resultado", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes idénticas: mientras hay una llamada en
+    curso para una clave, las demás con la misma clave esperan su resultado
+    en lugar de repetir la petición. Si la llamada falla, la misma excepción
+    se lanza en todos los hilos que la esperaban.
+
+    Solo agrupa llamadas simultáneas; no guarda resultados (para eso está
+    la caché local).
+
+    `plazo` (opcional) devuelve el instante (time.monotonic) hasta el que
+    puede esperar quien llama, o None si no tiene plazo: quien espera la
+    llamada de otro no lo hace más allá de su propio plazo.
+    """
+
+    def __init__(self, plazo=None):
+        self._plazo = plazo
+        self._lock = threading.Lock()
+        self._vuelos = {}
+        self.compartidas = 0  # Llamadas resueltas con el resultado de otra
+
+    def hacer(self, clave, funcion, *args, **kwargs):
+        """
+        Ejecuta funcion(*args, **kwargs) o espera a la ejecución en curso
+        con la misma clave. Devuelve (resultado, compartido).
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is not None:
+                self.compartidas += 1
+                lider = False
+            else:
+                vuelo = self._vuelos[clave] = _Vuelo()
+                lider = True
+
+        if not lider:
+            plazo = self._plazo() if self._plazo is not None else None
+            espera = None if plazo is None else max(plazo - time.monotonic(), 0)
+            if not vuelo.listo.wait(espera):
+                raise TimeoutError(f"{clave}: la llamada en curso no terminó antes del plazo")
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado, True
+
+        try:
+            vuelo.resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            # Se retira antes de avisar: quien llegue después hace su propia llamada
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.listo.set()
+        return vuelo.resultado, False
+
+    def en_curso(self):
+        """
+        Número de claves con una llamada en curso.
+        """
+        with self._lock:
+            return len(self._vuelos)
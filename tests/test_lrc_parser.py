@@ -0,0 +1,14 @@
+from lrc_parser import componer_lrc, parse_lrc
+
+
+def test_ida_y_vuelta_conserva_el_texto_sin_tiempo_antes_de_las_palabras():
+    original = parse_lrc("[00:10.00]Oh <00:10.50>yeah <00:11.00>baby\n[00:12.00]<00:12.00>solo palabras\n")
+    compuesto = componer_lrc(original.lineas)
+    assert compuesto.splitlines()[0] == "[00:10.00]Oh <00:10.50>yeah <00:11.00>baby"
+    assert parse_lrc(compuesto).lineas == original.lineas
+
+
+def test_ida_y_vuelta_de_lrc_simple_y_metadatos():
+    original = parse_lrc("[ar:Artista]\n[00:01.50]uno\n[00:03.25]dos\n")
+    compuesto = componer_lrc(original.lineas, original.metadatos)
+    assert parse_lrc(compuesto) == original
@@ -0,0 +1,213 @@
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+from lrc_parser import formatear_timestamp
+
+LineaTimeline = namedtuple("LineaTimeline", ["inicio", "texto", "palabras"])
+
+
+def _timestamp_a_segundos(ts_str):
+    """
+    Convierte un timestamp HH:MM:SS.fff o MM:SS.fff a segundos.
+    """
+    partes = str(ts_str).split(":")
+    if len(partes) == 3:
+        h, m, s = partes
+    elif len(partes) == 2:
+        h = 0
+        m, s = partes
+    else:
+        raise ValueError(f"Formato de timestamp inesperado: {ts_str}")
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+class LyricsTimeline:
+    """
+    Letra sincronizada compacta: los tiempos de inicio (en segundos) viven
+    en un array('d') y los textos en una lista paralela. Permite localizar
+    la línea activa en cualquier instante con búsqueda binaria.
+
+    `palabras` es None si ninguna línea tiene tiempos por palabra; si no,
+    es una lista paralela con tuplas (segundos, palabra) por línea.
+    """
+
+    __slots__ = ("inicios", "textos", "palabras", "_cursor")
+
+    def __init__(self, inicios=(), textos=(), palabras=None):
+        self.inicios = inicios if isinstance(inicios, array) else array("d", inicios)
+        self.textos = list(textos)
+        if len(self.inicios) != len(self.textos):
+            raise ValueError("inicios y textos deben tener la misma longitud")
+        if palabras is not None and not any(palabras):
+            palabras = None
+        self.palabras = list(palabras) if palabras is not None else None
+        self._cursor = -1
+
+    @classmethod
+    def desde_lineas(cls, lineas):
+        """
+        Construye un timeline desde tuplas (segundos, texto, palabras)
+        ya ordenadas, como las que devuelve lrc_parser.parse_lrc.
+        """
+        inicios = array("d")
+        textos = []
+        palabras = []
+        for inicio, texto, palabras_linea in lineas:
+            inicios.append(inicio)
+            textos.append(texto)
+            palabras.append(palabras_linea)
+        return cls(inicios, textos, palabras)
+
+    @classmethod
+    def desde_dicts(cls, lineas):
+        """
+        Construye un timeline desde el formato antiguo: una lista de
+        diccionarios con 'text' y 'timestamp' (y opcionalmente 'words').
+        """
+        tuplas = []
+        for linea in lineas:
+            palabras = [
+                (_timestamp_a_segundos(p["timestamp"]), p["text"]) for p in linea.get("words") or ()
+            ]
+            tuplas.append((_timestamp_a_segundos(linea["timestamp"]), linea["text"], palabras))
+        tuplas.sort(key=lambda t: t[0])
+        return cls.desde_lineas(tuplas)
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """
+        Reconstruye un timeline serializado con a_dict().
+        """
+        palabras = datos.get("palabras")
+        if palabras is not None:
+            palabras = [[tuple(p) for p in linea] for linea in palabras]
+        return cls(datos["inicios"], datos["textos"], palabras)
+
+    def a_dict(self):
+        """
+        Serializa el timeline a tipos básicos (para JSON).
+        """
+        return {
+            "inicios": self.inicios.tolist(),
+            "textos": self.textos,
+            "palabras": self.palabras,
+        }
+
+    def a_dicts(self):
+        """
+        Devuelve la letra en el formato antiguo de lista de diccionarios.
+        """
+        salida = []
+        for linea in self:
+            entrada = {"text": linea.texto, "timestamp": formatear_timestamp(linea.inicio)}
+            if linea.palabras:
+                entrada["words"] = [
+                    {"text": palabra, "timestamp": formatear_timestamp(inicio)}
+                    for inicio, palabra in linea.palabras
+                ]
+            salida.append(entrada)
+        return salida
+
+    def __len__(self):
+        return len(self.textos)
+
+    def __getitem__(self, indice):
+        palabras = self.palabras[indice] if self.palabras is not None else []
+        return LineaTimeline(self.inicios[indice], self.textos[indice], palabras)
+
+    def __iter__(self):
+        palabras = self.palabras if self.palabras is not None else [[]] * len(self.textos)
+        return map(LineaTimeline, self.inicios, self.textos, palabras)
+
+    def __repr__(self):
+        return f"LyricsTimeline({len(self)} líneas, {self.duracion:.1f}s)"
+
+    @property
+    def duracion(self):
+        """
+        Instante de inicio de la última línea (0 si está vacía).
+        """
+        return self.inicios[-1] if self.inicios else 0.0
+
+    def indice_en(self, segundos):
+        """
+        Índice de la línea activa en el instante dado (-1 si todavía no
+        empezó ninguna). O(log n).
+        """
+        return bisect_right(self.inicios, segundos) - 1
+
+    def linea_en(self, segundos):
+        """
+        Línea activa en el instante dado, o None antes de la primera.
+        """
+        indice = self.indice_en(segundos)
+        return self[indice] if indice >= 0 else None
+
+    def siguiente_inicio(self, indice):
+        """
+        Inicio de la línea siguiente a `indice`, o None si es la última.
+        """
+        return self.inicios[indice + 1] if indice + 1 < len(self.inicios) else None
+
+    def seek(self, segundos):
+        """
+        Coloca el cursor de reproducción en el instante dado y devuelve
+        el índice de la línea activa.
+        """
+        self._cursor = self.indice_en(segundos)
+        return self._cursor
+
+    def avanzar(self, segundos):
+        """
+        Avanza el cursor hasta el instante dado (reproducción hacia delante,
+        O(1) amortizado) y devuelve el índice de la línea activa. Si el
+        instante es anterior al cursor, equivale a seek().
+        """
+        cursor = self._cursor
+        if cursor >= 0 and segundos < self.inicios[cursor]:
+            return self.seek(segundos)
+        inicios = self.inicios
+        while cursor + 1 < len(inicios) and inicios[cursor + 1] <= segundos:
+            cursor += 1
+        self._cursor = cursor
+        return cursor
+
+    def desplazar(self, segundos):
+        """
+        Devuelve un timeline nuevo con todos los tiempos desplazados
+        (positivo = la letra aparece más tarde).
+        """
+        inicios = array("d", (max(inicio + segundos, 0.0) for inicio in self.inicios))
+        palabras = None
+        if self.palabras is not None:
+            palabras = [
+                [(max(inicio + segundos, 0.0), palabra) for inicio, palabra in linea]
+                for linea in self.palabras
+            ]
+        return LyricsTimeline(inicios, self.textos, palabras)
+
+
+def timeline_a_json(letras, fuente, artista=None, titulo=None, duracion=None):
+    """
+    Representación JSON de una letra resuelta: una entrada por línea con
+    su inicio en segundos y, si las hay, las palabras con su tiempo.
+    """
+    lineas = []
+    for linea in letras or ():
+        entrada = {"inicio": round(linea.inicio, 3), "texto": linea.texto}
+        if linea.palabras:
+            entrada["palabras"] = [
+                {"inicio": round(inicio, 3), "texto": palabra} for inicio, palabra in linea.palabras
+            ]
+        lineas.append(entrada)
+    return {
+        "encontrada": bool(letras),
+        "artista": artista,
+        "titulo": titulo,
+        "duracion": duracion,
+        "fuente": fuente,
+        # Las letras de Audd.io llevan timestamps simulados o alineados
+        "sincronizada": fuente in ("LRCLIB", "LRC"),
+        "lineas": lineas,
+    }